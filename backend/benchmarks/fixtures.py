@@ -0,0 +1,92 @@
+"""
+    Deterministic fixtures for the benchmarks: synthetic audio, a matching whisper result, and media
+    files generated from the audio with ffmpeg. The same seed always produces the same data.
+"""
+from pathlib import Path
+
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_audio(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+        Returns 16 kHz mono float32 audio that is shaped like speech: bursts of voiced harmonics at a
+        syllable rate, grouped into phrases separated by pauses, over a low noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * SAMPLE_RATE)
+    t = np.arange(samples, dtype=np.float64) / SAMPLE_RATE
+
+    # Pitch wanders between 100 and 220 Hz, every phrase has its own contour
+    phrase_seconds = 4.0
+    phrase = (t // phrase_seconds).astype(np.int64)
+    base_pitch = rng.uniform(100, 220, phrase.max() + 1)[phrase]
+    pitch = base_pitch * (1 + 0.1 * np.sin(2 * np.pi * 0.5 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+
+    # 4 syllables a second, with the last second of every phrase left silent
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2
+    speaking = (t % phrase_seconds) < (phrase_seconds - 1.0)
+    audio = 0.3 * voiced * syllables * speaking + 0.003 * rng.standard_normal(samples)
+    return audio.astype(np.float32)
+
+
+def synthetic_result(seconds: float, segment_seconds: float = 2.5, seed: int = 0) -> dict:
+    """
+        Returns a whisper style result with one segment every `segment_seconds`
+    """
+    rng = np.random.default_rng(seed)
+    words = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "subtitle", "timing", "audio", "video"]
+    segments = []
+    start = 0.0
+    while start < seconds:
+        end = min(start + segment_seconds - 0.2, seconds)
+        text = " " + " ".join(rng.choice(words, int(rng.integers(4, 12)))).capitalize() + "."
+        segments.append({"id": len(segments), "start": round(start, 2), "end": round(end, 2), "text": text})
+        start += segment_seconds
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": "en"}
+
+
+def write_wav(path: Path, audio: np.ndarray):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def write_media(directory: Path, audio: np.ndarray) -> dict[str, Path]:
+    """
+        Writes the audio as .wav, .mp3, .mp4 and .mkv files (the videos with a generated test pattern)
+        and returns their paths by extension. Only the .wav is written when ffmpeg isn't installed.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    wav = directory / "fixture.wav"
+    write_wav(wav, audio)
+    paths = {"wav": wav}
+    if not ffmpeg_available():
+        return paths
+
+    seconds = len(audio) / SAMPLE_RATE
+    video = ["-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=25:duration={seconds}"]
+    outputs = {
+        "mp3": ["-i", str(wav), "-c:a", "libmp3lame", "-b:a", "128k"],
+        "mp4": [*video, "-i", str(wav), "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest"],
+        "mkv": [*video, "-i", str(wav), "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest"],
+    }
+    for extension, args in outputs.items():
+        path = directory / f"fixture.{extension}"
+        # Bit exact output isn't needed, only the same content for every run
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args, str(path)], check=True)
+        paths[extension] = path
+    return paths
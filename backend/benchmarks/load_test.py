@@ -0,0 +1,296 @@
+"""
+    Load generator for capacity planning the API, run against `init.create_app()` in-process with the
+    stub plugin (inference/stub) standing in for a model.
+
+    Every level submits a number of concurrent `/transcribe` jobs and opens a number of `/progress`
+    SSE subscribers per job, then reports:
+        - submission latency: POST /transcribe until its 202 response
+        - event delivery latency: an event being published until a subscriber has read it
+        - completion time: submission until the first subscriber reads the final status
+        - throughput in jobs, seconds of audio and delivered events per second
+
+        python benchmarks/load_test.py --jobs 1 8 32 128 --subscribers 1 4 --realtime-factor 0.02
+
+    Requests go straight to the ASGI app, without a socket or HTTP client in between, so the numbers are
+    the service's own overhead. Plugins are loaded unsigned, as the stub is only signed in release builds.
+"""
+from pathlib import Path
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+INVOCATION_DIR = Path.cwd()
+os.chdir(BACKEND_DIR)
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("allowUnsignedCode", "true")
+
+from config import Settings                             # noqa: E402
+from inference.event_log import event_log               # noqa: E402
+from inference.plugins import STUB_PLUGIN               # noqa: E402
+
+
+class _Response:
+    def __init__(self):
+        self.status = None
+        self.body = bytearray()
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"", on_body=None) -> _Response:
+    """
+        Calls the ASGI app directly. `on_body` is called with every body chunk as it is sent,
+        which is how SSE events are read while the response is still streaming.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"loadtest"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80),
+    }
+    response = _Response()
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client only disconnects once the response is complete
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if on_body and chunk:
+                on_body(chunk)
+            else:
+                response.body += chunk
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    return response
+
+
+class _Subscriber:
+    """
+        Reads a task's SSE stream and measures how long each event took to arrive
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.connected_at = time.monotonic()
+        self.latencies: list[float] = []
+        self.events = 0
+        self.done_at: float | None = None
+        self._buffer = ""
+        self._published_at: dict[int, float] = {}
+
+    def on_body(self, chunk: bytes):
+        received_at = time.monotonic()
+        self._buffer += chunk.decode().replace("\r\n", "\n")
+        while "\n\n" in self._buffer:
+            raw, self._buffer = self._buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in raw.split("\n") if ": " in line)
+            if "id" not in fields:
+                continue        # Keep-alive ping
+            self.events += 1
+            published_at = self._lookup(int(fields["id"]))
+            # Events replayed from before the subscriber connected only measure how late it connected
+            if published_at is not None and published_at >= self.connected_at:
+                self.latencies.append(received_at - published_at)
+            payload = json.loads(fields.get("data", "{}"))
+            if payload.get("type") == "status" and payload.get("status") in ["DONE", "ERROR"]:
+                self.done_at = received_at
+
+    def _lookup(self, event_id: int) -> float | None:
+        if event_id not in self._published_at:
+            self._published_at = {event.id: event.published_at for event in event_log.events(self.task_id)}
+        return self._published_at.get(event_id)
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+        "mean": statistics.fmean(values) if values else None,
+    }
+
+
+async def run_level(app, media_path: str, save_location: str, jobs: int, subscribers: int, args) -> dict:
+    request_body = json.dumps({
+        "filePaths": [media_path],
+        "model": STUB_PLUGIN,
+        "modelSize": args.model_size,
+        "language": "en",
+        "outputFormats": args.formats,
+        "embedSubtitles": False,
+        "overWriteFiles": False,
+        "saveLocation": save_location,
+    }).encode()
+
+    submit_latencies = []
+    completion_times = []
+    readers: list[_Subscriber] = []
+    failed = 0
+
+    async def job(index: int):
+        nonlocal failed
+        await asyncio.sleep(index * args.arrival_interval)
+        submitted = time.monotonic()
+        response = await asgi_request(app, "POST", "/transcribe", request_body)
+        submit_latencies.append(time.monotonic() - submitted)
+        if response.status != 202:
+            failed += 1
+            return
+        task_id = json.loads(response.body)[0]["task_id"]
+
+        job_readers = [_Subscriber(task_id) for _ in range(subscribers)]
+        readers.extend(job_readers)
+        await asyncio.gather(*(
+            asgi_request(app, "GET", f"/progress/{task_id}", on_body=reader.on_body) for reader in job_readers
+        ))
+        done = [reader.done_at for reader in job_readers if reader.done_at is not None]
+        if done:
+            completion_times.append(min(done) - submitted)
+        else:
+            failed += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(job(index) for index in range(jobs)))
+    wall = time.monotonic() - started
+
+    latencies = [latency for reader in readers for latency in reader.latencies]
+    events = sum(reader.events for reader in readers)
+    return {
+        "jobs": jobs,
+        "subscribers": subscribers,
+        "failed": failed,
+        "wallSeconds": wall,
+        "submitLatency": _summary(submit_latencies),
+        "eventLatency": _summary(latencies),
+        "completionTime": _summary(completion_times),
+        "jobsPerSecond": len(completion_times) / wall,
+        "audioSecondsPerSecond": len(completion_times) * args.audio_seconds / wall,
+        "eventsPerSecond": events / wall,
+    }
+
+
+def _ms(value: float | None) -> str:
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+
+def _print_level(result: dict):
+    print(
+        f"{result['jobs']:>6}{result['subscribers']:>6}"
+        f"{_ms(result['submitLatency']['p50']):>10}{_ms(result['submitLatency']['p99']):>10}"
+        f"{_ms(result['eventLatency']['p50']):>10}{_ms(result['eventLatency']['p99']):>10}"
+        f"{result['completionTime']['p50'] or 0:>10.2f}{result['completionTime']['p99'] or 0:>10.2f}"
+        f"{result['jobsPerSecond']:>9.2f}{result['eventsPerSecond']:>10.0f}{result['failed']:>7}",
+        file=sys.__stdout__,
+    )
+
+
+def write_silence(path: Path, seconds: float):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(bytes(int(seconds * 16000) * 2))
+
+
+async def main(args) -> list[dict]:
+    Settings.stubPluginEnabled = True
+    Settings.stubRealtimeFactor = args.realtime_factor
+    Settings.stubLoadSeconds = args.load_seconds
+    Settings.stubAudioSeconds = args.audio_seconds
+    Settings.enable_multi_job = args.concurrency > 1
+    Settings.schedulerConcurrency = {**Settings.schedulerConcurrency, STUB_PLUGIN: args.concurrency}
+    # Every job transcribes the same file, which must not be answered from the cache or fill the search index
+    Settings.transcriptCacheEnabled = False
+    Settings.transcriptStoreEnabled = False
+
+    from init import create_app
+    app = create_app()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="subtext-load-") as directory:
+        media_path = Path(directory) / "load.wav"
+        write_silence(media_path, args.audio_seconds)
+        save_location = Path(directory) / "out"
+        save_location.mkdir()
+
+        # The app logs every request and event, which would drown the results
+        log = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(log):
+            async with app.router.lifespan_context(app):
+                print(f"{'jobs':>6}{'subs':>6}{'submit ms':>20}{'event ms':>20}{'complete s':>20}{'jobs/s':>9}{'events/s':>10}{'failed':>7}",
+                      file=sys.__stdout__)
+                print(f"{'':>12}{'p50':>10}{'p99':>10}{'p50':>10}{'p99':>10}{'p50':>10}{'p99':>10}", file=sys.__stdout__)
+                for jobs in args.jobs:
+                    for subscribers in args.subscribers:
+                        result = await run_level(app, str(media_path), str(save_location), jobs, subscribers, args)
+                        results.append(result)
+                        _print_level(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drives concurrent transcriptions and SSE subscribers through the API")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4, 16, 64], help="concurrent jobs per level")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 4], help="SSE subscribers per job")
+    parser.add_argument("--concurrency", type=int, default=1, help="stub jobs the scheduler runs at once")
+    parser.add_argument("--audio-seconds", type=float, default=60, help="length of every job's file")
+    parser.add_argument("--realtime-factor", type=float, default=0.01, help="stub seconds per second of audio")
+    parser.add_argument("--load-seconds", type=float, default=0.5, help="stub model load time")
+    parser.add_argument("--model-size", type=str, default="tiny", help="stub model size, larger sizes are slower")
+    parser.add_argument("--formats", type=str, nargs="*", default=["SRT"], help="output formats written per job")
+    parser.add_argument("--arrival-interval", type=float, default=0, help="seconds between job submissions (0 = all at once)")
+    parser.add_argument("--output", type=str, default=None, help="file to write the results to as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    if args.output:
+        with open(INVOCATION_DIR / args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "levels": results}, f, indent=2)
+        print(f"Results written to {args.output}")
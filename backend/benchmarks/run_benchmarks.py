@@ -0,0 +1,374 @@
+"""
+    Micro-benchmarks for every stage a file goes through: plugin signature verification and module
+    execution, audio decoding, the log-mel spectrogram, inference with the tiny model, building the
+    subtitles, writing each output format, and muxing them into a video.
+
+    Inputs are generated deterministically (see fixtures.py), so runs on the same machine are comparable.
+    Results are written as JSON and can be compared against an earlier run, failing on regressions:
+
+        python benchmarks/run_benchmarks.py --output before.json
+        python benchmarks/run_benchmarks.py --output after.json --baseline before.json
+        python benchmarks/run_benchmarks.py --compare before.json after.json
+
+    Stages whose requirements are missing (ffmpeg, whisper, the tiny model) are recorded as skipped.
+"""
+from pathlib import Path
+from typing import Callable
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+INVOCATION_DIR = Path.cwd()
+# config and the plugin loader resolve key.pub and the inference folder relative to the working directory
+os.chdir(BACKEND_DIR)
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import pysubs2                                                          # noqa: E402
+from cryptography.hazmat.primitives import hashes                       # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa, padding      # noqa: E402
+
+from config import Settings                                             # noqa: E402
+from inference.plugins import list_plugins, plugin_path, load_source, verify_data     # noqa: E402
+import fixtures                                                         # noqa: E402
+
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD = 10          # Percent slower than the baseline's median that counts as a regression
+MIN_DELTA_SECONDS = 0.0005      # Smaller differences are timer noise whatever the percentage
+
+# Same file names and options as writeSubtitles
+OUTPUT_FORMATS = {
+    "SRT": ("{}.srt", {}),
+    "ASS": ("{}.ass", {}),
+    "WebVTT": ("{}.vtt", {}),
+    "MPL2": ("{}(mpl2).txt", {"format_": "mpl2"}),
+    "TMP": ("{}(tmp).txt", {"format_": "tmp"}),
+    "TTML": ("{}.ttml", {}),
+    "MicroDVD": ("{}(microdvd).sub", {"format_": "microdvd", "fps": 25}),
+}
+
+
+class Suite:
+    def __init__(self, pattern: str | None, rounds: int):
+        self.pattern = re.compile(pattern) if pattern else None
+        self.rounds = rounds
+        self.results: dict[str, dict] = {}
+        self.skipped: dict[str, str] = {}
+
+    def wants(self, name: str) -> bool:
+        return self.pattern is None or bool(self.pattern.search(name))
+
+    def skip(self, name: str, reason: str):
+        if self.wants(name):
+            self.skipped[name] = reason
+            print(f"{name:<40} skipped: {reason}")
+
+    def measure(self, name: str, function: Callable, rounds: int | None = None, warmup: int = 1,
+                threshold: float = DEFAULT_THRESHOLD, **info):
+        """
+            Times `function` after `warmup` untimed calls. A function can return the seconds (a float) it measured
+            itself (for work done in a subprocess), otherwise the whole call is timed.
+        """
+        if not self.wants(name):
+            return
+        rounds = rounds or self.rounds
+        try:
+            for _ in range(warmup):
+                function()
+            times = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                measured = function()
+                elapsed = time.perf_counter() - started
+                times.append(measured if isinstance(measured, float) else elapsed)
+        except Exception as e:
+            self.skip(name, f"failed: {e}")
+            return
+
+        result = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "mean": statistics.fmean(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "rounds": rounds,
+            "threshold": threshold,
+            "times": times,
+            **info,
+        }
+        self.results[name] = result
+        print(f"{name:<40} {result['median'] * 1000:>10.2f} ms  (min {result['min'] * 1000:.2f}, stdev {result['stdev'] * 1000:.2f})")
+
+
+# --- Plugins ---
+def _sign(private_key, data: bytes) -> bytes:
+    # Same padding as build_tools/build_generate_signatures.py
+    return base64.b64encode(private_key.sign(
+        data, padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH), hashes.SHA256()
+    ))
+
+
+def bench_plugins(suite: Suite, work_dir: Path):
+    # A throwaway key, so the plugins don't need to be signed with the release key
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = private_key.public_key()
+
+    for plugin in list_plugins():
+        filename = os.path.abspath(plugin_path(plugin))
+        with open(filename, "rb") as f:
+            source = f.read()
+        sig_path = work_dir / f"{plugin}.sig"
+        sig_path.write_bytes(_sign(private_key, source))
+
+        def verify():
+            # What read_verified_source does with a signed plugin
+            with open(filename, "rb") as f:
+                if not verify_data(public_key, f.read(), str(sig_path)):
+                    raise RuntimeError("signature check failed")
+
+        suite.measure(f"plugin.verify[{plugin}]", verify, sourceBytes=len(source))
+
+        modname = f"benchmark_{plugin.replace(' ', '_').replace('(', '_').replace(')', '')}"
+        # Executing the module again once its imports are loaded, which is what reloading a changed plugin costs
+        suite.measure(f"plugin.exec[{plugin}]", lambda: load_source(modname, filename, source), threshold=20)
+        # A fresh interpreter, which includes importing whisper, torch and everything else the plugin imports
+        suite.measure(f"plugin.exec_cold[{plugin}]", lambda: _exec_cold(plugin), rounds=3, warmup=0, threshold=20)
+
+
+def _exec_cold(plugin: str) -> float:
+    code = (
+        "import time; from inference.plugins import plugin_path, load_source; "
+        f"started = time.perf_counter(); load_source('plugin', plugin_path({plugin!r})); "
+        "print(time.perf_counter() - started)"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, "allowUnsignedCode": "true"},
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed")
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+# --- Audio and inference ---
+DECODE_EXTENSIONS = ("wav", "mp3", "mp4")
+
+
+def bench_audio(suite: Suite, media: dict[str, Path], audio, model_size: str, threads: int | None):
+    try:
+        import torch
+        import whisper
+    except ImportError as e:
+        # Skipped under the names they are measured as, so compare matches them up
+        names = [*(f"audio.decode[{extension}]" for extension in DECODE_EXTENSIONS), "audio.mel", f"inference.{model_size}"]
+        for name in names:
+            suite.skip(name, f"{e.name} is not installed")
+        return
+    if threads:
+        torch.set_num_threads(threads)
+
+    audio_seconds = len(audio) / fixtures.SAMPLE_RATE
+    for extension in DECODE_EXTENSIONS:
+        name = f"audio.decode[{extension}]"
+        # whisper decodes every format with ffmpeg, .wav included
+        if extension not in media or not fixtures.ffmpeg_available():
+            suite.skip(name, "ffmpeg is not installed")
+        else:
+            suite.measure(name, lambda: whisper.load_audio(str(media[extension])), threshold=20, audioSeconds=audio_seconds)
+
+    # transcribe computes the whole file's spectrogram up front, padded by one window
+    tensor = torch.from_numpy(audio)
+    suite.measure("audio.mel", lambda: whisper.log_mel_spectrogram(tensor, 80, padding=whisper.audio.N_SAMPLES),
+                  audioSeconds=audio_seconds)
+
+    name = f"inference.{model_size}"
+    if not suite.wants(name):
+        return
+    try:
+        model = whisper.load_model(model_size, device="cpu")
+    except Exception as e:
+        suite.skip(name, f"model could not be loaded: {e}")
+        return
+
+    def transcribe():
+        torch.manual_seed(0)
+        model.transcribe(audio, language="en", temperature=0.0, fp16=False, condition_on_previous_text=False, verbose=None)
+
+    suite.measure(name, transcribe, rounds=max(1, min(suite.rounds, 3)), threshold=15,
+                  audioSeconds=audio_seconds, threads=torch.get_num_threads())
+    result = suite.results.get(name)
+    if result:
+        result["realtimeFactor"] = result["median"] / audio_seconds
+
+
+# --- Subtitles ---
+def bench_subtitles(suite: Suite, work_dir: Path, result_seconds: float):
+    result = fixtures.synthetic_result(result_seconds)
+    segments = len(result["segments"])
+    suite.measure("subtitles.load_from_whisper", lambda: pysubs2.load_from_whisper(result), segments=segments)
+
+    subs = pysubs2.load_from_whisper(result)
+    base_location = str(work_dir / "fixture")
+    for format, (filename, options) in OUTPUT_FORMATS.items():
+        path = filename.format(base_location)
+        suite.measure(f"subtitles.write[{format}]", lambda: subs.save(path, **options), segments=segments)
+
+
+# --- Muxing ---
+def bench_mux(suite: Suite, work_dir: Path, media: dict[str, Path], audio_seconds: float):
+    from inference.mux import mux_runner
+
+    subs = pysubs2.load_from_whisper(fixtures.synthetic_result(audio_seconds))
+    ass_location = work_dir / "mux.ass"
+    subs.save(str(ass_location))
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(Settings.broadcast.connect())
+    try:
+        for extension, codec in (("mp4", "mov_text"), ("mkv", "ass")):
+            name = f"mux[{extension}]"
+            if extension not in media:
+                suite.skip(name, "ffmpeg is not installed")
+                continue
+            path = str(media[extension])
+            out_path = str(work_dir / f"muxed.{extension}")
+            # The arguments embedSubtitles uses for a file with one video and one audio stream
+            args = [
+                "-y", "-i", path, "-f", "ass", "-i", str(ass_location), "-map", "0:0", "-map", "0:1", "-map", "1:0",
+                "-c:v", "copy", "-c:a", "copy", "-c:s", codec,
+            ]
+            suite.measure(name, lambda: loop.run_until_complete(mux_runner.run("benchmark", path, args, out_path)),
+                          threshold=25, inputBytes=os.path.getsize(path))
+    finally:
+        loop.run_until_complete(Settings.broadcast.disconnect())
+        loop.close()
+
+
+# --- Results ---
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions() -> dict:
+    versions = {"python": platform.python_version(), "pysubs2": pysubs2.__version__}
+    for module in ("torch", "whisper", "numpy"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return versions
+
+
+def compare(baseline: dict, current: dict, threshold: float | None = None) -> int:
+    """
+        Prints the change in median time of every benchmark and returns how many regressed.
+        Each benchmark's own threshold is used unless `threshold` overrides it.
+    """
+    regressions = 0
+    names = sorted(set(baseline["benchmarks"]) | set(current["benchmarks"]))
+    print(f"{'benchmark':<40}{'before ms':>12}{'after ms':>12}{'change':>10}  status")
+    for name in names:
+        before = baseline["benchmarks"].get(name)
+        after = current["benchmarks"].get(name)
+        if before is None or after is None:
+            status = "new" if before is None else "missing"
+            reason = current.get("skipped", {}).get(name)
+            print(f"{name:<40}{'':>12}{'':>12}{'':>10}  {status}{f' ({reason})' if reason else ''}")
+            continue
+
+        limit = threshold if threshold is not None else after.get("threshold", DEFAULT_THRESHOLD)
+        change = (after["median"] - before["median"]) / before["median"] * 100 if before["median"] else 0.0
+        delta = after["median"] - before["median"]
+        if change > limit and delta > MIN_DELTA_SECONDS:
+            status = f"REGRESSION (> {limit:g}%)"
+            regressions += 1
+        elif change < -limit and -delta > MIN_DELTA_SECONDS:
+            status = "faster"
+        else:
+            status = "ok"
+        print(f"{name:<40}{before['median'] * 1000:>12.2f}{after['median'] * 1000:>12.2f}{change:>+9.1f}%  {status}")
+
+    if baseline.get("meta", {}).get("machine") != current.get("meta", {}).get("machine"):
+        print("Warning: the results are from different machines")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+def run(args) -> dict:
+    suite = Suite(args.only, args.rounds)
+    audio = fixtures.synthetic_audio(args.audio_seconds, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="subtext-benchmark-") as directory:
+        work_dir = Path(directory)
+        media = fixtures.write_media(work_dir / "media", audio)
+        bench_plugins(suite, work_dir)
+        bench_audio(suite, media, audio, args.model, args.threads)
+        bench_subtitles(suite, work_dir, args.subtitle_seconds)
+        bench_mux(suite, work_dir, media, args.audio_seconds)
+
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "timestamp": time.time(),
+            "commit": _git_commit(),
+            "machine": f"{platform.node()} {platform.machine()} {os.cpu_count()} CPUs",
+            "platform": platform.platform(),
+            "versions": _versions(),
+            "ffmpeg": fixtures.ffmpeg_available(),
+            "audioSeconds": args.audio_seconds,
+            "subtitleSeconds": args.subtitle_seconds,
+            "seed": args.seed,
+        },
+        "benchmarks": suite.results,
+        "skipped": suite.skipped,
+    }
+
+
+def _read(path: str) -> dict:
+    with open(INVOCATION_DIR / path, encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise SystemExit(f"{path} has results version {results.get('version')}, expected {RESULTS_VERSION}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the transcription pipeline stages")
+    parser.add_argument("--output", type=str, default=None, help="file to write the results to as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="earlier results to compare this run against")
+    parser.add_argument("--compare", type=str, nargs=2, metavar=("BASELINE", "CURRENT"), default=None,
+                        help="compare two result files without running anything")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="percent slowdown that fails the comparison (default: each benchmark's own, mostly 10)")
+    parser.add_argument("--only", type=str, default=None, help="regular expression selecting the benchmarks to run")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per benchmark")
+    parser.add_argument("--audio-seconds", type=float, default=60, help="length of the synthetic audio")
+    parser.add_argument("--subtitle-seconds", type=float, default=3600, help="length of the synthetic transcript")
+    parser.add_argument("--model", type=str, default="tiny", help="whisper model size for the inference benchmark")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads (default: torch's own default)")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.compare:
+        baseline, current = (_read(path) for path in args.compare)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    results = run(args)
+    if args.output:
+        with open(INVOCATION_DIR / args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        sys.exit(1 if compare(_read(args.baseline), results, args.threshold) else 0)
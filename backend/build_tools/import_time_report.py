@@ -0,0 +1,115 @@
+from pathlib import Path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# What is imported before the server answers its first request, and what the plugins add in the background
+PHASES = {
+    "startup": "import init",
+    "plugins": "import init; from inference.capabilities import capability_catalogue; capability_catalogue.rebuild()",
+}
+
+
+def parse_importtime(stderr: str) -> dict[str, dict]:
+    """
+        Returns {module: {"self": µs, "cumulative": µs}} from `python -X importtime` output
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        modules[name.strip()] = {"self": int(self_us), "cumulative": int(cumulative_us)}
+    return modules
+
+
+def measure(code: str, runs: int) -> dict[str, dict]:
+    """
+        Imports in `runs` fresh interpreters and keeps each module's fastest run, which filters out most noise
+    """
+    best: dict[str, dict] = {}
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+            env={**os.environ, "allowUnsignedCode": "true"},
+        )
+        if completed.returncode != 0:
+            raise SystemExit(f"Import failed:\n{completed.stderr[-2000:]}")
+        for name, times in parse_importtime(completed.stderr).items():
+            if name not in best or times["self"] < best[name]["self"]:
+                best[name] = times
+    return best
+
+
+def top_level_packages(modules: dict[str, dict]) -> dict[str, int]:
+    """
+        Import time of every top level package and its submodules, in µs. Time spent importing other
+        packages is counted towards those, so e.g. torch's time isn't also counted as whisper's.
+    """
+    packages: dict[str, int] = {}
+    for name, times in modules.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + times["self"]
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def report(runs: int, top: int) -> dict:
+    results = {"python": sys.version.split()[0], "runs": runs, "phases": {}}
+    for phase, code in PHASES.items():
+        modules = measure(code, runs)
+        packages = top_level_packages(modules)
+        slowest = sorted(modules.items(), key=lambda item: item[1]["self"], reverse=True)[:top]
+        results["phases"][phase] = {
+            "totalMs": round(sum(packages.values()) / 1000, 1),
+            "packagesMs": {package: round(us / 1000, 1) for package, us in packages.items()},
+            "slowestModulesMs": {name: round(times["self"] / 1000, 1) for name, times in slowest},
+        }
+
+        print(f"\n{phase}: {results['phases'][phase]['totalMs']} ms ({code})")
+        for package, ms in list(results["phases"][phase]["packagesMs"].items())[:top]:
+            print(f"    {package:<40}{ms:>10.1f} ms")
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> int:
+    regressions = 0
+    print(f"\n{'phase / package':<48}{'before ms':>12}{'after ms':>12}{'change':>10}")
+    for phase, after in current["phases"].items():
+        before = baseline["phases"].get(phase)
+        if before is None:
+            continue
+        rows = [(phase, before["totalMs"], after["totalMs"])] + [
+            (f"    {package}", before["packagesMs"].get(package, 0), ms) for package, ms in after["packagesMs"].items()
+        ]
+        for name, before_ms, after_ms in rows:
+            change = (after_ms - before_ms) / before_ms * 100 if before_ms else float("inf")
+            regressed = after_ms - before_ms > min_delta_ms and change > threshold
+            regressions += regressed
+            if regressed or not name.startswith(" "):
+                print(f"{name:<48}{before_ms:>12.1f}{after_ms:>12.1f}{change:>+9.1f}%{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports the backend's import time at startup and once the plugins are loaded")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per phase, the fastest time of each module is kept")
+    parser.add_argument("--top", type=int, default=15, help="packages and modules listed per phase")
+    parser.add_argument("--output", type=str, default=None, help="file to write the report to as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=20, help="percent slowdown that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=20, help="smaller slowdowns in ms are ignored")
+
+    args = parser.parse_args()
+    results = report(args.runs, args.top)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, results, args.threshold, args.min_delta) else 0)
@@ -1,10 +1,6 @@
 from typing import ClassVar
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from cryptography.hazmat.primitives.asymmetric.types import PublicKeyTypes
-from cryptography.hazmat.primitives import serialization
-from pydantic import Field
-from hashlib import sha256
-from sys import exit
 import os
 from broadcaster import Broadcast
 
@@ -23,18 +19,53 @@ class settingsModel(BaseSettings):
     testEnable: bool = True
     allowUnsignedCode: bool = False
     debuggingEnabled: bool = False
-    publicKey: PublicKeyTypes
+    publicKey: PublicKeyTypes | None = None     # Loaded from key.pub and checked on first use, see inference.plugins.load_public_key
     broadcast: Broadcast = Broadcast("memory://")
     enable_multi_job: bool = False
-
-    if os.path.exists("key.pub"):
-
-        publicKey = Field(default_factory=lambda: serialization.load_pem_public_key(
-            open("key.pub", 'rb').read()
-        ))
-
-    else:
-        publicKey = None
+    modelCacheRamBudgetMB: int = 8192       # Loaded models kept in RAM (0 disables caching)
+    modelCacheVramBudgetMB: int = 6144      # Loaded models kept in VRAM (0 disables caching)
+    schedulerConcurrency: dict[str, int] = {"whisper (CPU)": 1, "whisper (GPU)": 1}     # Concurrent jobs per plugin
+    schedulerDefaultConcurrency: int = 1
+    inferenceBatchSize: int = 8             # 30 second windows per batched encoder/decoder pass
+    inferenceBatchFilesPerJob: int = 32     # Files handled by one batched scheduler job
+    streamSegments: bool = True             # Publish segments and write SRT/WebVTT while transcribing
+    pipelineQueueSize: int = 1              # Items waiting between pipeline stages (decoded audio is held in RAM)
+    pipelineDecodeWorkers: int = 1
+    pipelineSerialiseWorkers: int = 1
+    pipelineMuxWorkers: int = 1
+    vadThresholdDb: float = -45             # Frames quieter than this (or the noise floor + 12 dB, up to 6 dB above it) are silence
+    vadMinSilenceMs: int = 600              # Shorter pauses are kept as part of the speech
+    vadMinSpeechMs: int = 150
+    vadPaddingMs: int = 200                 # Audio kept either side of each speech region
+    capabilityRefreshSeconds: float = 5     # Minimum interval between plugin change checks
+    parallelWorkers: int = 0                # Maximum processes per parallel transcription and per model pool (0 = the job's share of the cores / threads per worker)
+    parallelThreadsPerWorker: int = 4
+    parallelChunkSeconds: int = 600         # Target chunk length, chunks are cut in the nearest silence
+    parallelMinSeconds: int = 1800          # Shorter files are transcribed in one piece
+    cpuCoreBudget: int = 0                  # Cores shared between concurrent jobs (0 = every core available to the process)
+    cpuInteropThreads: int = 1              # torch inter-op threads, fixed for the whole process
+    cpuAffinity: bool = False               # Also pin each job's thread to its share of the cores (Linux)
+    progressMinIntervalSeconds: float = 0.5     # Progress events are published at most this often...
+    progressMinStepPercent: float = 5           # ...unless the percentage moved by at least this much
+    eventLogMaxEvents: int = 1000           # Events kept per task for replaying to late or reconnecting SSE clients
+    eventLogTtlSeconds: float = 600         # Logs of tasks idle for this long are dropped
+    transcriptCacheEnabled: bool = True     # Reuse results for files transcribed before with the same model and options
+    transcriptCacheMaxMB: int = 512
+    transcriptStoreEnabled: bool = True     # Index finished transcripts for full-text search
+    probeConcurrency: int = 4               # ffprobe processes run at once when checking submitted files
+    probeTimeoutSeconds: float = 30
+    muxConcurrency: int = 2                 # ffmpeg muxes run at once, across every task
+    stubPluginEnabled: bool = False         # List the stub plugin used for load testing
+    stubRealtimeFactor: float = 0.05        # Seconds the stub takes per second of audio with the tiny size
+    stubLoadSeconds: float = 0.5            # Time the stub takes to "load" a model size that isn't cached
+    stubAudioSeconds: float = 60            # Length the stub assumes for files ffprobe couldn't read
+    lazyStartup: bool = True                # Serve requests before the plugins (and torch) are loaded, see /ready
+    warmupEnabled: bool = False             # Preload the last used model at startup and allow POST /warmup, see inference.warmup
+    warmupThreads: int = 1                  # torch threads of the warm-up's dummy forward pass
+    workerMode: bool = False                # Run plugins in worker processes instead of the server's threads, see inference.workers
+    workerProcesses: dict[str, int] = {"whisper (CPU)": 1, "whisper (GPU)": 1}      # Worker processes per plugin (0 = in process)
+    workerDefaultProcesses: int = 1
+    frontendWatch: bool = False             # Reload the bundled frontend when its build changes (for frontend development)
 
     LOGGING: bool = True
 
@@ -48,9 +79,3 @@ class settingsModel(BaseSettings):
 
 
 Settings = settingsModel()
-if (not Settings.allowUnsignedCode):
-    hash = sha256()
-    hash.update(open("key.pub", 'rb').read())
-    if (hash.hexdigest() != "0e5fa3d7e8b53a32a87911fce765486a1001cefe6549c8e243572c138465c491"):
-        print("Public Key Hash check failed")
-        exit(100)
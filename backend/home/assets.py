@@ -0,0 +1,208 @@
+"""
+    In-memory table of the bundled frontend's files, so serving the UI costs no disk I/O.
+
+    Every servable file under home/frontend is read once at startup along with a gzip variant, and a
+    brotli variant when the brotli package is installed, for the types that compress. Brotli at its
+    highest quality is slow, so those variants are added by a background thread after the table is
+    loaded. Next.js puts content hashes in the names of the files under _next/static, which are cached
+    by the browser as immutable; everything else is revalidated with its ETag. With
+    `Settings.frontendWatch` a polling watcher reloads the table when the build changes.
+"""
+from fastapi import Request, Response
+from hashlib import sha256
+from pathlib import Path
+from typing import NamedTuple
+
+import gzip
+import mimetypes
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Served by the catch-all route, other files (e.g. build manifests) are not exposed
+STATIC_SUFFIXES = (".js", ".css", ".svg", ".woff2", ".html")
+# Served by their own routes
+NAMED_FILES = ("favicon.ico", "index.txt")
+COMPRESSIBLE_SUFFIXES = (".js", ".css", ".svg", ".html", ".txt", ".ico")
+IMMUTABLE_PREFIX = "_next/static/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+WATCH_INTERVAL_SECONDS = 1.0
+
+
+class Asset(NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+    cache_control: str
+    encoded: dict[str, bytes]       # Content-Encoding -> body, only kept when smaller
+
+
+def _media_type(path: str) -> str:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ["application/javascript", "image/svg+xml"]:
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+def _accepted_encodings(accept_encoding: str) -> list[str]:
+    """
+        Returns the encodings a client accepts, ignoring those it lists with q=0
+    """
+    encodings = []
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.partition(";")
+        parameters = parameters.replace(" ", "")
+        if parameters.startswith("q="):
+            try:
+                if float(parameters[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.append(name.strip().lower())
+    return encodings
+
+
+def _load_asset(path: Path, relative: str) -> Asset:
+    body = path.read_bytes()
+    encoded = {}
+    if relative.endswith(COMPRESSIBLE_SUFFIXES):
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            encoded["gzip"] = compressed
+    return Asset(
+        body=body,
+        media_type=_media_type(relative),
+        etag=sha256(body).hexdigest()[:32],
+        cache_control=IMMUTABLE_CACHE_CONTROL if relative.startswith(IMMUTABLE_PREFIX) else "no-cache",
+        encoded=encoded,
+    )
+
+
+class AssetTable:
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._assets: dict[str, Asset] | None = None
+        self._fingerprint: tuple | None = None
+        self._stop_watching = threading.Event()
+        self._watcher: threading.Thread | None = None
+        self.loads = 0
+
+    def _files(self) -> list[tuple[str, Path]]:
+        if not self.directory.is_dir():
+            return []
+        files = []
+        for path in self.directory.rglob("*"):
+            relative = path.relative_to(self.directory).as_posix()
+            if (relative.endswith(STATIC_SUFFIXES) or relative in NAMED_FILES) and path.is_file():
+                files.append((relative, path))
+        return sorted(files)
+
+    def _fingerprint_of(self, files: list[tuple[str, Path]]) -> tuple:
+        fingerprint = []
+        for relative, path in files:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            fingerprint.append((relative, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+
+    def load(self):
+        """
+            Reads the frontend build into memory, replacing the current table
+        """
+        files = self._files()
+        assets = {}
+        for relative, path in files:
+            try:
+                assets[relative] = _load_asset(path, relative)
+            except OSError as e:
+                print(f"Frontend: Failed to read {relative}: {e}")
+        with self._lock:
+            self._assets = assets
+            self._fingerprint = self._fingerprint_of(files)
+            self.loads += 1
+        size = sum(len(asset.body) for asset in assets.values())
+        print(f"Frontend: Loaded {len(assets)} file(s), {size / 1024:.0f} KiB")
+        if brotli is not None and assets:
+            threading.Thread(target=self._add_brotli, args=(assets,), name="frontend-brotli", daemon=True).start()
+
+    def _add_brotli(self, assets: dict[str, Asset]):
+        for relative, asset in assets.items():
+            if not relative.endswith(COMPRESSIBLE_SUFFIXES):
+                continue
+            compressed = brotli.compress(asset.body, quality=11)
+            if len(compressed) < len(asset.body):
+                asset.encoded["br"] = compressed
+
+    def get(self, relative: str) -> Asset | None:
+        assets = self._assets
+        if assets is None:
+            self.load()
+            assets = self._assets
+        return assets.get(relative)
+
+    def page(self, path: str) -> Asset | None:
+        """
+            Looks up a path of the exported frontend: a static file, a page's .html file or the index
+        """
+        path = path.strip("/")
+        if path == "":
+            return self.get("index.html")
+        if path.endswith(STATIC_SUFFIXES):
+            return self.get(path)
+        return self.get(f"{path}.html")
+
+    def start_watching(self):
+        """
+            Reloads the table whenever a file of the build is added, changed or removed (for development)
+        """
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+
+        def watch():
+            while not self._stop_watching.wait(WATCH_INTERVAL_SECONDS):
+                try:
+                    if self._fingerprint_of(self._files()) != self._fingerprint:
+                        print("Frontend: Build changed, reloading")
+                        self.load()
+                except OSError as e:
+                    print(f"Frontend: Failed to check the build for changes: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="frontend-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_watching.set()
+        self._watcher = None
+
+
+def asset_response(request: Request, asset: Asset) -> Response:
+    """
+        Serves an asset in the best encoding the client accepts, answering with 304 Not Modified when its ETag matches
+    """
+    encoding = None
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for candidate in ["br", "gzip"]:
+        if candidate in asset.encoded and candidate in accepted:
+            encoding = candidate
+            break
+
+    # Every encoding of a file is a different representation, so each gets its own ETag
+    etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+    headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=asset.encoded[encoding], media_type=asset.media_type, headers=headers)
+    return Response(content=asset.body, media_type=asset.media_type, headers=headers)
+
+
+asset_table = AssetTable(str(Path(__file__).resolve().parent / "frontend"))
@@ -1,71 +1,47 @@
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse
-from fastapi.staticfiles import StaticFiles
-import logging
-import os
+from fastapi.responses import ORJSONResponse
+
+from home.assets import asset_table, asset_response
 
 home_router = APIRouter(tags=["Home"])
-frontend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
 
 ####### favicon #######
 
 
 @home_router.get("/favicon.ico", responses={200: {"description": "Success"}, 404: {"description": "Not Found"}})
-def favicon():
+def favicon(request: Request):
     """
         Serves the favicon
     """
-    if os.path.exists(os.path.join(frontend_path, "favicon.ico")):
-        return FileResponse(os.path.join(frontend_path, "favicon.ico"))
-    else:
+    asset = asset_table.get("favicon.ico")
+    if asset is None:
         return ORJSONResponse(content={"error": "File not found"}, status_code=404)
+    return asset_response(request, asset)
 
 ####### Index.txt #######
 
 
 @home_router.get("/index.txt", responses={200: {"description": "Success"}, 404: {"description": "Not Found"}})
-def index():
+def index(request: Request):
     """
-        Serves the favicon
+        Serves the index page's React Server Components payload
     """
-    if os.path.exists(os.path.join(frontend_path, "index.txt")):
-        return FileResponse(os.path.join(frontend_path, "index.txt"))
-    else:
+    asset = asset_table.get("index.txt")
+    if asset is None:
         return ORJSONResponse(content={"error": "File not found"}, status_code=404)
+    return asset_response(request, asset)
 
 ####### NextJS Build + Static #######
 
 
 @home_router.get("/")
 @home_router.get("/{path:path}", responses={200: {"description": "Success"}, 404: {"description": "Not Found"}})
-def home(request: Request, path: str = None):
+def home(request: Request, path: str = ""):
     """
-        Serves the NextJS Frontend
+        Serves the NextJS Frontend from the in-memory asset table (see home.assets)
     """
-    static_file_path = os.path.join(frontend_path, path)
-    print(path)
-
-    # Check if static file is a js, css, svg, woff2 file (To prevent leaking other files)
-    if static_file_path.endswith(".js") or static_file_path.endswith(".css") or static_file_path.endswith(".svg") or static_file_path.endswith(".woff2"):
-        # Checks if Static file exists
-        if os.path.isfile(static_file_path):
-            logging.info(f"Serving {static_file_path}")
-            return FileResponse(static_file_path)
-
-    if static_file_path.endswith(".html"):
-        # Check if frontend exists
-        logging.info(f"Serving {static_file_path}")
-        return HTMLResponse(open(static_file_path, "r", encoding="utf-8").read())
-
-    # Check if frontend page exists
-    if os.path.exists(os.path.join(frontend_path, f"{os.path.normpath(path)}.html")):
-        logging.info(f'Serving {os.path.join(frontend_path, f"{os.path.normpath(path)}.html")}')
-        return HTMLResponse(open(os.path.join(frontend_path, f"{os.path.normpath(path)}.html"), "r", encoding="utf-8").read())
-
-    # Path is empty (root path)
-    if path == "":
-        # Check if frontend index exists
-        if os.path.exists(os.path.join(frontend_path, "index.html")):
-            logging.info(f'Serving {os.path.join(frontend_path, "index.html")}')
-            return HTMLResponse(open(os.path.join(frontend_path, "index.html"), "r", encoding="utf-8").read())
-    return ORJSONResponse(content={"error": "Frontend not found"}, status_code=404)
+    # Only js, css, svg, woff2 and html files are in the table (To prevent leaking other files)
+    asset = asset_table.page(path)
+    if asset is None:
+        return ORJSONResponse(content={"error": "Frontend not found"}, status_code=404)
+    return asset_response(request, asset)
@@ -0,0 +1,152 @@
+from fastapi import Request, Response
+from hashlib import sha256
+from typing import NamedTuple
+
+import os
+import time
+import threading
+import orjson
+
+from config import Settings
+from inference.plugins import inference_path, list_plugins, load_plugin, plugin_path, PublicKeyError, FileSignatureError
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def _cached_body(content) -> CachedBody:
+    body = orjson.dumps(content)
+    return CachedBody(body, f'"{sha256(body).hexdigest()[:32]}"')
+
+
+def cached_json_response(request: Request, cached: CachedBody) -> Response:
+    """
+        Serves a precomputed JSON body, answering with 304 Not Modified when the client's ETag matches
+    """
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and cached.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+class _Catalogue(NamedTuple):
+    fingerprint: tuple
+    capabilities: CachedBody
+    models: CachedBody
+    formats: dict[str, CachedBody]
+    languages: dict[str, CachedBody]
+    model_sizes: dict[str, CachedBody]
+    errors: dict[str, str]
+
+
+class CapabilityCatalogue:
+    """
+        Precomputed answers for the plugin metadata endpoints.
+
+        The catalogue is built once and only rebuilt when a plugin folder, api.py or api.py.sig changes.
+        Change detection is throttled to once every `Settings.capabilityRefreshSeconds`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalogue: _Catalogue | None = None
+        self._checked_at = 0.0
+        self.build_seconds: float | None = None
+
+    @staticmethod
+    def _fingerprint():
+        plugins = []
+        for model in list_plugins():
+            path = plugin_path(model)
+            stat = os.stat(path)
+            sig_stat = os.stat(path + ".sig") if os.path.exists(path + ".sig") else None
+            plugins.append((
+                model,
+                stat.st_size, stat.st_mtime_ns,
+                (sig_stat.st_size, sig_stat.st_mtime_ns) if sig_stat else None
+            ))
+        return os.stat(inference_path).st_mtime_ns, tuple(plugins)
+
+    def _build(self, fingerprint) -> _Catalogue:
+        models = [plugin[0] for plugin in fingerprint[1]]
+        plugins = {}
+        errors = {}
+        for model in models:
+            try:
+                module = load_plugin(model)
+                plugins[model] = {
+                    "formats": module.supportedFormats(),
+                    "languages": module.supportedLanguages(),
+                    "modelSizes": module.getModels(),
+                }
+            except (FileSignatureError, PublicKeyError) as e:
+                errors[model] = e.args[0]
+            except Exception as e:
+                print(f"Capabilities: failed to load plugin {model}: {e}")
+                errors[model] = str(e)
+
+        return _Catalogue(
+            fingerprint=fingerprint,
+            capabilities=_cached_body({"models": models, "plugins": plugins, "errors": errors}),
+            models=_cached_body(models),
+            formats={model: _cached_body(p["formats"]) for model, p in plugins.items()},
+            languages={model: _cached_body(p["languages"]) for model, p in plugins.items()},
+            model_sizes={model: _cached_body(p["modelSizes"]) for model, p in plugins.items()},
+            errors=errors,
+        )
+
+    def rebuild(self):
+        with self._lock:
+            started = time.perf_counter()
+            fingerprint = self._fingerprint()
+            self._catalogue = self._build(fingerprint)
+            self._checked_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+            print(f"Capabilities: catalogue built for {len(fingerprint[1])} plugin(s) in {self.build_seconds:.2f} s")
+            return self._catalogue
+
+    def rebuild_in_background(self) -> threading.Thread:
+        """
+            Builds the catalogue in a daemon thread, so loading the plugins (and with them torch and whisper)
+            doesn't hold up startup. Requests for the catalogue made meanwhile wait for the build.
+        """
+        def build():
+            try:
+                self.rebuild()
+            except Exception as e:
+                # get() tries again on the next request
+                print(f"Capabilities: background build failed: {e}")
+
+        thread = threading.Thread(target=build, name="capability-catalogue", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        catalogue = self._catalogue
+        return {
+            "ready": catalogue is not None,
+            "plugins": [plugin[0] for plugin in catalogue.fingerprint[1]] if catalogue else [],
+            "errors": catalogue.errors if catalogue else {},
+            "buildSeconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+        }
+
+    def get(self) -> _Catalogue:
+        catalogue = self._catalogue
+        if catalogue is not None and time.monotonic() - self._checked_at < Settings.capabilityRefreshSeconds:
+            return catalogue
+
+        with self._lock:
+            if self._catalogue is not None and time.monotonic() - self._checked_at < Settings.capabilityRefreshSeconds:
+                return self._catalogue
+            fingerprint = self._fingerprint()
+            if self._catalogue is None or self._catalogue.fingerprint != fingerprint:
+                self._catalogue = self._build(fingerprint)
+                print("Capabilities: plugins changed, catalogue rebuilt")
+            self._checked_at = time.monotonic()
+            return self._catalogue
+
+
+capability_catalogue = CapabilityCatalogue()
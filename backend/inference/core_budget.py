@@ -0,0 +1,195 @@
+"""
+    Splits the CPU cores between the inference jobs that are running at the same time.
+
+    Every job thread would otherwise use torch's default of one intra-op thread per core, so with
+    multi job enabled N jobs run N * cores threads and spend their time contending for the same cores.
+    Jobs register with the budget once they hold their model (a job waiting for another job to finish
+    with the same model instance can't use any cores) and get an equal share of the cores; shares are
+    recalculated whenever a job starts or finishes and picked up by the running jobs at their next
+    `apply`. With OpenMP, torch's intra-op thread count is a per-thread setting, which is what allows
+    each job thread to have its own.
+"""
+from contextlib import contextmanager
+
+import os
+import threading
+
+from config import Settings
+
+
+def _torch():
+    """
+        Returns the torch module, or None for plugins that don't use torch
+    """
+    try:
+        import torch
+        return torch
+    except ImportError:
+        return None
+
+
+def _process_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Read once at import: sched_getaffinity(0) returns the calling thread's CPUs, which are a job's share once pinned
+_available_cpus = _process_cpus()
+
+
+class _Allocation:
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.threads = 1
+        self.cpus: list[int] = []
+        self.applied_threads: int | None = None     # What the job's thread last set, None until it has applied
+        self.applied_cpus: list[int] | None = None
+        self.job_id: int | None = None              # Set once registered, see CoreBudget.start
+
+
+class CoreBudget:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: dict[int, _Allocation] = {}     # Keyed by registration number so one task can run several jobs
+        self._next_id = 0
+        self._local = threading.local()
+        self._interop_set = False
+        self.rebalances = 0
+
+    @property
+    def total_cores(self) -> int:
+        cpus = len(_available_cpus)
+        return min(Settings.cpuCoreBudget, cpus) if Settings.cpuCoreBudget > 0 else cpus
+
+    def _rebalance(self):
+        """
+            Gives every job an equal share of the cores, the first jobs get any remainder.
+            Called with the lock held.
+        """
+        self.rebalances += 1
+        if not self._jobs:
+            return
+        cpus = _available_cpus[:self.total_cores]
+        share, remainder = divmod(len(cpus), len(self._jobs))
+        start = 0
+        for index, allocation in enumerate(self._jobs.values()):
+            count = share + (1 if index < remainder else 0)
+            allocation.threads = max(1, count)
+            # More jobs than cores: jobs share single cores round robin
+            allocation.cpus = cpus[start:start + count] if count else [cpus[index % len(cpus)]]
+            start += count
+
+    @contextmanager
+    def job(self, task_id: str):
+        """
+            Gives the calling thread's job a share of the cores for the duration of the block. The job is
+            registered by `start`, which the model cache calls once the job holds its model, or by the
+            job's first `apply` if it doesn't use the model cache.
+        """
+        self._set_interop_threads()
+        previous = getattr(self._local, "allocation", None)
+        allocation = self._local.allocation = _Allocation(task_id)
+        # Pool threads are reused for other work afterwards, so their affinity is put back
+        original_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+        try:
+            yield allocation
+        finally:
+            self._local.allocation = previous
+            if allocation.job_id is not None:
+                with self._lock:
+                    del self._jobs[allocation.job_id]
+                    self._rebalance()
+            if allocation.applied_cpus is not None and original_cpus is not None:
+                self._set_affinity(allocation, original_cpus)
+            if previous is not None:
+                self.apply()
+
+    def start(self):
+        """
+            Registers the calling thread's job if it isn't yet and applies its share
+        """
+        allocation: _Allocation | None = getattr(self._local, "allocation", None)
+        if allocation is None or allocation.job_id is not None:
+            return
+        with self._lock:
+            allocation.job_id = self._next_id
+            self._next_id += 1
+            self._jobs[allocation.job_id] = allocation
+            self._rebalance()
+        self.apply()
+
+    def threads(self) -> int:
+        """
+            Returns the calling thread's job's share of the cores, or every core outside of a job
+        """
+        allocation: _Allocation | None = getattr(self._local, "allocation", None)
+        if allocation is None or allocation.job_id is None:
+            return self.total_cores
+        return allocation.threads
+
+    def apply(self):
+        """
+            Applies the calling thread's current share if it changed since it was last applied.
+            Cheap enough to call from progress callbacks, which is how running jobs pick up rebalances.
+        """
+        allocation: _Allocation | None = getattr(self._local, "allocation", None)
+        if allocation is None:
+            return
+        if allocation.job_id is None:
+            self.start()
+            return
+        threads, cpus = allocation.threads, allocation.cpus
+
+        torch = _torch()
+        if torch and threads != allocation.applied_threads:
+            torch.get_num_threads()             # Initialise the thread's defaults first, or they override ours later
+            torch.set_num_threads(threads)
+            allocation.applied_threads = threads
+
+        if Settings.cpuAffinity and cpus != allocation.applied_cpus:
+            self._set_affinity(allocation, cpus)
+
+    def _set_affinity(self, allocation: _Allocation, cpus: list[int]):
+        if not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            # pid 0 pins only the calling thread. OpenMP threads it has already started keep their affinity.
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"Core budget: Failed to set the CPU affinity of task {allocation.task_id}: {e}")
+        allocation.applied_cpus = cpus
+
+    def _set_interop_threads(self):
+        if self._interop_set:
+            return
+        self._interop_set = True
+        torch = _torch()
+        if torch is None:
+            return
+        try:
+            torch.set_num_interop_threads(Settings.cpuInteropThreads)
+        except RuntimeError as e:
+            # Can only be set before torch has started any inter-op work
+            print(f"Core budget: Could not set inter-op threads: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "totalCores": self.total_cores,
+                "affinity": Settings.cpuAffinity,
+                "interopThreads": Settings.cpuInteropThreads,
+                "rebalances": self.rebalances,
+                "jobs": [
+                    {
+                        "task_id": allocation.task_id,
+                        "threads": allocation.threads,
+                        "appliedThreads": allocation.applied_threads,
+                        "cpus": allocation.cpus if Settings.cpuAffinity else None,
+                    }
+                    for allocation in self._jobs.values()
+                ],
+            }
+
+
+core_budget = CoreBudget()
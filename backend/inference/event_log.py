@@ -0,0 +1,118 @@
+"""
+    Replayable log of every task's SSE events.
+
+    Events published through the broadcaster alone are lost when nobody is subscribed yet, so a fast job
+    could finish before its client connected, and a reconnecting EventSource missed whatever happened
+    while it was away. Every event is now kept in a bounded per-task ring buffer with an increasing ID.
+    Subscribers are replayed the buffer from the ID after their `Last-Event-ID` before following new
+    events. Logs of tasks nobody has published to or read for `Settings.eventLogTtlSeconds` are dropped.
+"""
+from collections import deque
+from typing import AsyncIterator, NamedTuple
+
+import asyncio
+import time
+
+from config import Settings
+
+SWEEP_INTERVAL_SECONDS = 30
+
+
+class TaskEvent(NamedTuple):
+    id: int
+    message: str
+    published_at: float     # time.monotonic() when the event was published
+
+
+class _TaskLog:
+    def __init__(self):
+        self.events: deque[TaskEvent] = deque(maxlen=max(1, Settings.eventLogMaxEvents))
+        self.next_id = 1
+        self.subscribers = 0
+        self.last_used = time.monotonic()
+        # Replaced after every event, subscribers wait on the one they saw last
+        self.changed = asyncio.Event()
+
+    def since(self, event_id: int) -> list[TaskEvent]:
+        return [event for event in self.events if event.id >= event_id]
+
+
+class TaskEventLog:
+    """
+        Drop-in for the broadcaster's `publish(channel=, message=)` where the channel is the task ID.
+        Must be used from the event loop's thread; worker threads publish with `run_coroutine_threadsafe`.
+    """
+
+    def __init__(self):
+        self._logs: dict[str, _TaskLog] = {}
+        self._last_sweep = time.monotonic()
+        self.published = 0
+        self.replayed = 0
+
+    def _log(self, task_id: str) -> _TaskLog:
+        log = self._logs.get(task_id)
+        if log is None:
+            log = self._logs[task_id] = _TaskLog()
+        log.last_used = time.monotonic()
+        return log
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        for task_id, log in list(self._logs.items()):
+            if log.subscribers == 0 and now - log.last_used > Settings.eventLogTtlSeconds:
+                del self._logs[task_id]
+
+    async def publish(self, channel: str, message: str):
+        self._sweep()
+        log = self._log(channel)
+        log.events.append(TaskEvent(log.next_id, message, time.monotonic()))
+        log.next_id += 1
+        self.published += 1
+        changed, log.changed = log.changed, asyncio.Event()
+        changed.set()
+
+        # Keep the broadcaster as the live bus for anything else subscribed to it
+        await Settings.broadcast.publish(channel=channel, message=message)
+
+    async def subscribe(self, task_id: str, last_event_id: int = 0) -> AsyncIterator[TaskEvent]:
+        """
+            Yields the task's events after `last_event_id`, starting with those already in the log,
+            then waits for new ones. Runs until the caller stops iterating.
+        """
+        log = self._log(task_id)
+        log.subscribers += 1
+        next_id = last_event_id + 1
+        replaying = True
+        try:
+            while True:
+                changed = log.changed
+                for event in log.since(next_id):
+                    if replaying:
+                        self.replayed += 1
+                    next_id = event.id + 1
+                    yield event
+                replaying = False
+                await changed.wait()
+                log.last_used = time.monotonic()
+        finally:
+            log.subscribers -= 1
+            log.last_used = time.monotonic()
+
+    def events(self, task_id: str) -> list[TaskEvent]:
+        log = self._logs.get(task_id)
+        return list(log.events) if log else []
+
+    def stats(self) -> dict:
+        return {
+            "tasks": len(self._logs),
+            "events": sum(len(log.events) for log in self._logs.values()),
+            "subscribers": sum(log.subscribers for log in self._logs.values()),
+            "published": self.published,
+            "replayed": self.replayed,
+        }
+
+
+event_log = TaskEventLog()
@@ -1,126 +1,101 @@
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Query, Request, Response, HTTPException
 from fastapi.responses import ORJSONResponse
 from sse_starlette import EventSourceResponse
 from pydantic import BaseModel
 
 from pathlib import Path
-from ffmpy import FFmpeg, FFprobe
 from platformdirs import user_downloads_dir, user_data_dir
 
 import os
-import subprocess
+import time
 import asyncio
 import threading
-import importlib.util
-import importlib.machinery
-
-import base64
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.exceptions import InvalidSignature
+from functools import partial
+from contextlib import aclosing
 
 from config import Settings
+from inference.model_cache import model_cache
+from inference.plugins import load_plugin, plugin_digest
+from inference.capabilities import capability_catalogue, cached_json_response
+from inference.scheduler import scheduler
+from inference.pipeline import Pipeline, Stage, pipeline_stats
+from inference.subtitle_stream import SegmentStream
+from inference.core_budget import core_budget
+from inference.event_log import event_log
+from inference.transcript_cache import transcript_cache, fingerprint, cache_key
+from inference.transcript_store import transcript_store
+from inference.media_probe import media_probe, MediaInfo, ProbeError
+from inference.mux import mux_runner
+from inference.profiler import profiler, ProfilerError
+from inference.warmup import warmup_service
+from inference.workers import worker_pools
+from inference.metrics import metrics, Family, Sample, CONTENT_TYPE, decode_seconds, inference_seconds, realtime_factor, serialise_seconds, mux_seconds
 import pysubs2
 import uuid
 import json
 
 # --- Globals ---
 tqdm_patch_lock = threading.Lock()
+_task_watchers: set[asyncio.Task] = set()
 # ---
 
 
-class PublicKeyError(Exception):
-    """Raised when there are problems with the public key  """
-
-
-class FileSignatureError(Exception):
-    """Raised when there are problems related to the file signature """
-
-
-def verify_file(public_key, file_path):
-    # Read file data
-    with open(file_path, 'rb') as f:
-        file_data = f.read()
-
-    # Read signature
-    sig_path = str(file_path) + '.sig'
-    with open(sig_path, 'rb') as f:
-        signature = base64.b64decode(f.read())
+transcription_router = APIRouter(tags=["Transcription"])
 
-    # Calculate file digest
-    hasher = hashes.Hash(hashes.SHA256())
-    hasher.update(file_data)
 
-    # Verify signature
-    try:
-        public_key.verify(
-            signature,
-            file_data,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
-        verified = True
-    except InvalidSignature:
-        verified = False
-    return verified
+@transcription_router.get("/available_models")
+def getModels(request: Request):
+    return cached_json_response(request, capability_catalogue.get().models)
 
 
-def load_source(modname, filename):
-    if not Settings.allowUnsignedCode:
-        if not Settings.publicKey:
-            raise PublicKeyError("The application is missing its public key")
-        else:
-            if os.path.exists(filename + ".sig"):
-                if not verify_file(Settings.publicKey, filename):
-                    raise FileSignatureError("Signature check failed")
-            else:
-                raise FileSignatureError("Signature file is missing")
+def _pluginCapability(request: Request, model: str, field: str):
+    catalogue = capability_catalogue.get()
+    if model in catalogue.errors:
+        raise HTTPException(status_code=500, detail=catalogue.errors[model])
+    table = getattr(catalogue, field)
+    if model not in table:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model}")
+    return cached_json_response(request, table[model])
 
-    loader = importlib.machinery.SourceFileLoader(modname, filename)
-    spec = importlib.util.spec_from_file_location(modname, filename, loader=loader)
-    module = importlib.util.module_from_spec(spec)
 
-    # sys.modules[module.__name__] = module  # Cache the module in sys.modules
-    loader.exec_module(module)
-    return module
+@transcription_router.get("/supported_formats")
+def getSupportedFormats(request: Request, model: str):
+    return _pluginCapability(request, model, "formats")
 
 
-transcription_router = APIRouter(tags=["Transcription"])
+@transcription_router.get("/supported_languages")
+def getSupportedLanguages(request: Request, model: str):
+    return _pluginCapability(request, model, "languages")
 
 
-@transcription_router.get("/available_models")
-def getModels():
-    return [a for a in os.listdir("./inference/") if os.path.isdir("./inference/" + a) and a != "__pycache__"]
+@transcription_router.get("/supported_model_sizes")
+def getModelSizes(request: Request, model: str):
+    return _pluginCapability(request, model, "model_sizes")
 
 
-@transcription_router.get("/supported_formats")
-def getSupportedFormats(model):
-    try:
-        getFormats = load_source('supportedFormats', f'./inference/{model}/api.py')
-        return getFormats.supportedFormats()
-    except (FileSignatureError, PublicKeyError) as e:
-        raise HTTPException(status_code=500, detail=e.args[0])
+@transcription_router.get("/capabilities")
+def getCapabilities(request: Request):
+    """
+        Returns the available models along with the formats, languages and model sizes of every plugin
+    """
+    return cached_json_response(request, capability_catalogue.get().capabilities)
 
 
-@transcription_router.get("/supported_languages")
-def getSupportedLanguages(model):
-    try:
-        getLanguages = load_source('supportedLanguages', f'./inference/{model}/api.py')
-        return getLanguages.supportedLanguages()
-    except (FileSignatureError, PublicKeyError) as e:
-        raise HTTPException(status_code=500, detail=e.args[0])
+@transcription_router.get("/ready")
+def getReady():
+    """
+        Returns whether the plugins have been loaded, answering 503 until they are so it can be polled
+    """
+    status = capability_catalogue.status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
-@transcription_router.get("/supported_model_sizes")
-def getModelSizes(model):
-    try:
-        getSizes = load_source('getModels', f'./inference/{model}/api.py')
-        return getSizes.getModels()
-    except (FileSignatureError, PublicKeyError) as e:
-        raise HTTPException(status_code=500, detail=e.args[0])
+@transcription_router.get("/model_cache")
+def getModelCacheStats():
+    """
+        Returns hit/miss/eviction counters and the models currently held by the model cache
+    """
+    return model_cache.stats()
 
 
 class TranscriptionRequest(BaseModel):
@@ -132,143 +107,762 @@ class TranscriptionRequest(BaseModel):
     overWriteFiles: bool
     outputFormats: list[str]
     saveLocation: str
+    priority: int = 0                   # Higher priority jobs are scheduled first
+    batched: bool = False               # Decode windows from several files together (for many short clips)
+    vad: bool = False                   # Skip silence before inference
+    parallel: bool = False              # Transcribe chunks of long files in parallel processes (CPU plugin)
 
 
-async def transcribeWorker(path, task_id: str, req: TranscriptionRequest):
+def _baseLocation(path, req: TranscriptionRequest):
+    return os.path.join(user_downloads_dir(), Path(
+        path).stem) if req.saveLocation == "default" else os.path.join(req.saveLocation, Path(path).stem)
+
+
+def writeSubtitles(path, result: dict, req: TranscriptionRequest, streamed_formats: frozenset[str] | set[str] = frozenset()):
+    """
+        Writes a transcription result in every requested format.
+        Formats in `streamed_formats` were already written while transcribing and are skipped.
+        Returns the subtitles and the location of the .ass file if one was written.
+    """
+    with serialise_seconds.time(plugin=req.model, model_size=req.modelSize):
+        subs = pysubs2.load_from_whisper(result)
+        assLocation = ""
+        for format in req.outputFormats:
+            baseLocation = _baseLocation(path, req)
+            if format.lower() in streamed_formats:
+                continue
+
+            match format.lower():
+                case "mpl2":
+                    subs.save(f"{baseLocation}(mpl2).txt", format_="mpl2")
+                case "tmp":
+                    subs.save(f"{baseLocation}(tmp).txt", format_="tmp")
+                case "microdvd":
+                    # Frame rate from the preflight probe, which is normally cached by now
+                    info = media_probe.probe_sync(path)
+                    if info is None or info.fps is None:
+                        raise ValueError("MicroDVD subtitles need the video's frame rate, which couldn't be read")
+                    subs.save(f"{baseLocation}(microdvd).sub", format_="microdvd", fps=info.fps)
+                case "ass":
+                    subs.save(f"{baseLocation}.ass")
+                    assLocation = f"{baseLocation}.ass"
+                case "webvtt":
+                    subs.save(f"{baseLocation}.vtt")
+                case _:
+                    subs.save(f"{baseLocation}.{format.lower()}")
+
+    return subs, assLocation
+
+
+def _streamMaps(path) -> list[str]:
+    """
+        ffmpeg -map options that keep every video and audio stream of the input
+    """
+    info = media_probe.cached(path)
+    if info is None:
+        return ["-map", "0:0", "-map", "0:1"]      # Assume a video stream followed by an audio stream
+    streams = sorted(info.video_streams + info.audio_streams, key=lambda stream: stream["index"])
+    return [option for stream in streams for option in ("-map", f"0:{stream['index']}")]
+
+
+async def embedSubtitles(path, subs, assLocation: str, req: TranscriptionRequest, task_id: str):
+    """
+        Muxes the subtitles into a copy of the video, replacing the original when overWriteFiles is set
+    """
+    extension = os.path.splitext(path)[1]
+    subtitle_codecs = {".mp4": "mov_text", ".mkv": "ass"}
+    if extension not in subtitle_codecs:
+        return False, "Unable to embed subtitles into this file format"
+
+    if assLocation == "":
+        save_dir = user_data_dir(Settings.appName, Settings.appAuthor)
+        os.makedirs(save_dir, exist_ok=True)
+        assLocation = os.path.join(save_dir, f"{Path(path).stem}.ass")
+        await asyncio.to_thread(subs.save, assLocation)
+
+    os.makedirs(user_downloads_dir(), exist_ok=True)
+    outPath = os.path.join(user_downloads_dir(), f'{Path(path).stem}(Subtitled){extension}')
+    counter = 1
+    while os.path.exists(outPath):
+        outPath = os.path.join(user_downloads_dir(), f'{Path(path).stem}(Subtitled)[{counter}]{extension}')
+        counter += 1
+
+    info = media_probe.cached(path)
+    args = [
+        "-y", "-i", path, "-f", "ass", "-i", assLocation, *_streamMaps(path), "-map", "1:0",
+        "-c:v", "copy", "-c:a", "copy", "-c:s", subtitle_codecs[extension],
+    ]
+    with mux_seconds.time(plugin=req.model, model_size=req.modelSize):
+        await mux_runner.run(task_id, path, args, outPath, info.duration if info else None)
+
+    # Only replace the original once the subtitled copy has been written
+    if req.overWriteFiles:
+        try:
+            os.replace(outPath, path)
+        except FileNotFoundError:
+            print(f"Error: Source file {outPath} not found")
+        except PermissionError:
+            print(f"Error: Permission denied when trying to replace {path}")
+        except OSError as e:
+            print(f"Error replacing file: {e}")
+    return True, "Success"
+
+
+def indexTranscript(path, result: dict, req: TranscriptionRequest):
+    """
+        Adds a result to the searchable transcript store. Runs in a worker thread.
+    """
+    if not Settings.transcriptStoreEnabled:
+        return
+    try:
+        transcript_store.add(os.path.abspath(path), result, req.model, req.modelSize)
+    except Exception as e:
+        print(f"Failed to add {path} to the transcript store: {e}")
+
+
+async def saveSubtitles(path, result: dict, task_id: str, req: TranscriptionRequest, streamed_formats: frozenset[str] | set[str] = frozenset()):
+    """
+        Writes a transcription result in every requested format and embeds it into the video if requested
+    """
+    subs, assLocation = await asyncio.to_thread(profiler.call, task_id, writeSubtitles, path, result, req, streamed_formats)
+    await asyncio.to_thread(indexTranscript, path, result, req)
+    if req.embedSubtitles:
+        return await embedSubtitles(path, subs, assLocation, req, task_id)
+    return True, "Success"
+
+
+async def _publishFileError(task_id: str, message: str):
+    error_event = json.dumps({
+        "type": "status",
+        "status": "ERROR",
+        "message": message
+    })
+    await event_log.publish(channel=task_id, message=error_event)
+
+
+async def _cacheLookup(path, task_id: str, req: TranscriptionRequest, batched: bool = False):
+    """
+        Looks the file up in the transcript cache and reports the hit or miss to the task.
+        Returns (cache key, cached result or None). The key is None when the result can't be cached.
+        Only the options the file is transcribed with are part of the key, `batched` when it goes
+        through the plugin's batched mode.
+    """
+    if not Settings.transcriptCacheEnabled:
+        return None, None
+    try:
+        media = await asyncio.to_thread(fingerprint, path)
+        options = {"batched": True} if batched else {"vad": req.vad, "parallel": req.parallel}
+        key = cache_key(media, req.model, plugin_digest(req.model), req.modelSize, req.language, options)
+        result = await asyncio.to_thread(transcript_cache.get, key)
+    except Exception as e:
+        print(f"Task {task_id}: Transcript cache lookup failed for {path}: {e}")
+        return None, None
+
+    stats = transcript_cache.stats()
+    await event_log.publish(channel=task_id, message=json.dumps({
+        "type": "cache",
+        "task_id": task_id,
+        "file": Path(path).name,
+        "hit": result is not None,
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "hitRatio": stats["hitRatio"],
+    }))
+    return key, result
+
+
+async def _cacheStore(key: str | None, result: dict):
+    if key is None:
+        return
+    try:
+        await asyncio.to_thread(transcript_cache.put, key, result)
+    except Exception as e:
+        print(f"Transcript cache: Failed to store result: {e}")
+
+
+def _observeInference(paths: list[str], seconds: float, req: TranscriptionRequest):
+    """
+        Records a successful inference's time, and its real-time factor when every file's duration is known
+    """
+    inference_seconds.observe(seconds, plugin=req.model, model_size=req.modelSize)
+    durations = [info.duration if info else None for info in map(media_probe.cached, paths)]
+    if durations and all(durations):
+        realtime_factor.observe(seconds / sum(durations), plugin=req.model, model_size=req.modelSize)
+
+
+def _withCoreBudget(task_id: str, function, *args, **kwargs):
+    """
+        Runs a plugin call in the calling thread with the thread's share of the CPU cores applied
+    """
+    with core_budget.job(task_id), profiler.task_thread(task_id):
+        return function(*args, **kwargs)
+
+
+async def _inWorker(function: str, audio, task_id: str, req: TranscriptionRequest, **kwargs):
+    """
+        Runs a plugin call in one of the plugin's worker processes (see inference.workers).
+        Only one job runs at a time when multi job is disabled, as with in-process plugins.
+    """
+    serialised = not Settings.enable_multi_job
+    if serialised:
+        # Polled rather than acquired in a thread, so a cancelled job can't leave the lock held
+        while not tqdm_patch_lock.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+    try:
+        return await worker_pools.run(req.model, function, task_id, audio, req.modelSize, req.language, **kwargs)
+    finally:
+        if serialised:
+            tqdm_patch_lock.release()
+
+
+async def inferFile(path, audio, task_id: str, req: TranscriptionRequest):
+    """
+        Runs the plugin on one file. `audio` is either the path or audio already decoded by the plugin.
+        Returns (success, result or error message, formats that were streamed to disk).
+    """
     loop = asyncio.get_running_loop()
 
-    unique_modname = f"inference_api_{req.model.replace('(', '_').replace(')', '')}_{task_id}"
-    api_module_path = os.path.join(".", "inference", req.model, "api.py")
+    generator_module = load_plugin(req.model)
+
+    stream = None
+    try:
+        if Settings.streamSegments:
+            stream = SegmentStream(path, _baseLocation(path, req), req.outputFormats, task_id, loop)
+
+        started = time.perf_counter()
+        if worker_pools.enabled(req.model):
+            success, message = await _inWorker(
+                "generateSubtitle",
+                audio,
+                task_id,
+                req,
+                on_segment=stream.on_segment if stream else None,
+                vad=req.vad,
+                parallel=req.parallel
+            )
+        else:
+            success, message = await asyncio.to_thread(
+                _withCoreBudget,
+                task_id,
+                generator_module.generateSubtitle,
+                audio,
+                req.modelSize,
+                req.language,
+                task_id,
+                event_log,
+                loop,
+                tqdm_patch_lock,
+                on_segment=stream.on_segment if stream else None,
+                vad=req.vad,
+                parallel=req.parallel
+            )
+    except Exception:
+        if stream:
+            stream.discard()
+        raise
+
+    if not success:
+        if stream:
+            stream.discard()
+        return False, message, set()
+    _observeInference([path], time.perf_counter() - started, req)
+    if "vad" in message:
+        await event_log.publish(channel=task_id, message=json.dumps({
+            "type": "vad",
+            "task_id": task_id,
+            "file": Path(path).name,
+            **message["vad"],
+        }))
+
+    if stream:
+        stream.close()
+        return True, message, stream.formats
+    return True, message, set()
+
+
+async def _schedule(task_id: str, req: TranscriptionRequest, function, *args):
+    """
+        Runs an inference call as a scheduler job and waits for its outcome. Only the inference holds
+        the device's slot, what is done with the result afterwards doesn't keep other jobs waiting.
+    """
+    job = scheduler.submit(req.model, task_id, partial(function, *args), req.priority)
+    return await job.future
 
-    generator_module = load_source(unique_modname, api_module_path)
 
-    unprocessables = []
+async def transcribeWorker(path, task_id: str, req: TranscriptionRequest):
     try:
-        success, message = await asyncio.to_thread(
-            generator_module.generateSubtitle,
-            path,
+        key, cached = await _cacheLookup(path, task_id, req)
+        if cached is not None:
+            return await saveSubtitles(path, cached, task_id, req)
+
+        success, message, streamed_formats = await _schedule(task_id, req, inferFile, path, path, task_id, req)
+        if success:
+            await _cacheStore(key, message)
+            return await saveSubtitles(path, message, task_id, req, streamed_formats)
+        else:
+            print(f"Task {task_id}: Transcription failed for {path} with message: {message}")
+            await _publishFileError(task_id, f"Transcription error for {Path(path).name}: {message}")
+    except Exception as e:
+        print(f"Task {task_id}: Error during transcription: {e}")
+        await _publishFileError(task_id, f"Error processing file {Path(path).name}: {str(e)}")
+
+
+async def inferBatch(paths: list[str], task_id: str, req: TranscriptionRequest):
+    """
+        Runs the plugin's batched mode on several files. Returns a (success, result or error message) pair per file.
+    """
+    loop = asyncio.get_running_loop()
+    generator_module = load_plugin(req.model)
+
+    started = time.perf_counter()
+    if worker_pools.enabled(req.model):
+        outcomes = await _inWorker("generateSubtitleBatch", paths, task_id, req, batch_size=Settings.inferenceBatchSize)
+    else:
+        outcomes = await asyncio.to_thread(
+            _withCoreBudget,
+            task_id,
+            generator_module.generateSubtitleBatch,
+            paths,
             req.modelSize,
             req.language,
             task_id,
-            Settings.broadcast,
+            event_log,
             loop,
-            tqdm_patch_lock
+            tqdm_patch_lock,
+            Settings.inferenceBatchSize
         )
-        if success:
-            subs = pysubs2.load_from_whisper(message)
-            assLocation = ""
-            for format in req.outputFormats:
-                baseLocation = os.path.join(user_downloads_dir(), Path(
-                    path).stem) if req.saveLocation == "default" else os.path.join(req.saveLocation, Path(path).stem)
-
-                match format.lower():
-                    case "mpl2":
-                        subs.save(f"{baseLocation}(mpl2).txt", format_="mpl2")
-                    case "tmp":
-                        subs.save(f"{baseLocation}(tmp).txt", format_="tmp")
-                    case "microdvd":
-                        ffprobe_cmd = FFprobe(
-                            inputs={path: None},
-                            global_options=[
-                                "-v", "0",                               # Suppress all output except for errors
-                                "-of", "csv=p=0",                        # Output format as plain CSV without headers
-                                "-select_streams", "v:0",                # Select the first video stream
-                                "-show_entries", "stream=r_frame_rate",  # Show only the frame rate
-                            ]
-                        )
-                        fps_ratio = subprocess.check_output(ffprobe_cmd.cmd, shell=True).decode().strip()
-                        num, denom = map(int, fps_ratio.split('/'))
-                        fps = num / denom
-                        subs.save(f"{baseLocation}(microdvd).sub", format_="microdvd", fps=fps)
-                    case "ass":
-                        subs.save(f"{baseLocation}.ass")
-                        assLocation = f"{baseLocation}.ass"
-                    case "webvtt":
-                        subs.save(f"{baseLocation}.vtt")
-                    case _:
-                        subs.save(f"{baseLocation}.{format.lower()}")
-
-            if req.embedSubtitles:
-                if assLocation == "":
-                    save_dir = user_data_dir(Settings.appName, Settings.appAuthor)
-                    os.makedirs(save_dir, exist_ok=True)
-                    assLocation = os.path.join(save_dir, f"{Path(path).stem}.ass")
-                    subs.save(assLocation)
-
-                ff = None
-                outPath = os.path.join(user_downloads_dir(), f'{Path(path).stem}(Subtitled){os.path.splitext(path)[1]}')
-                counter = 1
-                while os.path.exists(outPath):
-                    outPath = f'{user_downloads_dir()}\\{Path(path).stem}(Subtitled)[{counter}]{os.path.splitext(path)[1]}'
-                    counter += 1
-
-                if os.path.splitext(path)[1] == ".mp4":
-                    ff = FFmpeg(
-                        inputs={path: None},
-                        outputs={
-                            f"{outPath}": f"-y -f ass -i '{assLocation}' -map 0:0 -map 0:1 -map 1:0 -c:v copy -c:a copy -c:s mov_text"
-                        }
-
-                    )
-                elif os.path.splitext(path)[1] == ".mkv":
-
-                    ff = FFmpeg(
-                        inputs={path: None},
-                        outputs={
-                            f"{outPath}": f"-y -f ass -i '{assLocation}' -map 0:0 -map 0:1 -map 1:0 -c:v copy -c:a copy -c:s ass"
-                        }
-                    )
-                else:
-                    unprocessables.append((path, "Unable to embed subtitles into this file format"))
-                    return False, "Unable to embed subtitles into this file format"
-                if req.overWriteFiles:
-                    try:
-                        os.replace(outPath, path)
-                    except FileNotFoundError:
-                        print(f"Error: Source file {outPath} not found")
-                    except PermissionError:
-                        print(f"Error: Permission denied when trying to replace {path}")
-                    except OSError as e:
-                        print(f"Error replacing file: {e}")
-
-                print(ff.cmd)
-                ff.run()
-            return True, "Success"
-        else:
-            print(f"Task {task_id}: Transcription failed for {path} with message: {message}")
-            error_event = json.dumps({
-                "type": "status",
-                "status": "ERROR",
-                "message": f"Transcription error for {Path(path).name}: {message}"
-            })
-            await Settings.broadcast.publish(channel=task_id, message=error_event)
+    _observeInference(paths, time.perf_counter() - started, req)
+    return outcomes
+
+
+async def transcribeBatchWorker(paths: list[str], task_id: str, req: TranscriptionRequest):
+    """
+        Transcribes several files in one batched inference call, then saves each file's subtitles.
+        Only the inference is a scheduler job, the device is free for other jobs while the subtitles are written and muxed.
+    """
+    generator_module = load_plugin(req.model)
+    if not hasattr(generator_module, "generateSubtitleBatch"):
+        # Plugin has no batched mode, fall back to one file at a time
+        for path in paths:
+            await transcribeWorker(path, task_id, req)
+        return
+
+    # Files with a cached result are saved straight away, only the rest are batched
+    keys = {}
+    misses = []
+    for path in paths:
+        key, cached = await _cacheLookup(path, task_id, req, batched=True)
+        if cached is None:
+            keys[path] = key
+            misses.append(path)
+            continue
+        try:
+            await saveSubtitles(path, cached, task_id, req)
+        except Exception as e:
+            print(f"Task {task_id}: Error saving subtitles: {e}")
+            await _publishFileError(task_id, f"Error processing file {Path(path).name}: {str(e)}")
+    if not misses:
+        return
+    paths = misses
+
+    try:
+        outcomes = await _schedule(task_id, req, inferBatch, paths, task_id, req)
     except Exception as e:
-        print(f"Task {task_id}: Error during transcription: {e}")
-        error_message = json.dumps({
-            "type": "status",
-            "status": "ERROR",
-            "message": f"Error processing file {Path(path).name}: {str(e)}"
-        })
-        await Settings.broadcast.publish(channel=task_id, message=error_message)
+        print(f"Task {task_id}: Error during batched transcription: {e}")
+        await _publishFileError(task_id, f"Error processing batch of {len(paths)} files: {str(e)}")
+        return
+
+    for path, (success, message) in zip(paths, outcomes):
+        try:
+            if success:
+                await _cacheStore(keys[path], message)
+                await saveSubtitles(path, message, task_id, req)
+            else:
+                print(f"Task {task_id}: Transcription failed for {path} with message: {message}")
+                await _publishFileError(task_id, f"Transcription error for {Path(path).name}: {message}")
+        except Exception as e:
+            print(f"Task {task_id}: Error saving subtitles: {e}")
+            await _publishFileError(task_id, f"Error processing file {Path(path).name}: {str(e)}")
 
 
-@transcription_router.post("/transcribe")
-def transcribe(background_tasks: BackgroundTasks, req: TranscriptionRequest):
-    print(req)
+class _PipelineItem:
+    def __init__(self, path):
+        self.path = path
+        self.audio = path       # Replaced by the decoded audio if the plugin can decode ahead of inference
+        self.cache_key = None
+        self.result = None      # Set before inference when the transcript cache has the file
+        self.streamed_formats = set()
+        self.subs = None
+        self.assLocation = ""
 
-    task_id = str(uuid.uuid4())
-    for path in req.filePaths:
-        background_tasks.add_task(transcribeWorker, path, task_id, req)
+
+async def transcribePipeline(task_id: str, req: TranscriptionRequest):
+    """
+        Transcribes the request's files in a decode -> infer -> serialise -> mux pipeline,
+        so decoding the next file and muxing the previous one overlap with inference.
+    """
+    generator_module = load_plugin(req.model)
+
+    async def decode(item: _PipelineItem):
+        item.cache_key, item.result = await _cacheLookup(item.path, task_id, req)
+        if item.result is not None:
+            return item
+        if hasattr(generator_module, "loadAudio"):
+            with decode_seconds.time(plugin=req.model, model_size=req.modelSize):
+                item.audio = await asyncio.to_thread(profiler.call, task_id, generator_module.loadAudio, item.path)
+        return item
+
+    async def infer(item: _PipelineItem):
+        if item.result is not None:
+            return item
+        try:
+            success, message, item.streamed_formats = await _schedule(task_id, req, inferFile, item.path, item.audio, task_id, req)
+        finally:
+            item.audio = None   # Release the decoded audio as soon as possible
+        if not success:
+            print(f"Task {task_id}: Transcription failed for {item.path} with message: {message}")
+            await _publishFileError(task_id, f"Transcription error for {Path(item.path).name}: {message}")
+            return None
+        item.result = message
+        await _cacheStore(item.cache_key, message)
+        return item
+
+    async def serialise(item: _PipelineItem):
+        item.subs, item.assLocation = await asyncio.to_thread(
+            profiler.call, task_id, writeSubtitles, item.path, item.result, req, item.streamed_formats
+        )
+        await asyncio.to_thread(indexTranscript, item.path, item.result, req)
+        item.result = None
+        return item if req.embedSubtitles else None
+
+    async def mux(item: _PipelineItem):
+        await embedSubtitles(item.path, item.subs, item.assLocation, req, task_id)
+
+    async def on_error(item: _PipelineItem, e: Exception):
+        await _publishFileError(task_id, f"Error processing file {Path(item.path).name}: {str(e)}")
+
+    inference_workers = Settings.schedulerConcurrency.get(req.model, Settings.schedulerDefaultConcurrency)
+    pipeline = Pipeline([
+        Stage("decode", decode, Settings.pipelineDecodeWorkers, Settings.pipelineQueueSize),
+        Stage("infer", infer, inference_workers, Settings.pipelineQueueSize),
+        Stage("serialise", serialise, Settings.pipelineSerialiseWorkers, Settings.pipelineQueueSize),
+        Stage("mux", mux, Settings.pipelineMuxWorkers, Settings.pipelineQueueSize),
+    ], on_error)
+    await pipeline.run(_PipelineItem(path) for path in req.filePaths)
+
+    pipeline_stats.add(pipeline)
+    await event_log.publish(channel=task_id, message=json.dumps({
+        "type": "pipeline",
+        "task_id": task_id,
+        **pipeline.stats(),
+    }))
+
+
+async def _runTask(task_id: str, work):
+    mux_runner.start(task_id)
+    try:
+        await work
+    except Exception as e:
+        print(f"Task {task_id}: Error during transcription: {e}")
+        await _publishFileError(task_id, f"Error processing task: {str(e)}")
+    finally:
+        mux_runner.finish(task_id)
+        profiler.task_finished(task_id)
 
     final_message = json.dumps({
         "type": "status",
         "status": "DONE",
     })
+    await event_log.publish(channel=task_id, message=final_message)
+
+
+@transcription_router.post("/transcribe")
+async def transcribe(req: TranscriptionRequest):
+    print(req)
+    if req.batched and (req.vad or req.parallel):
+        # The batched mode decodes whole files' windows together, it has no VAD pre-pass or chunking
+        raise HTTPException(status_code=422, detail="batched can't be combined with vad or parallel")
+
+    # Probe every file up front so unusable ones are rejected before anything is scheduled
+    probes = await media_probe.probe_all(req.filePaths)
+    rejected = [
+        {"file": path, "error": str(info)} for path, info in probes.items() if isinstance(info, ProbeError)
+    ]
+    accepted = [path for path, info in probes.items() if not isinstance(info, ProbeError)]
+    if not accepted:
+        reasons = "; ".join(f"{Path(file['file']).name}: {file['error']}" for file in rejected)
+        raise HTTPException(status_code=422, detail=f"None of the files can be transcribed ({reasons})")
+    if rejected:
+        print(f"Rejected {len(rejected)} file(s): {rejected}")
+        req = req.model_copy(update={"filePaths": accepted})
+    durations = [info.duration for info in probes.values() if isinstance(info, MediaInfo) and info.duration]
+
+    # Makes room for the job if a model is being warmed up, and warms up these settings at the next startup
+    await asyncio.to_thread(warmup_service.job_submitted, req.model, req.modelSize, req.language)
+
+    task_id = str(uuid.uuid4())
+    queue_position = scheduler.queue_depth(req.model)
+    await event_log.publish(channel=task_id, message=json.dumps({
+        "type": "preflight",
+        "task_id": task_id,
+        "files": [info.to_dict() for info in probes.values() if isinstance(info, MediaInfo)],
+        "rejected": rejected,
+        "audioSeconds": round(sum(durations), 3),
+    }))
+    if req.batched:
+        group_size = Settings.inferenceBatchFilesPerJob
+        work = asyncio.gather(
+            *(transcribeBatchWorker(req.filePaths[i:i + group_size], task_id, req) for i in range(0, len(req.filePaths), group_size)),
+            return_exceptions=True
+        )
+    else:
+        work = transcribePipeline(task_id, req)
 
-    background_tasks.add_task(Settings.broadcast.publish, channel=task_id, message=final_message)
+    # Keep a reference to the task so it isn't garbage collected before it finishes
+    watcher = asyncio.create_task(_runTask(task_id, work))
+    _task_watchers.add(watcher)
+    watcher.add_done_callback(_task_watchers.discard)
     print(f"Scheduled transcription task with ID: {task_id}")
 
-    return ORJSONResponse([{"task_id": task_id}], status_code=202)
+    return ORJSONResponse([{
+        "task_id": task_id,
+        "queuePosition": queue_position,
+        "rejected": rejected,
+        "audioSeconds": round(sum(durations), 3),
+    }], status_code=202)
+
+
+@transcription_router.get("/scheduler")
+def getSchedulerStats():
+    """
+        Returns the queue depth, running jobs and queue wait times of every device
+    """
+    return scheduler.stats()
+
+
+@transcription_router.get("/pipeline")
+def getPipelineStats():
+    """
+        Returns per-stage utilisation totals of every finished transcription pipeline
+    """
+    return pipeline_stats.stats()
+
+
+def _requireTranscriptStore():
+    if not Settings.transcriptStoreEnabled:
+        raise HTTPException(status_code=404, detail="The transcript store is disabled")
+
+
+@transcription_router.get("/transcripts")
+def listTranscripts(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """
+        Returns the stored transcripts, newest first
+    """
+    _requireTranscriptStore()
+    return transcript_store.files(limit, offset)
+
+
+@transcription_router.get("/transcripts/search")
+def searchTranscripts(q: str, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0), language: str | None = None,
+                      model: str | None = None, modelSize: str | None = None):
+    """
+        Full-text search over the segments of every stored transcript.
+        All words in `q` must match, end a word with * to match it as a prefix. Times are in milliseconds.
+    """
+    _requireTranscriptStore()
+    return transcript_store.search(q, limit, offset, language, model, modelSize)
+
+
+@transcription_router.get("/transcripts/{file_id}")
+def getTranscript(file_id: int):
+    """
+        Returns every segment of a stored transcript, times are in milliseconds
+    """
+    _requireTranscriptStore()
+    segments = transcript_store.segments(file_id)
+    if segments is None:
+        raise HTTPException(status_code=404, detail=f"Transcript {file_id} not found")
+    return segments
+
+
+@transcription_router.get("/mux")
+def getMuxStats():
+    """
+        Returns the number of running and finished subtitle muxes
+    """
+    return mux_runner.stats()
+
+
+@transcription_router.delete("/mux/{task_id}")
+def cancelMux(task_id: str):
+    """
+        Cancels the task's running and queued subtitle muxes, the partly written videos are deleted
+    """
+    return {"task_id": task_id, "cancelled": mux_runner.cancel(task_id)}
+
+
+class ProfileRequest(BaseModel):
+    mode: str = "sampling"              # "sampling" (Python stacks) or "torch" (torch.profiler trace)
+    task_id: str | None = None          # Profile this task until it finishes, or every thread when omitted
+    seconds: float = 30                 # Longest the profile runs for
+    intervalMs: float = 10              # Sampling interval
+
+
+def _requireDebugging():
+    if not Settings.debuggingEnabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@transcription_router.post("/profile")
+def startProfile(req: ProfileRequest):
+    """
+        Starts profiling a task, or the whole backend for a time window. Requires debugging to be enabled.
+        The folded stacks are written under the profiles folder of the app's data directory.
+    """
+    _requireDebugging()
+    if req.task_id and any(_isTaskDone(event.message) for event in event_log.events(req.task_id)):
+        raise HTTPException(status_code=409, detail=f"Task {req.task_id} has already finished")
+    try:
+        return profiler.start(req.mode, req.task_id, req.seconds, req.intervalMs)
+    except ProfilerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@transcription_router.get("/profile")
+def listProfiles():
+    """
+        Returns the running and finished profiles along with their output files
+    """
+    _requireDebugging()
+    return profiler.sessions()
+
+
+@transcription_router.delete("/profile/{profile_id}")
+def stopProfile(profile_id: str):
+    """
+        Stops a profile early, its output is written as it stops
+    """
+    _requireDebugging()
+    session = profiler.stop(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return session
+
+
+class WarmupRequest(BaseModel):
+    model: str
+    modelSize: str
+    language: str = "auto"
+
+
+@transcription_router.post("/warmup")
+def startWarmup(req: WarmupRequest):
+    """
+        Loads a model and runs a dummy forward pass in the background, e.g. when the settings change the model size.
+        Skipped while jobs are running, and cancelled when a job is submitted.
+    """
+    if not Settings.warmupEnabled:
+        raise HTTPException(status_code=409, detail="Warm-up is disabled")
+    return ORJSONResponse(warmup_service.start(req.model, req.modelSize, req.language), status_code=202)
+
+
+@transcription_router.get("/warmup")
+def getWarmup():
+    """
+        Returns the latest warm-up, the last used settings and warm-up counters
+    """
+    return warmup_service.stats()
+
+
+@transcription_router.delete("/warmup")
+def cancelWarmup():
+    """
+        Cancels the running warm-up and evicts its model once loaded
+    """
+    warmup = warmup_service.cancel()
+    if warmup is None:
+        raise HTTPException(status_code=404, detail="No warm-up has run")
+    return warmup
+
+
+@transcription_router.get("/workers")
+def getWorkers():
+    """
+        Returns the worker processes of every plugin running out of process, with their crash and restart counts
+    """
+    return worker_pools.stats()
+
+
+@transcription_router.get("/media_probe")
+def getMediaProbeStats():
+    """
+        Returns the size and hit/miss counts of the media metadata cache
+    """
+    return media_probe.stats()
+
+
+@transcription_router.get("/transcript_cache")
+def getTranscriptCacheStats():
+    """
+        Returns the size and hit/miss counts of the transcript cache
+    """
+    return transcript_cache.stats()
+
+
+@transcription_router.get("/core_budget")
+def getCoreBudget():
+    """
+        Returns the CPU cores and torch threads each running job has been given
+    """
+    return core_budget.stats()
+
+
+def _metricFamilies() -> list[Family]:
+    """
+        Gauges and counters read from the scheduler, event log and caches at scrape time
+    """
+    devices = scheduler.stats()
+    pools = worker_pools.stats()["pools"]
+    caches = {"model": model_cache.stats(), "transcript": transcript_cache.stats(), "probe": media_probe.stats()}
+    return [
+        Family("subtext_queue_depth", "gauge", "Jobs waiting for a worker",
+               [Sample({"plugin": device}, stats["queued"]) for device, stats in devices.items()]),
+        Family("subtext_active_jobs", "gauge", "Jobs being run by a worker",
+               [Sample({"plugin": device}, stats["running"]) for device, stats in devices.items()]),
+        Family("subtext_jobs_completed_total", "counter", "Jobs that finished",
+               [Sample({"plugin": device}, stats["completed"]) for device, stats in devices.items()]),
+        Family("subtext_jobs_failed_total", "counter", "Jobs that raised an error",
+               [Sample({"plugin": device}, stats["failed"]) for device, stats in devices.items()]),
+        Family("subtext_active_tasks", "gauge", "Transcription tasks that haven't finished",
+               [Sample({}, len(_task_watchers))]),
+        Family("subtext_active_muxes", "gauge", "Muxes running or waiting for a slot",
+               [Sample({}, mux_runner.stats()["active"])]),
+        Family("subtext_sse_subscribers", "gauge", "Connected progress streams",
+               [Sample({}, event_log.stats()["subscribers"])]),
+        Family("subtext_cache_hits_total", "counter", "Cache lookups that hit",
+               [Sample({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        Family("subtext_cache_misses_total", "counter", "Cache lookups that missed",
+               [Sample({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        Family("subtext_cache_hit_ratio", "gauge", "Share of cache lookups that hit",
+               [Sample({"cache": name}, _hitRatio(stats)) for name, stats in caches.items()]),
+        Family("subtext_worker_processes", "gauge", "Worker processes that are running",
+               [Sample({"plugin": plugin}, sum(w["alive"] for w in stats["workers"])) for plugin, stats in pools.items()]),
+        Family("subtext_worker_restarts_total", "counter", "Worker processes restarted after exiting",
+               [Sample({"plugin": plugin}, sum(w["restarts"] for w in stats["workers"])) for plugin, stats in pools.items()]),
+    ]
+
+
+def _hitRatio(stats: dict) -> float:
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0
+
+
+@transcription_router.get("/metrics")
+def getMetrics():
+    """
+        Returns stage timings, real-time factors, queues, subscribers and cache hit ratios for Prometheus
+    """
+    return Response(content=metrics.render(_metricFamilies()), media_type=CONTENT_TYPE)
 
 
 @transcription_router.put("/toggle_multi_job")
@@ -277,43 +871,68 @@ def enable_multi_job(toggle: bool):
     return ORJSONResponse({"message": "ok"}, status_code=200)
 
 
+def _isTerminal(message: str) -> bool:
+    try:
+        payload = json.loads(message)
+    except json.JSONDecodeError:
+        return False  # Ignore non-JSON messages if any
+    return payload.get("type") == "status" and payload.get("status") in ["DONE", "ERROR"]
+
+
+def _isTaskDone(message: str) -> bool:
+    # A task publishes an ERROR for every file that fails but only one DONE, once all of its files are finished
+    try:
+        payload = json.loads(message)
+    except json.JSONDecodeError:
+        return False
+    return payload.get("type") == "status" and payload.get("status") == "DONE"
+
+
 @transcription_router.get("/progress/{task_id}")
 async def progress_stream(request: Request, task_id: str):
     """
     SSE endpoint to stream progress updates for a given task_id.
+    Events already published for the task are replayed first, from after the Last-Event-ID header if the client is resuming.
     """
-    print(f"SSE connection requested for task: {task_id}")
+    try:
+        last_event_id = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        last_event_id = 0
+    print(f"SSE connection requested for task: {task_id} (after event {last_event_id})")
+
+    # A client resuming after the task's final status would otherwise wait for events that never come.
+    # 204 tells EventSource to stop reconnecting.
+    for event in event_log.events(task_id):
+        if event.id <= last_event_id and _isTerminal(event.message):
+            return Response(status_code=204)
 
     async def event_generator():
-        async with Settings.broadcast.subscribe(channel=task_id) as subscriber:
-            print(f"SSE subscribed to channel: {task_id}")
-            try:
-                if await request.is_disconnected():
-                    print(f"SSE client for {task_id} disconnected immediately.")
-                    return
-
-                async for event in subscriber:
+        print(f"SSE subscribed to channel: {task_id}")
+        try:
+            if await request.is_disconnected():
+                print(f"SSE client for {task_id} disconnected immediately.")
+                return
+
+            # Closed explicitly so the log sees the subscriber leave as soon as the stream ends
+            async with aclosing(event_log.subscribe(task_id, last_event_id)) as events:
+                async for event in events:
                     message_data = event.message
                     # print(f"SSE sending for {task_id}: {message_data}") # Debug
-                    yield {"data": message_data}
+                    yield {"id": str(event.id), "data": message_data}
 
                     if await request.is_disconnected():
                         print(f"SSE client for {task_id} disconnected.")
                         break
 
-                    try:
-                        # Check for final status message to close stream gracefully
-                        payload = json.loads(message_data)
-                        if payload.get("type") == "status" and payload.get("status") in ["DONE", "ERROR"]:
-                            print(f"SSE received terminal status for {task_id}, closing stream.")
-                            break
-                    except json.JSONDecodeError:
-                        pass  # Ignore non-JSON messages if any
-
-            except asyncio.CancelledError:
-                print(f"SSE connection for {task_id} cancelled/closed.")
-                raise
-            finally:
-                print(f"SSE finished for task: {task_id}")
+                    # Check for final status message to close stream gracefully
+                    if _isTerminal(message_data):
+                        print(f"SSE received terminal status for {task_id}, closing stream.")
+                        break
+
+        except asyncio.CancelledError:
+            print(f"SSE connection for {task_id} cancelled/closed.")
+            raise
+        finally:
+            print(f"SSE finished for task: {task_id}")
 
     return EventSourceResponse(event_generator())
@@ -0,0 +1,230 @@
+"""
+    ffprobe metadata for submitted media, probed once per file version and cached.
+
+    `/transcribe` probes every submitted file concurrently before scheduling anything, so missing,
+    unreadable and audio-less files are rejected straight away instead of failing after inference.
+    Later stages read the cached metadata (MicroDVD frame rate, stream maps for embedding) instead of
+    running ffprobe again. Entries are keyed by (path, size, mtime) so a replaced file is probed again.
+"""
+from collections import OrderedDict
+from fractions import Fraction
+
+import asyncio
+import json
+import os
+import subprocess
+import threading
+
+from config import Settings
+
+CACHE_ENTRIES = 4096
+FFPROBE_ARGS = ["-v", "error", "-print_format", "json", "-show_format", "-show_streams"]
+
+
+class ProbeError(Exception):
+    pass
+
+
+class MediaInfo:
+    def __init__(self, path: str, probe: dict):
+        self.path = path
+        self.format_name: str = probe.get("format", {}).get("format_name", "")
+        self.duration: float | None = _float(probe.get("format", {}).get("duration"))
+        self.streams: list[dict] = [
+            {
+                "index": stream.get("index"),
+                "type": stream.get("codec_type"),
+                "codec": stream.get("codec_name"),
+                "attachedPic": bool(stream.get("disposition", {}).get("attached_pic")),
+                "fps": _rate(stream.get("r_frame_rate")) if stream.get("codec_type") == "video" else None,
+            }
+            for stream in probe.get("streams", [])
+        ]
+
+    @property
+    def audio_streams(self) -> list[dict]:
+        return [stream for stream in self.streams if stream["type"] == "audio"]
+
+    @property
+    def video_streams(self) -> list[dict]:
+        # Cover art in audio files is reported as a video stream
+        return [stream for stream in self.streams if stream["type"] == "video" and not stream["attachedPic"]]
+
+    @property
+    def fps(self) -> float | None:
+        for stream in self.video_streams:
+            if stream["fps"]:
+                return stream["fps"]
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "file": os.path.basename(self.path),
+            "format": self.format_name,
+            "duration": self.duration,
+            "fps": self.fps,
+            "audioCodec": self.audio_streams[0]["codec"] if self.audio_streams else None,
+            "videoCodec": self.video_streams[0]["codec"] if self.video_streams else None,
+            "streams": self.streams,
+        }
+
+
+def _float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate(value) -> float | None:
+    """
+        Parses an ffprobe frame rate such as "24000/1001"
+    """
+    try:
+        rate = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return float(rate) if rate > 0 else None
+
+
+def _cache_key(path: str) -> tuple[str, int, int]:
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ProbeError(f"File can't be read: {e.strerror}")
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _validate(info: MediaInfo):
+    if not info.audio_streams:
+        raise ProbeError("File has no audio stream")
+
+
+class MediaProbe:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple[str, int, int], MediaInfo] = OrderedDict()
+        self._semaphore: asyncio.Semaphore | None = None
+        self.hits = 0
+        self.misses = 0
+        self.unavailable = False        # Set once ffprobe turns out not to be installed
+
+    def _get(self, key) -> MediaInfo | None:
+        with self._lock:
+            info = self._cache.get(key)
+            if info is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return info
+
+    def _put(self, key, info: MediaInfo):
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = info
+            while len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def cached(self, path: str) -> MediaInfo | None:
+        """
+            Returns the file's metadata if its current version has been probed
+        """
+        try:
+            return self._get(_cache_key(path))
+        except ProbeError:
+            return None
+
+    @staticmethod
+    def _parse(path: str, returncode: int, stdout: bytes, stderr: bytes) -> MediaInfo:
+        if returncode != 0:
+            message = stderr.decode(errors="replace").strip().splitlines()
+            raise ProbeError(f"Not a readable media file: {message[-1] if message else 'ffprobe failed'}")
+        return MediaInfo(path, json.loads(stdout or b"{}"))
+
+    async def probe(self, path: str) -> MediaInfo | None:
+        """
+            Returns the file's metadata, or None when ffprobe isn't available.
+            Raises ProbeError for files that can't be transcribed.
+        """
+        key = _cache_key(path)
+        info = self._get(key)
+        if info is None:
+            if self.unavailable:
+                return None
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(max(1, Settings.probeConcurrency))
+            async with self._semaphore:
+                try:
+                    returncode, stdout, stderr = await self._run(path)
+                except FileNotFoundError:
+                    print("Media probe: ffprobe not found, skipping preflight checks.")
+                    self.unavailable = True
+                    return None
+                except (asyncio.TimeoutError, subprocess.TimeoutExpired):
+                    raise ProbeError("Timed out reading the file")
+            info = self._parse(path, returncode, stdout, stderr)
+            self._put(key, info)
+        _validate(info)
+        return info
+
+    async def _run(self, path: str) -> tuple[int, bytes, bytes]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffprobe", *FFPROBE_ARGS, path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except NotImplementedError:
+            # Event loops without subprocess support (the selector loop on Windows) run it in a thread instead
+            completed = await asyncio.to_thread(
+                subprocess.run, ["ffprobe", *FFPROBE_ARGS, path], capture_output=True, timeout=Settings.probeTimeoutSeconds
+            )
+            return completed.returncode, completed.stdout, completed.stderr
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), Settings.probeTimeoutSeconds)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stdout, stderr
+
+    def probe_sync(self, path: str) -> MediaInfo | None:
+        """
+            Blocking version of `probe` for worker threads, which uses the cache the same way
+        """
+        key = _cache_key(path)
+        info = self._get(key)
+        if info is None:
+            if self.unavailable:
+                return None
+            try:
+                completed = subprocess.run(
+                    ["ffprobe", *FFPROBE_ARGS, path], capture_output=True, timeout=Settings.probeTimeoutSeconds
+                )
+            except FileNotFoundError:
+                self.unavailable = True
+                return None
+            except subprocess.TimeoutExpired:
+                raise ProbeError("Timed out reading the file")
+            info = self._parse(path, completed.returncode, completed.stdout, completed.stderr)
+            self._put(key, info)
+        return info
+
+    async def probe_all(self, paths: list[str]) -> dict[str, MediaInfo | ProbeError | None]:
+        """
+            Probes every file concurrently, bounded by `Settings.probeConcurrency`
+        """
+        async def probe_one(path):
+            try:
+                return await self.probe(path)
+            except ProbeError as e:
+                return e
+            except Exception as e:
+                return ProbeError(f"Failed to probe file: {e}")
+
+        results = await asyncio.gather(*(probe_one(path) for path in paths))
+        return dict(zip(paths, results))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses, "ffprobeAvailable": not self.unavailable}
+
+
+media_probe = MediaProbe()
@@ -0,0 +1,172 @@
+"""
+    Metrics for `/metrics` in the Prometheus text exposition format.
+
+    Stage timings are histograms recorded where the work happens. An observation is a bisect and a few
+    additions under a lock, so they are always on. Worker processes (see inference.workers and
+    inference.parallel) send what they observed to the server process, which merges it. Gauges and counters that other components already
+    keep (queue depths, subscribers, cache hits) aren't duplicated here; they are read from those
+    components' stats when the endpoint is scraped.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterable, NamedTuple
+
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Processing time divided by media duration, below 1 is faster than real time
+REALTIME_FACTOR_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[tuple[str, object]]) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}" if text else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Label values -> [count per bucket (the last one is +Inf), sum, count]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _drain(self) -> list[tuple[tuple[str, ...], list[int], float, int]]:
+        with self._lock:
+            series, self._series = self._series, {}
+        return [(key, counts, total, count) for key, (counts, total, count) in series.items()]
+
+    def _merge(self, observations: list[tuple[tuple[str, ...], list[int], float, int]]):
+        with self._lock:
+            for key, counts, total, count in observations:
+                series = self._series.get(tuple(key))
+                if series is None:
+                    series = self._series[tuple(key)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    @contextmanager
+    def time(self, **labels):
+        """
+            Observes how long the block took. Blocks that raise aren't observed.
+        """
+        started = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(series):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels([*labels, ('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Sample(NamedTuple):
+    labels: dict
+    value: float
+
+
+class Family(NamedTuple):
+    """
+        A gauge or counter read from another component's stats at scrape time
+    """
+    name: str
+    type: str       # "gauge" or "counter"
+    help: str
+    samples: list[Sample]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for sample in self.samples:
+            lines.append(f"{self.name}{_labels(sample.labels.items())} {_number(sample.value)}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self._histograms: list[Histogram] = []
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...] = SECONDS_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def drain(self) -> dict[str, list]:
+        """
+            Returns and forgets what every histogram observed so far, for a worker process to send to the server's `merge`
+        """
+        observations = {histogram.name: histogram._drain() for histogram in self._histograms}
+        return {name: series for name, series in observations.items() if series}
+
+    def merge(self, observations: dict[str, list]):
+        for histogram in self._histograms:
+            if histogram.name in observations:
+                histogram._merge(observations[histogram.name])
+
+    def render(self, families: Iterable[Family] = ()) -> str:
+        lines = []
+        for metric in [*self._histograms, *families]:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+model_load_seconds = metrics.histogram(
+    "subtext_model_load_seconds", "Time taken to load a model that wasn't cached", ("plugin", "model", "device", "precision")
+)
+queue_wait_seconds = metrics.histogram(
+    "subtext_queue_wait_seconds", "Time jobs waited in the scheduler queue", ("plugin",)
+)
+decode_seconds = metrics.histogram(
+    "subtext_decode_seconds", "Time taken to decode a file's audio ahead of inference", ("plugin", "model_size")
+)
+inference_seconds = metrics.histogram(
+    "subtext_inference_seconds", "Time taken by the plugin to transcribe a file, or a batch of files", ("plugin", "model_size")
+)
+realtime_factor = metrics.histogram(
+    "subtext_realtime_factor", "Inference time divided by the media's duration", ("plugin", "model_size"),
+    REALTIME_FACTOR_BUCKETS,
+)
+serialise_seconds = metrics.histogram(
+    "subtext_serialise_seconds", "Time taken to write a file's subtitles in every requested format", ("plugin", "model_size")
+)
+mux_seconds = metrics.histogram(
+    "subtext_mux_seconds", "Time taken to embed subtitles into a video", ("plugin", "model_size")
+)
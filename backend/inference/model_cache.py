@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, NamedTuple
+
+import gc
+import threading
+
+from config import Settings
+from inference.core_budget import core_budget
+from inference.metrics import model_load_seconds
+
+
+class ModelKey(NamedTuple):
+    size: str
+    english_only: bool
+    device: str
+    precision: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.size}.en" if self.english_only else self.size
+
+
+class _CacheEntry:
+    def __init__(self, key: ModelKey):
+        self.key = key
+        self.model = None
+        self.nbytes = 0
+        self.users = 0
+        self.warm = False       # Loaded by a warm-up and not used by a job since
+        self.attachments: dict[str, Any] = {}       # See ModelCache.attach
+        # Whisper installs kv-cache hooks on the model for every decode, so one model instance
+        # can only run a single transcription at a time. This lock serialises loading and use.
+        self.lock = threading.Lock()
+
+
+def _model_nbytes(model) -> int:
+    """
+        Returns the size of a torch module's weights and persistent buffers in bytes
+    """
+    total = 0
+    # Quantised layers keep their packed weights in the state dict rather than as parameters
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if hasattr(tensor, "element_size"):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _budget_bytes(device: str) -> int:
+    if device == "cpu":
+        return Settings.modelCacheRamBudgetMB * 1024 * 1024
+    return Settings.modelCacheVramBudgetMB * 1024 * 1024
+
+
+class ModelCache:
+    """
+        Process-wide LRU registry of loaded models.
+
+        Models are keyed by (model size, `.en` variant, device, precision). Each device class (RAM for
+        "cpu", VRAM for everything else) has its own budget in `Settings`; once a device goes over its
+        budget the least recently used idle models are evicted. Models that are in use are never evicted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[ModelKey, _CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def lease(self, key: ModelKey, loader: Callable[[], Any], warmup: bool = False, plugin: str = ""):
+        """
+            Yields the cached model for `key`, calling `loader` to load it on a miss.
+            Warm-up leases (see inference.warmup) aren't counted as hits or misses.
+            `plugin` is the name of the leasing plugin, which labels the load time metric.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CacheEntry(key)
+                self._entries[key] = entry
+                if not warmup:
+                    self.misses += 1
+            elif not warmup:
+                self.hits += 1
+            if not warmup:
+                entry.warm = False
+            self._entries.move_to_end(key)
+            entry.users += 1
+
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    with model_load_seconds.time(plugin=plugin, model=key.name, device=key.device, precision=key.precision):
+                        model = loader()
+                    with self._lock:
+                        entry.model = model
+                        entry.nbytes = _model_nbytes(model)
+                        entry.warm = warmup and entry.users == 1     # No job is waiting for it
+                if not warmup:
+                    # The job only gets its share of the cores once it can use them
+                    core_budget.start()
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+                if entry.model is None and entry.users == 0 and self._entries.get(key) is entry:
+                    # Loading failed, don't keep an empty entry around
+                    del self._entries[key]
+                evicted = self._collect_evictions(key.device)
+            self._release(evicted)
+
+    def attach(self, model, name: str, factory: Callable[[], Any]):
+        """
+            Returns the object called `name` kept alongside the cached `model`, calling `factory` to create
+            it on first use. The object's `nbytes` count against the device's budget along with the model,
+            and its `close()` is called when the model is evicted. Only call it while leasing `model`.
+        """
+        with self._lock:
+            entry = next((e for e in self._entries.values() if e.model is model), None)
+            if entry is None:
+                raise KeyError("The model is not in the model cache")
+            attachment = entry.attachments.get(name)
+            if attachment is not None:
+                return attachment
+
+        # The caller's lease keeps the entry from being evicted meanwhile
+        attachment = factory()
+        with self._lock:
+            entry.attachments[name] = attachment
+            entry.nbytes += attachment.nbytes
+            evicted = self._collect_evictions(entry.key.device)
+        self._release(evicted)
+        return attachment
+
+    def _collect_evictions(self, device: str) -> list[_CacheEntry]:
+        # Must be called with self._lock held
+        device_class = "cpu" if device == "cpu" else "gpu"
+        entries = [e for e in self._entries.values() if ("cpu" if e.key.device == "cpu" else "gpu") == device_class]
+        used = sum(e.nbytes for e in entries)
+        budget = _budget_bytes(device)
+
+        evicted = []
+        for entry in entries:   # OrderedDict order is least recently used first
+            if used <= budget:
+                break
+            if entry.users > 0 or entry.model is None:
+                continue
+            del self._entries[entry.key]
+            used -= entry.nbytes
+            evicted.append(entry)
+            self.evictions += 1
+        return evicted
+
+    def _release(self, evicted: list[_CacheEntry]):
+        if not evicted:
+            return
+        uses_gpu = False
+        for entry in evicted:
+            print(f"Model cache: evicting {entry.key.name} ({entry.key.device}, {entry.key.precision})")
+            uses_gpu = uses_gpu or entry.key.device != "cpu"
+            for name, attachment in entry.attachments.items():
+                try:
+                    attachment.close()
+                except Exception as e:
+                    print(f"Model cache: failed to close {name} of {entry.key.name}: {e}")
+            entry.attachments = {}
+            entry.model = None
+        gc.collect()
+        if uses_gpu:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self):
+        """
+            Evicts every model which is not currently in use
+        """
+        with self._lock:
+            evicted = [e for e in self._entries.values() if e.users == 0 and e.model is not None]
+            for entry in evicted:
+                del self._entries[entry.key]
+            self.evictions += len(evicted)
+        self._release(evicted)
+
+    def discard_warm(self):
+        """
+            Evicts the idle models that a warm-up loaded and no job has used yet
+        """
+        with self._lock:
+            evicted = [e for e in self._entries.values() if e.warm and e.users == 0 and e.model is not None]
+            for entry in evicted:
+                del self._entries[entry.key]
+            self.evictions += len(evicted)
+        self._release(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0,
+                "ramBudgetMB": Settings.modelCacheRamBudgetMB,
+                "vramBudgetMB": Settings.modelCacheVramBudgetMB,
+                "models": [
+                    {
+                        "model": e.key.name,
+                        "device": e.key.device,
+                        "precision": e.key.precision,
+                        "sizeMB": round(e.nbytes / (1024 * 1024), 1),
+                        "inUse": e.users > 0,
+                        "warm": e.warm,
+                        "attachments": list(e.attachments),
+                    }
+                    for e in self._entries.values() if e.model is not None
+                ],
+            }
+
+
+model_cache = ModelCache()
@@ -0,0 +1,224 @@
+"""
+    Runs ffmpeg subtitle muxing as an asyncio subprocess.
+
+    ffmpeg writes its `-progress` report to stdout, which is parsed into `mux_progress` events for the
+    task. Muxes have their own concurrency limit (`Settings.muxConcurrency`), separate from inference,
+    since they are disk bound. A task's muxes can be cancelled, which kills ffmpeg and removes the
+    partly written output.
+"""
+from pathlib import Path
+
+import asyncio
+import json
+import os
+import subprocess
+import threading
+import time
+
+from config import Settings
+from inference.event_log import event_log
+
+
+class MuxError(Exception):
+    pass
+
+
+class MuxCancelled(MuxError):
+    pass
+
+
+class _Progress:
+    """
+        Turns ffmpeg's key=value progress lines into rate limited `mux_progress` events
+    """
+
+    def __init__(self, task_id: str, path: str, duration: float | None):
+        self.task_id = task_id
+        self.file = Path(path).name
+        self.duration = duration
+        self.values: dict[str, str] = {}
+        self._last_publish = 0.0
+
+    async def line(self, line: str):
+        key, _, value = line.strip().partition("=")
+        if not key:
+            return
+        self.values[key] = value
+        # Every report ends with progress=continue, or progress=end for the last one
+        if key == "progress":
+            now = time.monotonic()
+            if value == "end" or now - self._last_publish >= Settings.progressMinIntervalSeconds:
+                self._last_publish = now
+                await self._publish(value == "end")
+
+    async def _publish(self, finished: bool):
+        try:
+            out_seconds = int(self.values.get("out_time_us", "0")) / 1_000_000
+        except ValueError:
+            out_seconds = 0.0
+        if finished:
+            percentage = 100
+        elif self.duration:
+            percentage = round(min(out_seconds / self.duration, 1) * 100, 2)
+        else:
+            percentage = None
+        await event_log.publish(channel=self.task_id, message=json.dumps({
+            "type": "mux_progress",
+            "task_id": self.task_id,
+            "file": self.file,
+            "outTimeSeconds": round(out_seconds, 2),
+            "duration": self.duration,
+            "percentage": percentage,
+            "speed": self.values.get("speed", "").strip() or None,
+        }))
+
+
+class MuxRunner:
+    def __init__(self):
+        self._semaphore: asyncio.Semaphore | None = None
+        self._running: dict[str, set[asyncio.Task]] = {}
+        self._tasks: set[str] = set()           # Tasks that may still start muxes, see start and finish
+        self._cancelled: set[str] = set()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    async def run(self, task_id: str, path: str, args: list[str], out_path: str, duration: float | None = None):
+        """
+            Runs `ffmpeg <args> <out_path>` for `task_id`'s file `path`.
+            Raises MuxCancelled if the task's muxes were cancelled and MuxError if ffmpeg failed.
+        """
+        if task_id in self._cancelled:
+            raise MuxCancelled(f"Muxing {Path(path).name} was cancelled")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, Settings.muxConcurrency))
+
+        # The mux runs as its own task so cancelling it leaves the caller (a pipeline worker) running
+        mux = asyncio.create_task(self._run(task_id, path, args, out_path, duration))
+        self._running.setdefault(task_id, set()).add(mux)
+        try:
+            await mux
+            self.completed += 1
+        except asyncio.CancelledError:
+            if task_id not in self._cancelled:
+                raise
+            self.cancelled += 1
+            raise MuxCancelled(f"Muxing {Path(path).name} was cancelled")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            tasks = self._running.get(task_id)
+            if tasks is not None:
+                tasks.discard(mux)
+                if not tasks:
+                    del self._running[task_id]
+                    if task_id not in self._tasks:
+                        self._cancelled.discard(task_id)
+
+    def start(self, task_id: str):
+        """
+            Registers a task that is running or queued, so its muxes can be cancelled before they start
+        """
+        self._tasks.add(task_id)
+
+    def cancel(self, task_id: str) -> int:
+        """
+            Cancels the task's running and queued muxes, including ones it starts later.
+            Returns how many were running or queued. Unknown and finished tasks are ignored.
+        """
+        if task_id not in self._tasks and task_id not in self._running:
+            return 0
+        self._cancelled.add(task_id)
+        tasks = self._running.get(task_id, set())
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def finish(self, task_id: str):
+        """
+            Forgets a finished task and its cancellation
+        """
+        self._tasks.discard(task_id)
+        if task_id not in self._running:
+            self._cancelled.discard(task_id)
+
+    async def _run(self, task_id: str, path: str, args: list[str], out_path: str, duration: float | None):
+        async with self._semaphore:
+            command = ["ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error", *args, "-progress", "pipe:1", out_path]
+            print(" ".join(command))
+            progress = _Progress(task_id, path, duration)
+            try:
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                    )
+                except NotImplementedError:
+                    returncode, stderr = await self._run_in_thread(command, progress)
+                else:
+                    try:
+                        async def read_progress():
+                            async for line in process.stdout:
+                                await progress.line(line.decode(errors="replace"))
+
+                        # Both pipes are drained so ffmpeg never blocks writing to a full one
+                        _, stderr, returncode = await asyncio.gather(read_progress(), process.stderr.read(), process.wait())
+                    except asyncio.CancelledError:
+                        process.kill()
+                        await process.wait()
+                        raise
+            except FileNotFoundError:
+                raise MuxError("ffmpeg is not installed")
+            except asyncio.CancelledError:
+                _remove(out_path)
+                raise
+
+            if returncode != 0:
+                _remove(out_path)
+                message = stderr.decode(errors="replace").strip().splitlines()
+                raise MuxError(f"ffmpeg failed: {message[-1] if message else f'exit code {returncode}'}")
+
+    async def _run_in_thread(self, command: list[str], progress: _Progress) -> tuple[int, bytes]:
+        """
+            Runs ffmpeg from a thread for event loops without subprocess support (the selector loop on Windows)
+        """
+        loop = asyncio.get_running_loop()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr = bytearray()
+
+        def drain_stderr():
+            stderr.extend(process.stderr.read())
+
+        def wait():
+            stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+            stderr_thread.start()
+            for line in process.stdout:
+                asyncio.run_coroutine_threadsafe(progress.line(line.decode(errors="replace")), loop)
+            stderr_thread.join()
+            return process.wait()
+
+        try:
+            returncode = await asyncio.to_thread(wait)
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        return returncode, bytes(stderr)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": Settings.muxConcurrency,
+            "active": sum(len(tasks) for tasks in self._running.values()),     # Running or waiting for a slot
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+mux_runner = MuxRunner()
@@ -0,0 +1,243 @@
+"""
+    Intra-file parallel transcription.
+
+    Long audio is split into chunks at silences and the chunks are transcribed in a process pool, with
+    as many chunks in flight as the job's share of the cores allows (see inference.core_budget). A copy of
+    the model's weights is put in shared memory once and handed to every worker, so the pool doesn't hold
+    a copy of the model per process. The copy and the pool are kept with the model in the model cache,
+    which counts the copy against its budget and shuts the pool down when it evicts the model, so only the
+    first parallel job with a model pays for starting the workers. Results are stitched back together in
+    order with their timestamps shifted onto the original timeline.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+import copy
+import numpy as np
+import torch
+import torch.multiprocessing
+from whisper.audio import N_FRAMES, log_mel_spectrogram, pad_or_trim
+
+from config import Settings
+from inference.core_budget import core_budget
+from inference.metrics import metrics
+from inference.model_cache import _model_nbytes, model_cache
+from inference.vad import speech_regions
+
+SAMPLE_RATE = 16000
+OVERLAP_SECONDS = 2.0       # Audio shared by neighbouring chunks when there was no silence to cut at
+
+# --- Worker process state ---
+_worker_model = None
+# ---
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _transcribe_chunk(audio: np.ndarray, options: dict, threads: int) -> tuple[dict, dict]:
+    # Workers outlive the job, so each chunk brings its job's thread count
+    torch.get_num_threads()
+    torch.set_num_threads(threads)
+    # What the worker recorded goes back with the result, to be merged into the server's metrics
+    return _worker_model.transcribe(audio, **options), metrics.drain()
+
+
+def _shared_copy(model):
+    """
+        Returns a copy of the model with its tensors in shared memory, so workers map them instead of
+        copying them. Sharing moves a tensor's storage in place, and so does sending it to a worker, so
+        the pool gets a copy rather than the model cache's instance that later jobs lease.
+        Whisper's alignment heads are a sparse buffer, which can't be shared but is tiny, so it is copied.
+    """
+    shared = copy.deepcopy(model)
+    for tensor in [*shared.parameters(), *shared.buffers()]:
+        if not tensor.is_sparse:
+            tensor.share_memory_()
+    return shared
+
+
+class _ParallelPool:
+    """
+        A model's copy in shared memory and the worker processes that have it loaded, attached to the
+        model's model cache entry. Workers are started on demand up to the whole core budget; a job
+        limits how many of its chunks are in flight instead. Only one job uses it at a time, as a model
+        is only leased to one job at a time.
+    """
+
+    def __init__(self, model):
+        self.model = _shared_copy(model)
+        self.nbytes = _model_nbytes(self.model)
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = torch.multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=Settings.parallelWorkers or core_budget.total_cores,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.model,),
+            )
+        return self._executor
+
+    def restart(self):
+        """
+            Drops the workers, e.g. after one died, and starts new ones on the next use
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def close(self):
+        # Called by the model cache when it evicts the model
+        self.restart()
+        self.model = None
+
+
+def plan_cuts(audio: np.ndarray, chunk_seconds: float, sample_rate: int = SAMPLE_RATE) -> list[tuple[int, bool]]:
+    """
+        Returns the (sample, is_silent) points to cut `audio` at, including its start and end.
+        Cuts are placed in the longest silence near every `chunk_seconds`; `is_silent` is False
+        when there was no silence close enough and the cut falls in the middle of audio.
+    """
+    chunk = int(chunk_seconds * sample_rate)
+    search = chunk // 4
+    regions = speech_regions(audio, sample_rate)
+    gaps = [(end, start) for (_, end), (start, _) in zip(regions, regions[1:])]
+
+    cuts = [(0, True)]
+    while len(audio) - cuts[-1][0] > chunk + search:
+        target = cuts[-1][0] + chunk
+        candidates = [gap for gap in gaps if target - search <= (gap[0] + gap[1]) // 2 <= target + search]
+        if candidates:
+            gap_start, gap_end = max(candidates, key=lambda gap: gap[1] - gap[0])
+            cuts.append(((gap_start + gap_end) // 2, True))
+        else:
+            cuts.append((target, False))
+    cuts.append((len(audio), True))
+    return cuts
+
+
+def _stitch(chunk_results: list[tuple[dict, tuple[float, float, float]]]) -> list[dict]:
+    """
+        Shifts every chunk's segments onto the original timeline and removes the copies of segments
+        transcribed twice in overlapping audio. A segment belongs to the chunk its midpoint falls in.
+    """
+    segments = []
+    last_chunk = None       # Chunk of the last kept segment
+    for chunk, (result, (offset, keep_from, keep_until)) in enumerate(chunk_results):
+        for segment in result["segments"]:
+            segment = dict(segment, start=round(segment["start"] + offset, 3), end=round(segment["end"] + offset, 3))
+            if "words" in segment:
+                segment["words"] = [
+                    dict(word, start=round(word["start"] + offset, 3), end=round(word["end"] + offset, 3))
+                    for word in segment["words"]
+                ]
+            midpoint = (segment["start"] + segment["end"]) / 2
+            if not keep_from <= midpoint < keep_until:
+                continue
+            # Whisper can also repeat a line either side of a boundary. Lines repeated within a chunk are real.
+            if (
+                segments and last_chunk != chunk
+                and segment["start"] < keep_from + OVERLAP_SECONDS
+                and segment["text"].strip() == segments[-1]["text"].strip()
+                and segment["start"] - segments[-1]["end"] < 1
+            ):
+                continue
+            segments.append(segment)
+            last_chunk = chunk
+
+    for segment_id, segment in enumerate(segments):
+        segment["id"] = segment_id
+    return segments
+
+
+def transcribe_parallel(
+    model,
+    audio: np.ndarray,
+    language: str | None,
+    on_segment: Callable[[dict], None] | None = None,
+    on_progress: Callable[[float, float], None] | None = None,
+) -> dict:
+    """
+        Transcribes long `audio` with chunks running in parallel worker processes.
+        Returns a result shaped like `model.transcribe`'s.
+    """
+    if language is None:
+        # Detect once so every chunk is transcribed in the same language
+        mel = pad_or_trim(log_mel_spectrogram(audio[:SAMPLE_RATE * 30], model.dims.n_mels), N_FRAMES).to(model.device)
+        _, probs = model.detect_language(mel)
+        language = max(probs, key=probs.get)
+
+    cuts = plan_cuts(audio, Settings.parallelChunkSeconds)
+    overlap = int(OVERLAP_SECONDS * SAMPLE_RATE)
+    chunks = []
+    for (start, start_silent), (end, end_silent) in zip(cuts, cuts[1:]):
+        chunk_start = start if start_silent else max(start - overlap, 0)
+        chunk_end = end if end_silent else min(end + overlap, len(audio))
+        chunks.append((chunk_start, chunk_end, start / SAMPLE_RATE, end / SAMPLE_RATE))
+
+    # Workers get the job's share of the cores, not the whole machine's
+    cores = core_budget.threads()
+    threads = max(1, min(Settings.parallelThreadsPerWorker, cores))
+    workers = min(Settings.parallelWorkers or cores, max(1, cores // threads), len(chunks))
+    print(f"Parallel transcription: {len(chunks)} chunks on {workers} workers with {threads} threads each")
+
+    pool: _ParallelPool = model_cache.attach(model, "parallel", lambda: _ParallelPool(model))
+    options = {"language": language, "verbose": None, "fp16": model.device.type != "cpu"}
+    total_seconds = len(audio) / SAMPLE_RATE
+    done_seconds = 0.0
+
+    results: list[tuple[dict, tuple[float, float, float]] | None] = [None] * len(chunks)
+    emitted = 0
+    pending = {}
+    queued = iter(enumerate(chunks))
+    try:
+        while True:
+            # Only the job's share of the pool's workers is given chunks
+            for index, (chunk_start, chunk_end, _, _) in queued:
+                pending[pool.executor.submit(_transcribe_chunk, audio[chunk_start:chunk_end], options, threads)] = index
+                if len(pending) == workers:
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                chunk_start, chunk_end, keep_from, keep_until = chunks[index]
+                result, observations = future.result()
+                metrics.merge(observations)
+                results[index] = (result, (chunk_start / SAMPLE_RATE, keep_from, keep_until))
+                done_seconds += keep_until - keep_from
+                if on_progress:
+                    on_progress(round(done_seconds, 2), round(total_seconds, 2))
+
+            # Emit segments in order, as soon as every chunk before them has finished
+            if on_segment:
+                ready = 0
+                while ready < len(results) and results[ready] is not None:
+                    ready += 1
+                stitched = _stitch(results[:ready])
+                for segment in stitched[emitted:]:
+                    on_segment(segment)
+                emitted = len(stitched)
+    except BrokenProcessPool:
+        pool.restart()
+        raise
+    except BaseException:
+        # The next job mustn't wait behind this one's chunks
+        for future in pending:
+            future.cancel()
+        raise
+
+    segments = _stitch(results)
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+    }
@@ -0,0 +1,151 @@
+from typing import Any, Awaitable, Callable, Iterable
+
+import asyncio
+import time
+
+
+class Stage:
+    """
+        One step of a pipeline: a bounded input queue drained by a fixed number of workers.
+
+        Handlers return the item to pass on to the next stage, or None to drop it. Because the next
+        stage's queue is bounded, a slow stage makes the stages before it wait (backpressure).
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], workers: int = 1, queue_size: int = 1):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0             # Time spent inside the handler, summed over workers
+        self.blocked_seconds = 0.0          # Time spent waiting for room in the next stage's queue
+
+    async def _worker(self, next_stage: "Stage | None", on_error: Callable[[Any, Exception], Awaitable[None]]):
+        while True:
+            item = await self.queue.get()
+            try:
+                started = time.monotonic()
+                try:
+                    result = await self.handler(item)
+                    self.processed += 1
+                except asyncio.CancelledError as e:
+                    if asyncio.current_task().cancelling():
+                        raise       # The pipeline is stopping
+                    # Something the handler awaited was cancelled (e.g. its scheduler job), not this worker
+                    result = None
+                    self.failed += 1
+                    print(f"Pipeline stage {self.name} was cancelled")
+                    await on_error(item, RuntimeError("Cancelled"))
+                except Exception as e:
+                    result = None
+                    self.failed += 1
+                    print(f"Pipeline stage {self.name} failed: {e}")
+                    await on_error(item, e)
+                finally:
+                    self.busy_seconds += time.monotonic() - started
+
+                if result is not None and next_stage is not None:
+                    blocked = time.monotonic()
+                    await next_stage.queue.put(result)
+                    self.blocked_seconds += time.monotonic() - blocked
+            finally:
+                self.queue.task_done()
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busySeconds": round(self.busy_seconds, 3),
+            "blockedSeconds": round(self.blocked_seconds, 3),
+            "utilisation": round(self.busy_seconds / (self.workers * elapsed), 4) if elapsed > 0 else 0,
+        }
+
+
+class Pipeline:
+    """
+        Runs items through a chain of stages so that different items can be in different stages at the same time
+    """
+
+    def __init__(self, stages: list[Stage], on_error: Callable[[Any, Exception], Awaitable[None]]):
+        self.stages = stages
+        self.on_error = on_error
+        self.elapsed = 0.0
+
+    async def run(self, items: Iterable[Any]):
+        started = time.monotonic()
+        workers = []
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            workers += [asyncio.create_task(stage._worker(next_stage, self.on_error)) for _ in range(stage.workers)]
+
+        feeder = asyncio.create_task(self._feed(items))
+        try:
+            # Workers only return if they fail outside of their handler, their items would never be marked done
+            await asyncio.wait([feeder, *workers], return_when=asyncio.FIRST_COMPLETED)
+            if not feeder.done():
+                raise RuntimeError("A pipeline worker stopped unexpectedly")
+            feeder.result()
+        finally:
+            for task in [feeder, *workers]:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
+            self.elapsed = time.monotonic() - started
+
+    async def _feed(self, items: Iterable[Any]):
+        for item in items:
+            await self.stages[0].queue.put(item)
+        # A stage has drained once its queue is joined, since items are only marked done after being passed on
+        for stage in self.stages:
+            await stage.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "elapsedSeconds": round(self.elapsed, 3),
+            "stages": {stage.name: stage.stats(self.elapsed) for stage in self.stages},
+        }
+
+
+class PipelineStats:
+    """
+        Running totals of every finished pipeline, per stage
+    """
+
+    def __init__(self):
+        self.pipelines = 0
+        self.elapsed_seconds = 0.0
+        self._stages: dict[str, dict] = {}
+
+    def add(self, pipeline: Pipeline):
+        self.pipelines += 1
+        self.elapsed_seconds += pipeline.elapsed
+        for stage in pipeline.stages:
+            totals = self._stages.setdefault(stage.name, {
+                "processed": 0, "failed": 0, "busySeconds": 0.0, "blockedSeconds": 0.0, "workerSeconds": 0.0
+            })
+            totals["processed"] += stage.processed
+            totals["failed"] += stage.failed
+            totals["busySeconds"] += stage.busy_seconds
+            totals["blockedSeconds"] += stage.blocked_seconds
+            totals["workerSeconds"] += stage.workers * pipeline.elapsed
+
+    def stats(self) -> dict:
+        return {
+            "pipelines": self.pipelines,
+            "elapsedSeconds": round(self.elapsed_seconds, 3),
+            "stages": {
+                name: {
+                    "processed": totals["processed"],
+                    "failed": totals["failed"],
+                    "busySeconds": round(totals["busySeconds"], 3),
+                    "blockedSeconds": round(totals["blockedSeconds"], 3),
+                    "utilisation": round(totals["busySeconds"] / totals["workerSeconds"], 4) if totals["workerSeconds"] else 0,
+                }
+                for name, totals in self._stages.items()
+            },
+        }
+
+
+pipeline_stats = PipelineStats()
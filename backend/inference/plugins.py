@@ -0,0 +1,186 @@
+from hashlib import sha256
+from types import ModuleType
+from typing import NamedTuple
+
+import os
+import threading
+import importlib.util
+import importlib.machinery
+
+import base64
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.exceptions import InvalidSignature
+
+from config import Settings
+
+inference_path = os.path.join(".", "inference")
+PUBLIC_KEY_PATH = "key.pub"
+PUBLIC_KEY_SHA256 = "0e5fa3d7e8b53a32a87911fce765486a1001cefe6549c8e243572c138465c491"
+STUB_PLUGIN = "stub"        # Load testing plugin, hidden unless Settings.stubPluginEnabled is set
+
+
+class PublicKeyError(Exception):
+    """Raised when there are problems with the public key  """
+
+
+class FileSignatureError(Exception):
+    """Raised when there are problems related to the file signature """
+
+
+_public_key_lock = threading.Lock()
+
+
+def load_public_key():
+    """
+        Returns the application's public key. key.pub is read and checked against its known hash
+        the first time a plugin is verified rather than at startup.
+    """
+    if Settings.publicKey is None:
+        with _public_key_lock:
+            if Settings.publicKey is None:
+                try:
+                    with open(PUBLIC_KEY_PATH, 'rb') as f:
+                        key_data = f.read()
+                except OSError:
+                    raise PublicKeyError("The application is missing its public key")
+                if sha256(key_data).hexdigest() != PUBLIC_KEY_SHA256:
+                    raise PublicKeyError("Public Key Hash check failed")
+                Settings.publicKey = serialization.load_pem_public_key(key_data)
+    return Settings.publicKey
+
+
+def verify_data(public_key, file_data, sig_path):
+    # Read signature
+    with open(sig_path, 'rb') as f:
+        signature = base64.b64decode(f.read())
+
+    # Verify signature
+    try:
+        public_key.verify(
+            signature,
+            file_data,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+        verified = True
+    except InvalidSignature:
+        verified = False
+    return verified
+
+
+def verify_file(public_key, file_path):
+    # Read file data
+    with open(file_path, 'rb') as f:
+        file_data = f.read()
+
+    return verify_data(public_key, file_data, str(file_path) + '.sig')
+
+
+def read_verified_source(filename):
+    """
+        Reads a plugin's source and checks it against its signature.
+        The returned bytes are the ones that were verified, so they are safe to execute.
+    """
+    with open(filename, 'rb') as f:
+        source = f.read()
+
+    if not Settings.allowUnsignedCode:
+        key = load_public_key()
+        if os.path.exists(filename + ".sig"):
+            if not verify_data(key, source, filename + ".sig"):
+                raise FileSignatureError("Signature check failed")
+        else:
+            raise FileSignatureError("Signature file is missing")
+    return source
+
+
+def load_source(modname, filename, source=None):
+    if source is None:
+        source = read_verified_source(filename)
+
+    loader = importlib.machinery.SourceFileLoader(modname, filename)
+    spec = importlib.util.spec_from_file_location(modname, filename, loader=loader)
+    module = importlib.util.module_from_spec(spec)
+
+    # sys.modules[module.__name__] = module  # Cache the module in sys.modules
+    exec(compile(source, filename, "exec"), module.__dict__)
+    return module
+
+
+# --- Plugin module cache ---
+class _PluginEntry(NamedTuple):
+    fingerprint: tuple      # (size, mtime) of api.py and of its .sig
+    digest: str             # SHA-256 of the verified source
+    module: ModuleType
+
+
+_plugin_cache: dict[str, _PluginEntry] = {}
+_plugin_cache_lock = threading.Lock()
+# ---
+
+
+def _plugin_fingerprint(filename):
+    stat = os.stat(filename)
+    try:
+        sig_stat = os.stat(filename + ".sig")
+        sig_fingerprint = (sig_stat.st_size, sig_stat.st_mtime_ns)
+    except FileNotFoundError:
+        sig_fingerprint = None
+    return (stat.st_size, stat.st_mtime_ns), sig_fingerprint
+
+
+def plugin_path(model):
+    return os.path.join(inference_path, model, "api.py")
+
+
+def _plugin_enabled(model):
+    return model != STUB_PLUGIN or Settings.stubPluginEnabled
+
+
+def list_plugins():
+    """
+        Returns the names of every plugin folder in the inference directory
+    """
+    return sorted(a for a in os.listdir(inference_path) if os.path.isfile(plugin_path(a)) and _plugin_enabled(a))
+
+
+def load_plugin(model):
+    """
+        Returns the verified and executed plugin module for `model`.
+
+        Modules are cached by (path, size, mtime, SHA-256) so each plugin is verified and executed once.
+        A plugin is only reloaded when its api.py or api.py.sig changes on disk.
+    """
+    if not _plugin_enabled(model):
+        raise FileNotFoundError(f"Plugin {model} is not enabled")
+    filename = os.path.abspath(plugin_path(model))
+    with _plugin_cache_lock:
+        fingerprint = _plugin_fingerprint(filename)
+        entry = _plugin_cache.get(filename)
+        if entry and entry.fingerprint == fingerprint:
+            return entry.module
+
+        source = read_verified_source(filename)
+        digest = sha256(source).hexdigest()
+        if entry and entry.digest == digest:
+            # File was touched but the verified contents are unchanged
+            _plugin_cache[filename] = entry._replace(fingerprint=fingerprint)
+            return entry.module
+
+        modname = f"inference_api_{model.replace(' ', '_').replace('(', '_').replace(')', '')}"
+        module = load_source(modname, filename, source)
+        _plugin_cache[filename] = _PluginEntry(fingerprint, digest, module)
+        print(f"Loaded plugin {model} ({digest[:12]})")
+        return module
+
+
+def plugin_digest(model):
+    """
+        Returns the SHA-256 of the loaded source of `model`'s plugin
+    """
+    load_plugin(model)
+    return _plugin_cache[os.path.abspath(plugin_path(model))].digest
@@ -0,0 +1,285 @@
+"""
+    On-demand profiling of running transcriptions, for finding where a slow job spends its time.
+
+    Two kinds of session, both writing flame graph ready folded stacks under user_data_dir/profiles:
+    - "sampling" samples Python stacks with sys._current_frames() from a background thread. It covers
+      everything the job's threads do: ffmpeg decode (as time waiting on the subprocess), the encoder and
+      decoder, beam search, temperature fallbacks and pysubs2. Scoped to a task it only samples the
+      threads running that task's work, otherwise every thread for the time window.
+    - "torch" records a torch.profiler trace, which also has the operator level breakdown and a Chrome
+      trace. torch only records the thread that started the profiler, so it is started inside the job
+      threads: it captures jobs that start while the session is running, one job at a time.
+
+    Sessions only exist while profiling; with debugging disabled, or no session running, the only work
+    left is registering job threads with their task.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from platformdirs import user_data_dir
+
+import importlib.util
+import sys
+import threading
+import time
+import uuid
+
+from config import Settings
+
+MAX_SESSIONS = 50       # Finished sessions kept for listing
+
+
+class ProfilerError(Exception):
+    pass
+
+
+def _frame_name(code, names: dict) -> str:
+    name = names.get(code)
+    if name is None:
+        name = names[code] = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+    return name
+
+
+class _Session:
+    mode = ""
+
+    def __init__(self, profiler: "Profiler", task_id: str | None, seconds: float):
+        self.profiler = profiler
+        self.id = str(uuid.uuid4())
+        self.task_id = task_id
+        self.seconds = seconds
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.finished_at: float | None = None
+        self.files: list[str] = []
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def _base_path(self) -> Path:
+        directory = self.profiler.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        return directory / f"{stamp}-{self.task_id[:8] if self.task_id else 'window'}-{self.mode}-{self.id[:8]}"
+
+    def stop(self):
+        self._stopped.set()
+
+    def info(self) -> dict:
+        return {
+            "profile_id": self.id,
+            "mode": self.mode,
+            "task_id": self.task_id,
+            "seconds": self.seconds,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "running": self.running,
+            "files": self.files,
+        }
+
+
+class _SamplingSession(_Session):
+    mode = "sampling"
+
+    def __init__(self, profiler: "Profiler", task_id: str | None, seconds: float, interval: float):
+        super().__init__(profiler, task_id, seconds)
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter[tuple[str, ...]] = Counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        names: dict = {}
+        thread_names: dict[int, str] = {}
+        while not self._stopped.wait(self.interval) and time.monotonic() < self.deadline:
+            threads = self.profiler.task_threads(self.task_id) if self.task_id else None
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (threads is not None and ident not in threads):
+                    continue
+                if ident not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                if thread_names.get(ident, "").startswith("profiler-"):
+                    continue        # Other sessions' threads
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code, names))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+        path = self._base_path().with_suffix(".folded")
+        try:
+            path.write_text("".join(f"{';'.join(stack)} {count}\n" for stack, count in self._stacks.items()), encoding="utf-8")
+            self.files.append(str(path))
+        except OSError as e:
+            print(f"Profiler: Failed to write {path}: {e}")
+        self.finished_at = time.time()
+
+    def info(self) -> dict:
+        return {**super().info(), "intervalMs": self.interval * 1000, "samples": self.samples}
+
+
+class _TorchSession(_Session):
+    mode = "torch"
+
+    def __init__(self, profiler: "Profiler", task_id: str | None, seconds: float):
+        super().__init__(profiler, task_id, seconds)
+        self._capturing = threading.Lock()
+        self.captures = 0
+
+    def start(self):
+        # Finishes at the deadline, or once the job it is capturing ends
+        def expire():
+            self._stopped.wait(self.seconds)
+            with self._capturing:
+                if self.finished_at is None:
+                    self.finished_at = time.time()
+
+        threading.Thread(target=expire, name=f"profiler-{self.id[:8]}", daemon=True).start()
+
+    def wants(self, task_id: str) -> bool:
+        return (
+            self.running and not self._stopped.is_set() and time.monotonic() < self.deadline
+            and (self.task_id is None or self.task_id == task_id)
+        )
+
+    @contextmanager
+    def capture(self):
+        """
+            Profiles the calling thread's job, unless another job is already being captured
+        """
+        if not self._capturing.acquire(blocking=False):
+            yield
+            return
+        try:
+            import torch
+            from torch.profiler import profile, ProfilerActivity
+
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            try:
+                # Needed for export_stacks to include Python frames
+                config = torch._C._profiler._ExperimentalConfig(verbose=True)
+            except AttributeError:
+                config = None
+            with profile(activities=activities, with_stack=True, experimental_config=config) as trace:
+                yield
+
+            self.captures += 1
+            base_path = self._base_path()
+            try:
+                trace.export_chrome_trace(f"{base_path}-{self.captures}.json")
+                self.files.append(f"{base_path}-{self.captures}.json")
+                trace.export_stacks(f"{base_path}-{self.captures}.folded", "self_cpu_time_total")
+                self.files.append(f"{base_path}-{self.captures}.folded")
+            except Exception as e:
+                print(f"Profiler: Failed to export torch trace: {e}")
+        finally:
+            self._capturing.release()
+
+    def info(self) -> dict:
+        return {**super().info(), "captures": self.captures}
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task_threads: dict[str, set[int]] = {}
+        self._sessions: dict[str, _Session] = {}
+
+    @property
+    def directory(self) -> Path:
+        return Path(user_data_dir(Settings.appName, Settings.appAuthor)) / "profiles"
+
+    def start(self, mode: str, task_id: str | None = None, seconds: float = 30, interval_ms: float = 10) -> dict:
+        if seconds <= 0:
+            raise ProfilerError("seconds must be positive")
+        with self._lock:
+            if mode == "sampling":
+                session = _SamplingSession(self, task_id, seconds, max(interval_ms, 1) / 1000)
+            elif mode == "torch":
+                if importlib.util.find_spec("torch") is None:
+                    raise ProfilerError("torch is not installed")
+                if any(isinstance(s, _TorchSession) and s.running for s in self._sessions.values()):
+                    raise ProfilerError("A torch profile is already running")
+                session = _TorchSession(self, task_id, seconds)
+            else:
+                raise ProfilerError(f"Unknown profiling mode {mode}")
+            self._sessions[session.id] = session
+            while len(self._sessions) > MAX_SESSIONS:
+                oldest = next((s for s in self._sessions.values() if not s.running), None)
+                if oldest is None:
+                    break
+                del self._sessions[oldest.id]
+        session.start()
+        print(f"Profiler: Started {mode} profile {session.id} of {task_id or 'every thread'} for up to {seconds} s")
+        return session.info()
+
+    def stop(self, profile_id: str) -> dict | None:
+        session = self._sessions.get(profile_id)
+        if session is None:
+            return None
+        session.stop()
+        return session.info()
+
+    def sessions(self) -> list[dict]:
+        return [session.info() for session in list(self._sessions.values())]
+
+    def task_finished(self, task_id: str):
+        """
+            Ends the sessions profiling `task_id`
+        """
+        for session in list(self._sessions.values()):
+            if session.task_id == task_id and session.running:
+                session.stop()
+
+    def task_threads(self, task_id: str) -> set[int]:
+        with self._lock:
+            return set(self._task_threads.get(task_id, ()))
+
+    @contextmanager
+    def task_thread(self, task_id: str):
+        """
+            Marks the calling thread as working on `task_id` for the duration of the block,
+            and profiles the block if a torch session wants it
+        """
+        if not Settings.debuggingEnabled:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self._task_threads.setdefault(task_id, set()).add(ident)
+            session = next(
+                (s for s in self._sessions.values() if isinstance(s, _TorchSession) and s.wants(task_id)), None
+            )
+        try:
+            if session is None:
+                yield
+            else:
+                with session.capture():
+                    yield
+        finally:
+            with self._lock:
+                threads = self._task_threads.get(task_id)
+                if threads is not None:
+                    threads.discard(ident)
+                    if not threads:
+                        del self._task_threads[task_id]
+
+    def call(self, task_id: str, function, *args, **kwargs):
+        """
+            Runs `function` in the calling thread as work for `task_id`
+        """
+        with self.task_thread(task_id):
+            return function(*args, **kwargs)
+
+
+profiler = Profiler()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import time
+
+from config import Settings
+
+
+def _percentage(current: float, total: float) -> float:
+    # whisper's last window can take the count past the total
+    return min(round((current / total) * 100, 2), 100) if total else 0
+
+
+class ProgressReporter:
+    """
+        Publishes a job's progress to its SSE channel from the inference thread.
+
+        Updates are coalesced: one is only published once `Settings.progressMinIntervalSeconds` have
+        passed or the percentage has moved by `Settings.progressMinStepPercent` since the last one, and
+        the latest value is held back otherwise. Completion is always published, as is any update still
+        held back when the reporter is closed.
+
+        `unit_seconds` is the length of audio one unit of progress stands for, e.g. one mel frame.
+    """
+
+    def __init__(self, task_id: str | None, broadcaster, loop: asyncio.AbstractEventLoop | None, unit_seconds: float):
+        self.task_id = task_id
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.unit_seconds = unit_seconds
+        self.started = time.monotonic()
+        self.published = 0
+        self.coalesced = 0
+        self._last_time = 0.0
+        self._last_percentage = None
+        self._pending: tuple[float, float] | None = None
+
+    def update(self, current: float, total: float):
+        percentage = _percentage(current, total)
+        now = time.monotonic()
+        due = (
+            self._last_percentage is None
+            or (total and current >= total)
+            or now - self._last_time >= Settings.progressMinIntervalSeconds
+            or percentage - self._last_percentage >= Settings.progressMinStepPercent
+        )
+        if not due:
+            self._pending = (current, total)
+            self.coalesced += 1
+            return
+        self._publish(current, total, percentage, now)
+
+    def close(self):
+        """
+            Publishes the last update if it was held back
+        """
+        if self._pending is not None:
+            current, total = self._pending
+            self._publish(current, total, _percentage(current, total), time.monotonic())
+
+    def _publish(self, current: float, total: float, percentage: float, now: float):
+        self._pending = None
+        self._last_time = now
+        self._last_percentage = percentage
+
+        if not (self.broadcaster and self.loop and self.task_id):
+            return
+
+        elapsed = now - self.started
+        audio_seconds = current * self.unit_seconds
+        throughput = audio_seconds / elapsed if elapsed > 0 else 0
+        try:
+            message = json.dumps({
+                "type": "progress",
+                "task_id": self.task_id,
+                "current": current,
+                "total": total,
+                "percentage": percentage,
+                "elapsedSeconds": round(elapsed, 2),
+                "audioSeconds": round(audio_seconds, 2),
+                "throughput": round(throughput, 3),     # Seconds of audio transcribed per second
+                "etaSeconds": round(max(total - current, 0) * self.unit_seconds / throughput, 1) if throughput > 0 else None,
+            })
+            asyncio.run_coroutine_threadsafe(
+                self.broadcaster.publish(channel=self.task_id, message=message),
+                self.loop,
+            )
+            self.published += 1
+        except Exception as e:
+            # Avoid crashing the transcription if publishing fails
+            print(f"Progress ({self.task_id}): Failed to publish progress: {e}")
@@ -0,0 +1,137 @@
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import asyncio
+import itertools
+import time
+
+from config import Settings
+from inference.metrics import queue_wait_seconds
+
+
+class Job:
+    def __init__(self, task_id: str, run: Callable[[], Awaitable[Any]], priority: int, seq: int):
+        self.task_id = task_id
+        self.run = run
+        self.priority = priority
+        self.seq = seq
+        self.submitted_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "Job"):
+        # Higher priority first, then first in first out
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class DeviceQueue:
+    """
+        A priority queue of jobs for one device, drained by a fixed number of worker tasks
+    """
+
+    def __init__(self, device: str, concurrency: int):
+        self.device = device
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.PriorityQueue[Job] = asyncio.PriorityQueue()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._waits: deque[float] = deque(maxlen=100)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.future.cancelled():
+                self.queue.task_done()
+                continue
+
+            wait = time.monotonic() - job.submitted_at
+            self._waits.append(wait)
+            queue_wait_seconds.observe(wait, plugin=self.device)
+            self.running += 1
+            try:
+                result = await job.run()
+                if not job.future.done():
+                    job.future.set_result(result)
+                self.completed += 1
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        queued = [job for job in self.queue._queue if not job.future.cancelled()]
+        waits = list(self._waits)
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": len(queued),
+            "completed": self.completed,
+            "failed": self.failed,
+            "averageWaitSeconds": round(sum(waits) / len(waits), 3) if waits else 0,
+            "maxWaitSeconds": round(max(waits), 3) if waits else 0,
+            "oldestQueuedSeconds": round(max((now - job.submitted_at for job in queued), default=0), 3),
+        }
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            job.future.cancel()
+
+
+class JobScheduler:
+    """
+        Runs transcription jobs with a bounded worker pool per device (inference plugin).
+
+        Worker counts come from `Settings.schedulerConcurrency`, falling back to
+        `Settings.schedulerDefaultConcurrency` for plugins that aren't listed.
+    """
+
+    def __init__(self):
+        self._devices: dict[str, DeviceQueue] = {}
+        self._seq = itertools.count()
+
+    def _device_queue(self, device: str) -> DeviceQueue:
+        if device not in self._devices:
+            concurrency = Settings.schedulerConcurrency.get(device, Settings.schedulerDefaultConcurrency)
+            self._devices[device] = DeviceQueue(device, concurrency)
+        return self._devices[device]
+
+    def submit(self, device: str, task_id: str, run: Callable[[], Awaitable[Any]], priority: int = 0) -> Job:
+        """
+            Queues `run` on `device`'s worker pool. Await `job.future` for its result.
+        """
+        device_queue = self._device_queue(device)
+        job = Job(task_id, run, priority, next(self._seq))
+        device_queue.queue.put_nowait(job)
+        return job
+
+    def queue_depth(self, device: str) -> int:
+        """
+            Returns the number of jobs waiting for a worker on `device`
+        """
+        device_queue = self._devices.get(device)
+        if device_queue is None:
+            return 0
+        return sum(1 for job in device_queue.queue._queue if not job.future.cancelled())
+
+    def stats(self) -> dict:
+        return {device: queue.stats() for device, queue in self._devices.items()}
+
+    async def stop(self):
+        await asyncio.gather(*(queue.stop() for queue in self._devices.values()))
+        self._devices.clear()
+
+
+scheduler = JobScheduler()
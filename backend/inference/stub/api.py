@@ -0,0 +1,107 @@
+import math
+import threading
+import time
+from config import Settings
+from inference.model_cache import model_cache, ModelKey
+from inference.core_budget import core_budget
+from inference.media_probe import media_probe
+from inference.progress import ProgressReporter
+
+# Stub plugin for load testing, only listed when Settings.stubPluginEnabled is set.
+# It behaves like the whisper plugins towards the rest of the backend (job serialisation, one
+# transcription per model instance, model cache loads, progress in mel frames, a segment every few
+# seconds) but sleeps instead of running a model, Settings.stubRealtimeFactor seconds per second of audio.
+
+PLUGIN = "stub"                 # Labels the load times in the metrics
+HOP_SECONDS = 0.01              # whisper counts progress in 10 ms mel frames...
+WINDOW_SECONDS = 30             # ...and advances one 30 second window at a time
+SEGMENT_SECONDS = 5
+SIZES = {"tiny": 1, "base": 2, "small": 4, "medium": 8, "large": 16}     # Relative cost of each model size
+
+
+class _StubModel:
+    def state_dict(self):
+        return {}
+
+
+def _loadModel():
+    time.sleep(Settings.stubLoadSeconds)
+    return _StubModel()
+
+
+def _duration(path) -> float:
+    if not isinstance(path, str):
+        return len(path) / 16000        # Decoded 16 kHz audio
+    info = media_probe.cached(path)
+    if info is not None and info.duration:
+        return info.duration
+    return Settings.stubAudioSeconds
+
+
+def supportedFormats():
+    return ["mp3", "mp4", "mpeg", "mpga", "m4a", "wav", "webm"]
+
+
+def getModels():
+    return list(SIZES)
+
+
+def warmUp(model, language, cancelled: threading.Event):
+    with model_cache.lease(ModelKey(model, False, "cpu", "stub"), _loadModel, warmup=True, plugin=PLUGIN):
+        # One window's worth of "inference", like the whisper plugins' forward pass
+        return not cancelled.wait(WINDOW_SECONDS * Settings.stubRealtimeFactor * SIZES.get(model, 1))
+
+
+def generateSubtitle(path, model, language, task_id_param, broadcaster_param, loop_param, patch_lock_param: threading.Lock, on_segment=None, vad=False, parallel=False):
+    # Only one job may run at a time when multi job is disabled
+    serialised = not Settings.enable_multi_job
+    if serialised:
+        patch_lock_param.acquire()
+    progress = None
+    try:
+        seconds = _duration(path)
+        total_frames = round(seconds / HOP_SECONDS)
+        progress = ProgressReporter(task_id_param, broadcaster_param, loop_param, HOP_SECONDS)
+        seconds_per_second = Settings.stubRealtimeFactor * SIZES.get(model, 1)
+
+        segments = []
+        # The precision keeps the stub's models apart from the whisper plugins' in the shared cache
+        with model_cache.lease(ModelKey(model, False, "cpu", "stub"), _loadModel, plugin=PLUGIN):
+            progress.update(0, total_frames)
+            for window_start in range(0, math.ceil(seconds), WINDOW_SECONDS):
+                window_end = min(window_start + WINDOW_SECONDS, seconds)
+                time.sleep((window_end - window_start) * seconds_per_second)
+                core_budget.apply()
+
+                for start in range(window_start, math.ceil(window_end), SEGMENT_SECONDS):
+                    segment = {
+                        "id": len(segments),
+                        "start": float(start),
+                        "end": min(start + SEGMENT_SECONDS, window_end),
+                        "text": f" Segment {len(segments) + 1}.",
+                    }
+                    segments.append(segment)
+                    if on_segment:
+                        on_segment(segment)
+                progress.update(round(window_end / HOP_SECONDS), total_frames)
+
+        return True, {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": "en" if language == "auto" else language,
+        }
+    except Exception as e:
+        print(f"Error during transcription for task {task_id_param}: {e}")
+        return False, str(e)
+    finally:
+        if progress:
+            progress.close()
+        if serialised:
+            patch_lock_param.release()
+
+
+def supportedLanguages():
+    return [
+        {"code": "auto", "lang": "Auto Detect"},
+        {"code": "en", "lang": "English"},
+    ]
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import asyncio
+import json
+import os
+import pysubs2
+
+from inference.event_log import event_log
+
+# Output formats which can be appended to one cue at a time, mapped to (file extension, pysubs2 format)
+STREAMABLE_FORMATS = {
+    "srt": ("srt", "srt"),
+    "webvtt": ("vtt", "vtt"),
+}
+
+
+class IncrementalSubtitleWriter:
+    """
+        Appends whisper segments to an SRT or WebVTT file as they are decoded.
+        Cues are rendered with pysubs2 so the file matches what `SSAFile.save` would have written.
+    """
+
+    def __init__(self, location: str, format_: str):
+        self.location = location
+        self.format = format_
+        self.count = 0
+        self._header = "WEBVTT\n\n" if format_ == "vtt" else ""
+        self._file = open(location, "w", encoding="utf-8")
+        self._file.write(self._header)
+
+    def append(self, segment: dict):
+        cue = pysubs2.load_from_whisper([segment]).to_string(self.format)[len(self._header):]
+        if not cue.strip():
+            return
+        self.count += 1
+        # Renumber the cue, pysubs2 numbers every single-cue file from 1
+        self._file.write(str(self.count) + cue[cue.index("\n"):])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SegmentStream:
+    """
+        Receives segments from a plugin while it is still transcribing a file.
+
+        Each segment is published to the task's SSE channel and appended to the streamable output formats.
+        `on_segment` is called from the inference thread.
+    """
+
+    def __init__(self, path: str, base_location: str, output_formats: list[str], task_id: str, loop: asyncio.AbstractEventLoop):
+        self.path = path
+        self.task_id = task_id
+        self.loop = loop
+        self.writers: dict[str, IncrementalSubtitleWriter] = {}
+        for format in output_formats:
+            if format.lower() in STREAMABLE_FORMATS:
+                extension, format_ = STREAMABLE_FORMATS[format.lower()]
+                self.writers[format.lower()] = IncrementalSubtitleWriter(f"{base_location}.{extension}", format_)
+
+    @property
+    def formats(self) -> set[str]:
+        """
+            Lowercase names of the output formats this stream has written
+        """
+        return set(self.writers)
+
+    def on_segment(self, segment: dict):
+        for writer in self.writers.values():
+            try:
+                writer.append(segment)
+            except Exception as e:
+                print(f"Task {self.task_id}: Failed to append segment to {writer.location}: {e}")
+
+        message = json.dumps({
+            "type": "segment",
+            "task_id": self.task_id,
+            "file": Path(self.path).name,
+            "start": segment["start"],
+            "end": segment["end"],
+            "text": segment["text"].strip(),
+        })
+        asyncio.run_coroutine_threadsafe(
+            event_log.publish(channel=self.task_id, message=message),
+            self.loop,
+        )
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def discard(self):
+        """
+            Closes and deletes the partially written files, used when transcription fails
+        """
+        self.close()
+        for writer in self.writers.values():
+            try:
+                os.remove(writer.location)
+            except OSError:
+                pass
+        self.writers = {}
@@ -0,0 +1,157 @@
+"""
+    Disk cache of raw transcription results, so re-running a file with different output formats or
+    save location skips inference.
+
+    Entries are keyed by a fingerprint of the media's contents together with everything that changes
+    the result: the plugin, the digest of its verified source, the model size, the language and the
+    decode options. The fingerprint hashes the file size and a few evenly spaced samples of the file
+    rather than all of it, which keeps it fast on multi-gigabyte videos; since it covers the contents
+    and not the path, a renamed or copied file still hits. The cache is bounded by
+    `Settings.transcriptCacheMaxMB` and evicts the least recently used entries.
+"""
+from hashlib import blake2b
+from pathlib import Path
+from platformdirs import user_data_dir
+
+import gzip
+import os
+import threading
+import orjson
+
+from config import Settings
+
+SAMPLE_COUNT = 16
+SAMPLE_BYTES = 64 * 1024
+
+
+def fingerprint(path: str) -> str:
+    """
+        Returns a hash of the file's size and SAMPLE_COUNT samples spread over its contents
+    """
+    size = os.path.getsize(path)
+    hasher = blake2b(str(size).encode(), digest_size=20)
+    with open(path, "rb") as f:
+        if size <= SAMPLE_COUNT * SAMPLE_BYTES:
+            hasher.update(f.read())
+        else:
+            step = (size - SAMPLE_BYTES) // (SAMPLE_COUNT - 1)
+            for index in range(SAMPLE_COUNT):
+                f.seek(index * step)
+                hasher.update(f.read(SAMPLE_BYTES))
+    return hasher.hexdigest()
+
+
+def cache_key(media_fingerprint: str, plugin: str, plugin_digest: str, model_size: str, language: str, options: dict) -> str:
+    identity = orjson.dumps([media_fingerprint, plugin, plugin_digest, model_size, language, options], option=orjson.OPT_SORT_KEYS)
+    return blake2b(identity, digest_size=20).hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes: dict[str, int] | None = None      # Entry file sizes, read from disk on first use
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def directory(self) -> Path:
+        return Path(user_data_dir(Settings.appName, Settings.appAuthor)) / "transcript_cache"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def _index(self) -> dict[str, int]:
+        if self._sizes is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._sizes = {
+                entry.name: entry.stat().st_size for entry in self.directory.iterdir() if entry.name.endswith(".json.gz")
+            }
+        return self._sizes
+
+    def get(self, key: str) -> dict | None:
+        path = self._entry_path(key)
+        with self._lock:
+            self._index()
+            try:
+                data = path.read_bytes()
+                os.utime(path)      # The modification time is the entry's last use
+            except OSError:
+                self.misses += 1
+                return None
+        try:
+            result = orjson.loads(gzip.decompress(data))
+        except Exception as e:
+            print(f"Transcript cache: Discarding unreadable entry {path.name}: {e}")
+            self.remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: dict):
+        data = gzip.compress(orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY), compresslevel=3)
+        path = self._entry_path(key)
+        with self._lock:
+            index = self._index()
+            temp_path = path.with_suffix(".tmp")
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+            index[path.name] = len(data)
+            self.stores += 1
+            self._evict()
+
+    def remove(self, key: str):
+        path = self._entry_path(key)
+        with self._lock:
+            self._index().pop(path.name, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """
+            Removes the least recently used entries until the cache fits its budget. Called with the lock held.
+        """
+        index = self._index()
+        budget = Settings.transcriptCacheMaxMB * 1024 * 1024
+        total = sum(index.values())
+        if total <= budget:
+            return
+
+        def last_used(name):
+            try:
+                return (self.directory / name).stat().st_mtime
+            except OSError:
+                return 0
+
+        for name in sorted(index, key=last_used):
+            if total <= budget:
+                break
+            try:
+                os.remove(self.directory / name)
+            except OSError:
+                pass
+            total -= index.pop(name)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._index()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(index),
+                "bytes": sum(index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+transcript_cache = TranscriptCache()
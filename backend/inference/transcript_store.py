@@ -0,0 +1,191 @@
+"""
+    SQLite store of every completed transcript with a full-text index over segment text.
+
+    One row per transcribed file and one per segment, with segment times in milliseconds. The FTS5
+    table indexes the segments table's text (as external content) and is kept in step by triggers.
+    Connections are per thread, and the database is in WAL mode so searches don't wait for inserts.
+"""
+from pathlib import Path
+from platformdirs import user_data_dir
+
+import sqlite3
+import threading
+import time
+
+from config import Settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    language TEXT,
+    plugin TEXT NOT NULL,
+    model_size TEXT NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    segment_count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_path ON files(path);
+
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_file ON segments(file_id, start_ms);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _fts_query(query: str) -> str:
+    """
+        Quotes every word of a plain search so FTS5 operators in it are matched literally.
+        All words must match; a trailing * on a word keeps it as a prefix search.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*") if prefix else word
+        terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class TranscriptStore:
+    def __init__(self):
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._initialised = False
+        self._init_lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return Path(user_data_dir(Settings.appName, Settings.appAuthor)) / "transcripts.db"
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialised:
+                    connection.executescript(SCHEMA)
+                    self._initialised = True
+            self._local.connection = connection
+        return connection
+
+    def add(self, path: str, result: dict, plugin: str, model_size: str) -> int:
+        """
+            Stores a whisper result, replacing an earlier transcript of the same file. Returns the file's ID.
+        """
+        segments = [
+            (round(segment["start"] * 1000), round(segment["end"] * 1000), segment["text"].strip())
+            for segment in result.get("segments", [])
+            if segment["text"].strip()
+        ]
+        connection = self._connection()
+        with self._write_lock, connection:
+            for (file_id,) in connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchall():
+                connection.execute("DELETE FROM segments WHERE file_id = ?", (file_id,))
+                connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+            file_id = connection.execute(
+                "INSERT INTO files (path, name, language, plugin, model_size, duration_ms, segment_count, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, Path(path).name, result.get("language"), plugin, model_size,
+                 max((end for _, end, _ in segments), default=0), len(segments), time.time()),
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO segments (file_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)",
+                [(file_id, start, end, text) for start, end, text in segments],
+            )
+        return file_id
+
+    def search(self, query: str, limit: int = 50, offset: int = 0, language: str | None = None,
+               plugin: str | None = None, model_size: str | None = None) -> list[dict]:
+        """
+            Returns the segments matching `query`, best matches first
+        """
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return []
+
+        sql = (
+            "SELECT segments.id, segments.file_id, segments.start_ms, segments.end_ms, segments.text,"
+            " snippet(segments_fts, 0, '[', ']', '…', 16) AS snippet,"
+            " files.path, files.name, files.language, files.plugin, files.model_size"
+            " FROM segments_fts"
+            " JOIN segments ON segments.id = segments_fts.rowid"
+            " JOIN files ON files.id = segments.file_id"
+            " WHERE segments_fts MATCH ?"
+        )
+        parameters: list = [fts_query]
+        for column, value in (("files.language", language), ("files.plugin", plugin), ("files.model_size", model_size)):
+            if value:
+                sql += f" AND {column} = ?"
+                parameters.append(value)
+        sql += " ORDER BY bm25(segments_fts) LIMIT ? OFFSET ?"
+        parameters += [limit, offset]
+
+        return [
+            {
+                "segmentId": row["id"],
+                "fileId": row["file_id"],
+                "file": row["name"],
+                "path": row["path"],
+                "language": row["language"],
+                "model": row["plugin"],
+                "modelSize": row["model_size"],
+                "startMs": row["start_ms"],
+                "endMs": row["end_ms"],
+                "text": row["text"],
+                "snippet": row["snippet"],
+            }
+            for row in self._connection().execute(sql, parameters)
+        ]
+
+    def files(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        return [
+            {
+                "fileId": row["id"],
+                "file": row["name"],
+                "path": row["path"],
+                "language": row["language"],
+                "model": row["plugin"],
+                "modelSize": row["model_size"],
+                "durationMs": row["duration_ms"],
+                "segments": row["segment_count"],
+                "createdAt": row["created_at"],
+            }
+            for row in self._connection().execute(
+                "SELECT * FROM files ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            )
+        ]
+
+    def segments(self, file_id: int) -> list[dict] | None:
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is None:
+            return None
+        return [
+            {"segmentId": row["id"], "startMs": row["start_ms"], "endMs": row["end_ms"], "text": row["text"]}
+            for row in connection.execute(
+                "SELECT id, start_ms, end_ms, text FROM segments WHERE file_id = ? ORDER BY start_ms", (file_id,)
+            )
+        ]
+
+
+transcript_store = TranscriptStore()
@@ -0,0 +1,146 @@
+"""
+    Energy based voice activity detection used to skip silence before inference.
+
+    Frames are compared against a threshold that adapts to the recording's noise floor, estimated from
+    the frames quieter than `Settings.vadThresholdDb` so that recordings without pauses don't have their
+    quietest speech taken for noise. Speech regions
+    are padded, joined with a short gap of silence and passed to the model as one shorter clip. The
+    `TimelineMap` maps timestamps in that clip back to the original file.
+"""
+from bisect import bisect_right
+
+import numpy as np
+
+from config import Settings
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+JOIN_GAP_SECONDS = 0.2      # Silence placed between speech regions so words on either side don't run together
+NOISE_FLOOR_MARGIN_DB = 12
+MAX_THRESHOLD_RAISE_DB = 6  # The noise floor can raise the threshold this far above Settings.vadThresholdDb at most
+
+
+class TimelineMap:
+    """
+        Maps times in the compacted audio back to the original timeline
+    """
+
+    def __init__(self):
+        self._compact_starts: list[float] = []
+        self._pieces: list[tuple[float, float, float]] = []     # (compact start, original start, duration)
+
+    def add(self, compact_start: float, original_start: float, duration: float):
+        self._compact_starts.append(compact_start)
+        self._pieces.append((compact_start, original_start, duration))
+
+    @property
+    def empty(self) -> bool:
+        return not self._pieces
+
+    def to_original(self, t: float) -> float:
+        index = max(bisect_right(self._compact_starts, t) - 1, 0)
+        compact_start, original_start, duration = self._pieces[index]
+        # Times inside a join gap are clamped to the end of the region before it
+        return round(original_start + min(max(t - compact_start, 0), duration), 3)
+
+    def remap_segment(self, segment: dict) -> dict:
+        remapped = dict(segment)
+        remapped["start"] = self.to_original(segment["start"])
+        remapped["end"] = self.to_original(segment["end"])
+        if "words" in segment:
+            remapped["words"] = [
+                dict(word, start=self.to_original(word["start"]), end=self.to_original(word["end"]))
+                for word in segment["words"]
+            ]
+        return remapped
+
+    def remap_result(self, result: dict) -> dict:
+        result["segments"] = [self.remap_segment(segment) for segment in result["segments"]]
+        return result
+
+
+def speech_regions(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> list[tuple[int, int]]:
+    """
+        Returns (start, end) sample indices of the regions of `audio` that contain speech
+    """
+    frame_length = sample_rate * FRAME_MS // 1000
+    n_frames = len(audio) // frame_length
+    if n_frames == 0:
+        return []
+
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length).astype(np.float32)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    db = 20 * np.log10(rms + 1e-10)
+    threshold = Settings.vadThresholdDb
+    quiet = db[db <= threshold]
+    if len(quiet):
+        noise_floor = float(np.percentile(quiet, 10))
+        threshold = min(max(threshold, noise_floor + NOISE_FLOOR_MARGIN_DB), threshold + MAX_THRESHOLD_RAISE_DB)
+    voiced = db > threshold
+
+    # Collect runs of voiced frames
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    regions = [[int(start), int(end)] for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))]
+
+    # Bridge short pauses, then drop blips too short to be speech
+    min_silence = Settings.vadMinSilenceMs // FRAME_MS
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+    min_speech = Settings.vadMinSpeechMs // FRAME_MS
+    merged = [region for region in merged if region[1] - region[0] >= min_speech]
+
+    padding = Settings.vadPaddingMs * sample_rate // 1000
+    result = []
+    for start_frame, end_frame in merged:
+        start_sample = max(start_frame * frame_length - padding, 0)
+        end_sample = min(end_frame * frame_length + padding, len(audio))
+        if result and start_sample <= result[-1][1]:
+            result[-1] = (result[-1][0], end_sample)
+        else:
+            result.append((start_sample, end_sample))
+    return result
+
+
+class VadResult:
+    def __init__(self, audio: np.ndarray, timeline: TimelineMap, total_seconds: float, speech_seconds: float):
+        self.audio = audio
+        self.timeline = timeline
+        self.total_seconds = total_seconds
+        self.speech_seconds = speech_seconds
+
+    @property
+    def skipped_seconds(self) -> float:
+        return round(self.total_seconds - self.speech_seconds, 3)
+
+    def report(self) -> dict:
+        return {
+            "totalSeconds": round(self.total_seconds, 3),
+            "speechSeconds": round(self.speech_seconds, 3),
+            "skippedSeconds": self.skipped_seconds,
+        }
+
+
+def remove_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> VadResult:
+    """
+        Cuts everything but the speech regions out of `audio`
+    """
+    timeline = TimelineMap()
+    pieces = []
+    gap = np.zeros(int(JOIN_GAP_SECONDS * sample_rate), dtype=audio.dtype)
+    compact_position = 0
+    speech_samples = 0
+    for start, end in speech_regions(audio, sample_rate):
+        if pieces:
+            pieces.append(gap)
+            compact_position += len(gap)
+        timeline.add(compact_position / sample_rate, start / sample_rate, (end - start) / sample_rate)
+        pieces.append(audio[start:end])
+        compact_position += end - start
+        speech_samples += end - start
+
+    compacted = np.concatenate(pieces) if pieces else np.zeros(0, dtype=audio.dtype)
+    return VadResult(compacted, timeline, len(audio) / sample_rate, speech_samples / sample_rate)
@@ -0,0 +1,190 @@
+"""
+    Background model warm-up, so the first job after startup or after changing the model doesn't pay
+    for loading the model and for the first inference's setup.
+
+    The settings of the last submitted job are kept in user_data_dir/last_used.json and warmed up at
+    startup; the settings dialog can also ask for a warm-up when the model size changes. Warm-ups call
+    the plugin's optional `warmUp(model, language, cancelled)`, which loads the model through the model
+    cache and runs a dummy forward pass. They run in a thread at the lowest OS priority (Linux, where the
+    nice value is per thread and inherited by the OpenMP threads torch starts from it) and with
+    `Settings.warmupThreads` torch threads.
+
+    A submitted job cancels a running warm-up. The forward pass stops at its next layer, but a model load
+    can't be interrupted and finishes first. If the job wants a different model, the warmed-up model is
+    evicted once it is loaded so it doesn't hold on to the memory the job needs.
+"""
+from pathlib import Path
+from platformdirs import user_data_dir
+
+import json
+import os
+import sys
+import threading
+import time
+
+from config import Settings
+from inference.model_cache import model_cache
+from inference.plugins import load_plugin
+from inference.scheduler import scheduler
+from inference.workers import worker_pools
+
+
+def lower_thread_priority():
+    if sys.platform != "linux":
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except OSError as e:
+        print(f"Warm-up: Could not lower the thread's priority: {e}")
+
+
+class _Warmup:
+    def __init__(self, model: str, model_size: str, language: str, reason: str):
+        self.model = model
+        self.model_size = model_size
+        self.language = language
+        self.reason = reason
+        self.state = "running"          # running, done, cancelled, failed or unsupported
+        self.error: str | None = None
+        self.started_at = time.time()
+        self.seconds: float | None = None
+        self.cancelled = threading.Event()
+        self.discard = False            # Evict the model once loaded, a job needs the memory for another one
+
+    def same_model(self, model: str, model_size: str, language: str) -> bool:
+        return (self.model, self.model_size, self.language) == (model, model_size, language)
+
+    def info(self) -> dict:
+        return {
+            "model": self.model,
+            "modelSize": self.model_size,
+            "language": self.language,
+            "reason": self.reason,
+            "state": self.state,
+            "error": self.error,
+            "startedAt": self.started_at,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+        }
+
+
+class WarmupService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: _Warmup | None = None
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    @property
+    def path(self) -> Path:
+        return Path(user_data_dir(Settings.appName, Settings.appAuthor)) / "last_used.json"
+
+    def last_used(self) -> dict | None:
+        try:
+            settings = json.loads(self.path.read_text(encoding="utf-8"))
+            return {"model": str(settings["model"]), "modelSize": str(settings["modelSize"]), "language": str(settings["language"])}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warm-up: Ignoring unreadable {self.path}: {e}")
+            return None
+
+    def _remember(self, model: str, model_size: str, language: str):
+        settings = {"model": model, "modelSize": model_size, "language": language}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(settings), encoding="utf-8")
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"Warm-up: Failed to save the last used settings: {e}")
+
+    def start(self, model: str, model_size: str, language: str, reason: str = "requested") -> dict:
+        """
+            Warms up a model unless jobs are running or queued, replacing a warm-up of another model
+        """
+        with self._lock:
+            current = self._current
+            if current and current.state == "running":
+                if current.same_model(model, model_size, language):
+                    return current.info()
+                current.discard = True
+                current.cancelled.set()
+            if worker_pools.enabled(model):
+                return {"model": model, "modelSize": model_size, "language": language, "reason": reason,
+                        "state": "skipped", "error": "The plugin's worker processes warm up the last used model when they start"}
+            if any(stats["running"] or stats["queued"] for stats in scheduler.stats().values()):
+                return {"model": model, "modelSize": model_size, "language": language, "reason": reason,
+                        "state": "skipped", "error": "Jobs are running"}
+            warmup = self._current = _Warmup(model, model_size, language, reason)
+        threading.Thread(target=self._run, args=(warmup,), name="warmup", daemon=True).start()
+        return warmup.info()
+
+    def start_last_used(self):
+        if not Settings.warmupEnabled:
+            return
+        settings = self.last_used()
+        if settings is not None:
+            self.start(settings["model"], settings["modelSize"], settings["language"], reason="startup")
+
+    def _run(self, warmup: _Warmup):
+        lower_thread_priority()
+        started = time.perf_counter()
+        try:
+            module = load_plugin(warmup.model)
+            if not hasattr(module, "warmUp"):
+                warmup.state = "unsupported"
+            elif module.warmUp(warmup.model_size, warmup.language, warmup.cancelled):
+                warmup.state = "done"
+            else:
+                warmup.state = "cancelled"
+        except Exception as e:
+            print(f"Warm-up: Failed to warm up {warmup.model} {warmup.model_size}: {e}")
+            warmup.state = "failed"
+            warmup.error = str(e)
+        warmup.seconds = time.perf_counter() - started
+
+        if warmup.cancelled.is_set() and warmup.discard:
+            model_cache.discard_warm()
+        with self._lock:
+            self.completed += warmup.state == "done"
+            self.cancelled += warmup.state == "cancelled"
+            self.failed += warmup.state == "failed"
+        print(f"Warm-up: {warmup.model} {warmup.model_size} {warmup.state} after {warmup.seconds:.2f} s")
+
+    def job_submitted(self, model: str, model_size: str, language: str):
+        """
+            Remembers a submitted job's settings and cancels the running warm-up, which keeps the model
+            loaded for the job when it is the same one. Writes last_used.json, so call it from a worker thread.
+        """
+        self._remember(model, model_size, language)
+        with self._lock:
+            current = self._current
+            if current is None or current.state != "running":
+                return
+            current.discard = not current.same_model(model, model_size, language)
+            current.cancelled.set()
+
+    def cancel(self) -> dict | None:
+        with self._lock:
+            current = self._current
+            if current is None:
+                return None
+            if current.state == "running":
+                current.discard = True
+                current.cancelled.set()
+            return current.info()
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "enabled": Settings.warmupEnabled,
+            "lastUsed": self.last_used(),
+            "current": current.info() if current else None,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
+
+
+warmup_service = WarmupService()
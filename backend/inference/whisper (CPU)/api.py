@@ -1,17 +1,27 @@
 import whisper
 import sys
 import tqdm
-import asyncio
-import json
 from broadcaster import Broadcast
 import threading
 from config import Settings
+from inference.model_cache import model_cache, ModelKey
+from inference.core_budget import core_budget
+from inference.progress import ProgressReporter
+from inference.whisper_batch import transcribe_batch
+from inference.vad import remove_silence
+from inference.parallel import transcribe_parallel
+from inference.whisper_quantize import PRECISION_SUFFIX, split_precision, load_quantized
+from inference.whisper_warmup import forward_pass
 
-# --- Globals to be set by the main app ---
-# These will be specific to the background task instance
-_task_id_for_tqdm: str | None = None
-_broadcaster_for_tqdm: Broadcast | None = None
-_loop_for_tqdm: asyncio.AbstractEventLoop | None = None
+PLUGIN = "whisper (CPU)"       # Labels the load times in the metrics
+
+# --- Per-thread state set by generateSubtitle ---
+# This module is loaded once and shared by every job, so the tqdm shim looks up the task it
+# reports for from the thread running the transcription rather than from module globals.
+_tqdm_context = threading.local()
+_patch_lock = threading.Lock()
+_patch_count = 0
+_original_tqdm = None
 # ---
 
 
@@ -20,8 +30,32 @@ class _tqdmProgressShim(tqdm.tqdm):
         super().__init__(*args, **kwargs)
         # Ensure 'total' is available if possible, whisper usually provides it
         self._known_total = self.total or 0
+        self._segments = None
+        self._emitted = 0
+
+    def _emit_new_segments(self, caller_frame):
+        on_segment = getattr(_tqdm_context, "on_segment", None)
+        if on_segment is None:
+            return
+        if self._segments is None:
+            segments = caller_frame.f_locals.get("all_segments")
+            if not isinstance(segments, list):
+                print("Warning: Could not find whisper.transcribe's segments, streaming disabled for this file.")
+                segments = []
+            self._segments = segments
+
+        while self._emitted < len(self._segments):
+            segment = self._segments[self._emitted]
+            self._emitted += 1
+            try:
+                on_segment(segment)
+            except Exception as e:
+                print(f"TQDM Shim Error: Failed to emit segment: {e}")
 
     def update(self, n: int = 1):
+        # whisper.transcribe calls update() right after adding a window's segments to its `all_segments`
+        self._emit_new_segments(sys._getframe(1))
+
         # Important: Check if update is called with n=0 initially by whisper
         if n == 0:
             super().update(0)  # Call original update but don't report progress yet
@@ -32,35 +66,49 @@ class _tqdmProgressShim(tqdm.tqdm):
         current_val = self.n
         total_val = self._known_total or self.total  # Update total if it becomes known
 
-        # --- Communication back to FastAPI ---
-        if _broadcaster_for_tqdm and _loop_for_tqdm and _task_id_for_tqdm:
-            try:
-                progress_percent = (
-                    round((current_val / total_val) * 100, 2) if total_val else 0
-                )
-                message = json.dumps({
-                    "type": "progress",
-                    "task_id": _task_id_for_tqdm,
-                    "current": current_val,
-                    "total": total_val,
-                    "percentage": progress_percent,
-                })
-
-                # Schedule the async publish call from this sync context
-                asyncio.run_coroutine_threadsafe(
-                    _broadcaster_for_tqdm.publish(
-                        channel=_task_id_for_tqdm, message=message
-                    ),
-                    _loop_for_tqdm,
-                )
-                # Debug:
-                # print(f"TQDM Shim ({_task_id_for_tqdm}): Published {message}")
+        _publish_progress(current_val, total_val)
 
-            except Exception as e:
-                # Avoid crashing the transcription if publishing fails
-                print(f"TQDM Shim Error ({_task_id_for_tqdm}): Failed to publish progress: {e}")
-        else:
-            print(f"TQDM Shim ({_task_id_for_tqdm}): Broadcaster/Loop not set, skipping publish.")
+
+def _publish_progress(current_val, total_val):
+    # Called once per decoded window, pick up a new share of the cores if jobs started or finished
+    core_budget.apply()
+
+    progress = getattr(_tqdm_context, "progress", None)
+    if progress is None:
+        print(f"TQDM Shim ({getattr(_tqdm_context, 'task_id', None)}): No progress reporter set, skipping publish.")
+        return
+    # The reporter coalesces updates, most calls don't publish anything
+    progress.update(current_val, total_val)
+
+
+def _install_tqdm_shim():
+    """
+        Patches whisper.transcribe's tqdm with the shim. Reference counted so concurrent jobs
+        share one patch, which is only restored once the last job finishes.
+    """
+    global _patch_count, _original_tqdm
+    transcribe_module = sys.modules.get('whisper.transcribe')
+    with _patch_lock:
+        if _patch_count == 0:
+            if transcribe_module and hasattr(transcribe_module, 'tqdm'):
+                _original_tqdm = transcribe_module.tqdm.tqdm
+                transcribe_module.tqdm.tqdm = _tqdmProgressShim
+            else:
+                print("Warning: Could not find whisper.transcribe.tqdm to patch.")
+        _patch_count += 1
+
+
+def _remove_tqdm_shim():
+    global _patch_count, _original_tqdm
+    transcribe_module = sys.modules.get('whisper.transcribe')
+    with _patch_lock:
+        _patch_count -= 1
+        if _patch_count == 0 and _original_tqdm:
+            # Only restore if we actually patched it and the current patch is still ours
+            if transcribe_module and transcribe_module.tqdm.tqdm is _tqdmProgressShim:
+                transcribe_module.tqdm.tqdm = _original_tqdm
+                print("TQDM Restored")
+            _original_tqdm = None
 
 
 def supportedFormats():
@@ -68,60 +116,138 @@ def supportedFormats():
 
 
 def getModels():
-    return whisper.available_models()
+    # Every size is also available with its Linear layers quantised to int8, e.g. "medium-int8"
+    models = whisper.available_models()
+    return models + [f"{model}{PRECISION_SUFFIX}" for model in models]
 
 
-def generateSubtitle(path, model, language, task_id_param, broadcaster_param, loop_param, patch_lock_param: threading.Lock):
-    global _task_id_for_tqdm, _broadcaster_for_tqdm, _loop_for_tqdm
+def _leaseModel(model, language, warmup=False):
+    size, precision = split_precision(model)
+    english_only = language == "en" and size in ["tiny", "base", "small", "medium",]
+    key = ModelKey(size, english_only, "cpu", precision)
+    if precision == "int8":
+        return model_cache.lease(key, lambda: load_quantized(key.name), warmup, PLUGIN)
+    return model_cache.lease(key, lambda: whisper.load_model(key.name, device="cpu"), warmup, PLUGIN)
 
-    _task_id_for_tqdm = task_id_param
-    _broadcaster_for_tqdm = broadcaster_param
-    _loop_for_tqdm = loop_param
 
-    print(_task_id_for_tqdm)
+def loadAudio(path):
+    """
+        Decodes a media file to 16 kHz mono audio, which generateSubtitle accepts in place of a path
+    """
+    return whisper.load_audio(path)
 
-    original_tqdm = None
-    transcribe_module = sys.modules.get('whisper.transcribe')
 
-    if not Settings.enable_multi_job:
-        # Acquire lock before modifying global whisper.transcribe.tqdm
+def warmUp(model, language, cancelled: threading.Event):
+    """
+        Loads the model into the model cache and runs silence through it. Returns False if cancelled part way.
+    """
+    with _leaseModel(model, language, warmup=True) as loaded_model:
+        return not cancelled.is_set() and forward_pass(loaded_model, language, cancelled, fp16=False)
+
+
+def generateSubtitle(path, model, language, task_id_param, broadcaster_param, loop_param, patch_lock_param: threading.Lock, on_segment=None, vad=False, parallel=False):
+    _tqdm_context.task_id = task_id_param
+    _tqdm_context.broadcaster = broadcaster_param
+    _tqdm_context.loop = loop_param
+    _tqdm_context.on_segment = on_segment
+    _tqdm_context.progress = None
+
+    print(task_id_param)
+
+    # Only one job may run at a time when multi job is disabled
+    serialised = not Settings.enable_multi_job
+    if serialised:
         patch_lock_param.acquire()
     try:
-        if transcribe_module and hasattr(transcribe_module, 'tqdm'):
-            original_tqdm = transcribe_module.tqdm.tqdm
-            transcribe_module.tqdm.tqdm = _tqdmProgressShim
-            # print(f"TQDM Patched for task {_task_id_for_tqdm}")  # Debug
-        else:
-            print("Warning: Could not find whisper.transcribe.tqdm to patch.")
-
+        _install_tqdm_shim()
         try:
-            if language == "en" and model in ["tiny", "base", "small", "medium",]:
-                model = model + ".en"
-            model = whisper.load_model(model, device="cpu")
-            if language == "auto":
-                return True, model.transcribe(path, verbose=False)
-            else:
-                return True, model.transcribe(path, language=language, verbose=False)
+            vad_result = None
+            if vad:
+                # Only run the model on speech, timestamps are mapped back to the original file afterwards
+                vad_result = remove_silence(whisper.load_audio(path) if isinstance(path, str) else path)
+                if vad_result.timeline.empty:
+                    return True, {"text": "", "segments": [], "language": language, "vad": vad_result.report()}
+                path = vad_result.audio
+                if on_segment:
+                    _tqdm_context.on_segment = lambda segment: on_segment(vad_result.timeline.remap_segment(segment))
+
+            if parallel and isinstance(path, str):
+                path = whisper.load_audio(path)
+            parallel = parallel and len(path) >= Settings.parallelMinSeconds * whisper.audio.SAMPLE_RATE
+            # whisper.transcribe counts progress in mel frames, parallel transcription in seconds
+            unit_seconds = 1 if parallel else whisper.audio.HOP_LENGTH / whisper.audio.SAMPLE_RATE
+            _tqdm_context.progress = ProgressReporter(task_id_param, broadcaster_param, loop_param, unit_seconds)
+
+            with _leaseModel(model, language) as loaded_model:
+                if parallel:
+                    result = transcribe_parallel(
+                        loaded_model,
+                        path,
+                        None if language == "auto" else language,
+                        on_segment=_tqdm_context.on_segment,
+                        on_progress=_publish_progress,
+                    )
+                elif language == "auto":
+                    result = loaded_model.transcribe(path, verbose=False)
+                else:
+                    result = loaded_model.transcribe(path, language=language, verbose=False)
+
+            if vad_result:
+                vad_result.timeline.remap_result(result)
+                result["vad"] = vad_result.report()
+            return True, result
         except Exception as e:
-            print(f"Error during transcription for task {_task_id_for_tqdm}: {e}")
+            print(f"Error during transcription for task {task_id_param}: {e}")
             return False, str(e)                # Return failure and error message
+        finally:
+            _remove_tqdm_shim()
+            if _tqdm_context.progress:
+                _tqdm_context.progress.close()
     finally:
+        if serialised:
+            patch_lock_param.release()
+
+        # Clear the thread's context so a reused worker thread doesn't report for a finished task
+        _tqdm_context.task_id = None
+        _tqdm_context.broadcaster = None
+        _tqdm_context.loop = None
+        _tqdm_context.on_segment = None
+        _tqdm_context.progress = None
 
-        if transcribe_module and hasattr(transcribe_module, 'tqdm') and hasattr(transcribe_module.tqdm, 'tqdm') and original_tqdm:
-            # Only restore if we actually patched it.
-            # Check if current patch is still ours, though lock should mostly handle this.
-            if transcribe_module.tqdm.tqdm is _tqdmProgressShim:
-                transcribe_module.tqdm.tqdm = original_tqdm
-                print(f"TQDM Restored for task {_task_id_for_tqdm}")
 
-        # Release lock after restoration attempt
-        if not Settings.enable_multi_job:
+def generateSubtitleBatch(paths, model, language, task_id_param, broadcaster_param, loop_param, patch_lock_param: threading.Lock, batch_size=8):
+    """
+        Transcribes several files with their 30 second windows decoded together in batches.
+        Returns a (success, result or error message) pair per file.
+    """
+    _tqdm_context.task_id = task_id_param
+    _tqdm_context.broadcaster = broadcaster_param
+    _tqdm_context.loop = loop_param
+    # Batched progress is counted in 30 second windows
+    _tqdm_context.progress = ProgressReporter(task_id_param, broadcaster_param, loop_param, whisper.audio.CHUNK_LENGTH)
+
+    serialised = not Settings.enable_multi_job
+    if serialised:
+        patch_lock_param.acquire()
+    try:
+        with _leaseModel(model, language) as loaded_model:
+            return transcribe_batch(
+                loaded_model,
+                paths,
+                None if language == "auto" else language,
+                batch_size,
+                fp16=False,
+                on_progress=_publish_progress,
+            )
+    finally:
+        if serialised:
             patch_lock_param.release()
 
-        # Clear module globals after use to avoid accidental reuse if module somehow persists
-        _task_id_for_tqdm = None
-        _broadcaster_for_tqdm = None
-        _loop_for_tqdm = None
+        _tqdm_context.progress.close()
+        _tqdm_context.task_id = None
+        _tqdm_context.broadcaster = None
+        _tqdm_context.loop = None
+        _tqdm_context.progress = None
 
 
 def supportedLanguages():
@@ -0,0 +1,193 @@
+"""
+    Cross-file batched transcription for the Whisper plugins.
+
+    Every file is cut into fixed 30 second mel windows and windows from several files are decoded
+    together in one encoder/decoder batch. Unlike `model.transcribe`, windows are not re-aligned to
+    the last decoded timestamp, which is what makes them independent and batchable. This suits the
+    many-short-clips workload; long files are better served by the regular mode.
+"""
+from typing import Callable
+
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions, DecodingResult
+from whisper.tokenizer import get_tokenizer
+
+# Same defaults as whisper.transcribe
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class _Window:
+    def __init__(self, file_index: int, offset: float, duration: float, mel: torch.Tensor):
+        self.file_index = file_index
+        self.offset = offset            # Seconds from the start of the file
+        self.duration = duration        # Seconds of real (unpadded) audio in the window
+        self.mel = mel
+        self.language: str | None = None
+        self.result: DecodingResult | None = None
+
+
+def _file_windows(file_index: int, audio, n_mels: int) -> list[_Window]:
+    mel = log_mel_spectrogram(audio, n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+
+    windows = []
+    for seek in range(0, max(content_frames, 1), N_FRAMES):
+        frames = min(N_FRAMES, content_frames - seek)
+        windows.append(_Window(
+            file_index,
+            seek * HOP_LENGTH / SAMPLE_RATE,
+            frames * HOP_LENGTH / SAMPLE_RATE,
+            pad_or_trim(mel[:, seek:seek + N_FRAMES], N_FRAMES),
+        ))
+    return windows
+
+
+def _needs_fallback(result: DecodingResult) -> bool:
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return False    # Silence, a higher temperature won't help
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def _window_segments(window: _Window, tokenizer, time_precision: float) -> list[dict]:
+    """
+        Splits a window's decoded tokens into segments at its timestamp tokens
+    """
+    result = window.result
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return []
+
+    segments = []
+    start = None
+    last_end = 0.0
+    text_tokens: list[int] = []
+
+    def emit(end):
+        segments.append({
+            "seek": round(window.offset / (HOP_LENGTH / SAMPLE_RATE)),
+            "start": round(window.offset + start, 3),
+            "end": round(window.offset + min(end, window.duration), 3),
+            "text": tokenizer.decode(text_tokens),
+            "tokens": list(text_tokens),
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob,
+        })
+
+    for token in result.tokens:
+        if token >= tokenizer.timestamp_begin:
+            timestamp = (token - tokenizer.timestamp_begin) * time_precision
+            if start is not None and text_tokens:
+                emit(timestamp)
+                last_end = timestamp
+                start = None
+                text_tokens = []
+            else:
+                start = timestamp
+        else:
+            if start is None:
+                start = last_end
+            text_tokens.append(token)
+
+    if text_tokens:
+        # The window ended mid-segment
+        emit(window.duration)
+    return [segment for segment in segments if segment["end"] > segment["start"]]
+
+
+def transcribe_batch(
+    model,
+    audios: list,
+    language: str | None,
+    batch_size: int,
+    fp16: bool,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> list[tuple[bool, dict | str]]:
+    """
+        Transcribes several files at once, returning a (success, result or error message) pair per file.
+
+        `audios` are paths or 16 kHz float32 arrays. Results have the same shape as `model.transcribe`'s
+        so they can be passed straight to `pysubs2.load_from_whisper`.
+    """
+    n_mels = model.dims.n_mels
+    time_precision = N_FRAMES // model.dims.n_audio_ctx * HOP_LENGTH / SAMPLE_RATE
+
+    outcomes: list[tuple[bool, dict | str] | None] = [None] * len(audios)
+    windows: list[_Window] = []
+    for index, audio in enumerate(audios):
+        try:
+            windows.extend(_file_windows(index, audio, n_mels))
+        except Exception as e:
+            print(f"Batched transcription: failed to decode {audio}: {e}")
+            outcomes[index] = (False, str(e))
+
+    # Pick one language per file from its first window
+    first_windows = {}
+    for window in windows:
+        first_windows.setdefault(window.file_index, window)
+    file_languages: dict[int, str] = {}
+    if language is not None or not model.is_multilingual:
+        file_languages = {index: language or "en" for index in first_windows}
+    else:
+        firsts = list(first_windows.values())
+        for i in range(0, len(firsts), batch_size):
+            batch = firsts[i:i + batch_size]
+            mel = torch.stack([w.mel for w in batch]).to(model.device)
+            if fp16:
+                mel = mel.half()
+            _, probs = model.detect_language(mel)
+            for window, prob in zip(batch, probs):
+                file_languages[window.file_index] = max(prob, key=prob.get)
+    for window in windows:
+        window.language = file_languages[window.file_index]
+
+    total = len(windows)
+    done = 0
+    by_language: dict[str, list[_Window]] = {}
+    for window in windows:
+        by_language.setdefault(window.language, []).append(window)
+
+    for window_language, pending in by_language.items():
+        for temperature in TEMPERATURES:
+            if not pending:
+                break
+            options = DecodingOptions(task="transcribe", language=window_language, temperature=temperature, fp16=fp16)
+            retry = []
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i:i + batch_size]
+                mel = torch.stack([w.mel for w in batch]).to(model.device)
+                for window, result in zip(batch, model.decode(mel, options)):
+                    window.result = result
+                    if temperature != TEMPERATURES[-1] and _needs_fallback(result):
+                        retry.append(window)
+                    else:
+                        done += 1
+                if on_progress:
+                    on_progress(done, total)
+            pending = retry
+
+    segments_by_file: dict[int, list[dict]] = {index: [] for index in first_windows}
+    for window in windows:
+        tokenizer = get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, language=window.language, task="transcribe"
+        )
+        segments_by_file[window.file_index].extend(_window_segments(window, tokenizer, time_precision))
+
+    for index, segments in segments_by_file.items():
+        for segment_id, segment in enumerate(segments):
+            segment["id"] = segment_id
+        outcomes[index] = (True, {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": file_languages[index],
+        })
+
+    # Files that decoded to no audio at all
+    for index, outcome in enumerate(outcomes):
+        if outcome is None:
+            outcomes[index] = (True, {"text": "", "segments": [], "language": language or "en"})
+    return outcomes
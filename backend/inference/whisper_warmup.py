@@ -0,0 +1,50 @@
+"""
+    Dummy forward pass for the Whisper plugins' warm-up (see inference.warmup).
+
+    Loading a model only gets its weights into memory; the first transcription still pays for
+    allocating the encoder's activations, the kv-cache and the kernels' first-use setup. Running one
+    window of silence through the encoder and a few decoder steps moves that cost out of the first job.
+"""
+import threading
+
+import numpy as np
+import torch
+from whisper.audio import N_SAMPLES, log_mel_spectrogram
+from whisper.decoding import DecodingOptions, decode
+
+from config import Settings
+
+SAMPLE_TOKENS = 4       # Decoder steps, enough to exercise the kv-cache
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def forward_pass(model, language: str, cancelled: threading.Event, fp16: bool) -> bool:
+    """
+        Decodes 30 seconds of silence with `Settings.warmupThreads` torch threads.
+        Returns False if `cancelled` was set part way, which is checked before every residual block.
+    """
+    def check(module, args):
+        if cancelled.is_set():
+            raise _Cancelled()
+
+    handles = [block.register_forward_pre_hook(check) for block in (*model.encoder.blocks, *model.decoder.blocks)]
+    try:
+        torch.get_num_threads()             # Initialise the thread's defaults first, or they override ours later
+        torch.set_num_threads(max(1, Settings.warmupThreads))
+        mel = log_mel_spectrogram(np.zeros(N_SAMPLES, dtype=np.float32), model.dims.n_mels).to(model.device)
+        options = DecodingOptions(
+            language=None if language == "auto" else language,
+            sample_len=SAMPLE_TOKENS,
+            without_timestamps=True,
+            fp16=fp16,
+        )
+        decode(model, mel, options)
+        return True
+    except _Cancelled:
+        return False
+    finally:
+        for handle in handles:
+            handle.remove()
@@ -0,0 +1,477 @@
+"""
+    Out-of-process inference: with `Settings.workerMode`, plugins run in their own worker processes
+    instead of threads of the server process, so Python work in the decoding loop doesn't contend for
+    the server's GIL and a crash or OOM in torch only takes down a worker.
+
+    Every plugin gets `Settings.workerProcesses[plugin]` workers, started the first time it is used.
+    A worker loads the plugin once and runs one job at a time: jobs are sent over a multiprocessing
+    queue, and whatever the plugin publishes (progress, VAD reports...), the segments it streams and
+    its result come back over another one. Decoded audio is copied into shared memory and mapped by
+    the worker rather than pickled through the queue.
+
+    Metrics the worker records (e.g. model load times) are sent to the server process after every job
+    and warm-up, and merged into its /metrics.
+
+    Workers that exit while the server is running are restarted, with a growing delay when they keep
+    exiting soon after starting. The jobs a worker was running when it exited fail with a WorkerError.
+    A worker that can't load its plugin isn't restarted. Each worker has its own model cache and warms
+    up the last used model of its plugin when it starts, until its first job arrives. The profiler
+    doesn't see work done in workers.
+"""
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import asyncio
+import gc
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+from config import Settings
+from inference.event_log import event_log
+from inference.metrics import metrics
+
+POLL_SECONDS = 0.5
+RESTART_DELAY_SECONDS = 1           # Doubled every time a worker exits within STABLE_SECONDS of starting...
+MAX_RESTART_DELAY_SECONDS = 60      # ...up to this
+STABLE_SECONDS = 60
+STOP_TIMEOUT_SECONDS = 5
+LOAD_FAILED_EXIT_CODE = 3
+
+_job_ids = itertools.count()
+
+
+class WorkerError(Exception):
+    """Raised when a job's worker process exits or can't load its plugin"""
+
+
+class _SharedAudio(NamedTuple):
+    name: str
+    shape: tuple
+    dtype: str
+
+
+def _settings_snapshot() -> dict:
+    # The broadcaster stays in the server process and workers load the public key themselves
+    return Settings.model_dump(exclude={"broadcast", "publicKey"})
+
+
+def _apply_settings(settings: dict):
+    for name, value in settings.items():
+        setattr(Settings, name, value)
+
+
+# --- Worker process ---
+
+def _send_metrics(events):
+    observations = metrics.drain()
+    if observations:
+        events.put(("metrics", observations))
+
+
+class _QueueBroadcaster:
+    """
+        Stands in for the event log in a worker, what the plugin publishes is sent on to the server process
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+    async def publish(self, channel: str, message: str):
+        self.events.put(("publish", channel, message))
+
+
+class _WorkerWarmup:
+    """
+        Warms up the last used model of the worker's plugin in a low priority thread. The first job
+        cancels it, and evicts the model if the job wants another one.
+    """
+
+    def __init__(self, plugin: str, module, events):
+        from inference.warmup import warmup_service
+        self.events = events
+        self.settings = warmup_service.last_used() if Settings.warmupEnabled else None
+        self.cancelled = threading.Event()
+        self._thread = None
+        if self.settings and self.settings["model"] == plugin and hasattr(module, "warmUp"):
+            self._thread = threading.Thread(target=self._run, args=(module,), name="warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self, module):
+        from inference.warmup import lower_thread_priority
+        lower_thread_priority()
+        try:
+            if module.warmUp(self.settings["modelSize"], self.settings["language"], self.cancelled):
+                print(f"Worker {os.getpid()}: Warmed up {self.settings['model']} {self.settings['modelSize']}")
+        except Exception as e:
+            print(f"Worker {os.getpid()}: Failed to warm up {self.settings['model']} {self.settings['modelSize']}: {e}")
+        _send_metrics(self.events)
+
+    def finish(self, model_size: str, language: str):
+        """
+            Called before the worker's first job
+        """
+        if self._thread is None:
+            return
+        self.cancelled.set()
+        self._thread.join()
+        self._thread = None
+        if (model_size, language) != (self.settings["modelSize"], self.settings["language"]):
+            from inference.model_cache import model_cache
+            model_cache.discard_warm()
+
+
+def _run_job(module, job: tuple, events, broadcaster: _QueueBroadcaster, loop, patch_lock: threading.Lock):
+    import numpy as np
+    from inference.core_budget import core_budget
+
+    job_id, function, task_id, first, args, kwargs, settings = job
+    _apply_settings(settings)
+    memory = None
+    try:
+        if isinstance(first, _SharedAudio):
+            memory = shared_memory.SharedMemory(name=first.name)
+            first = np.ndarray(first.shape, dtype=first.dtype, buffer=memory.buf)
+        if kwargs.pop("stream_segments", False):
+            kwargs["on_segment"] = lambda segment: events.put(("segment", job_id, segment))
+        with core_budget.job(task_id):
+            result = getattr(module, function)(first, *args, task_id, broadcaster, loop, patch_lock, **kwargs)
+        _send_metrics(events)
+        events.put(("result", job_id, result))
+    except Exception as e:
+        print(f"Worker {os.getpid()}: Job for task {task_id} failed: {e}")
+        _send_metrics(events)
+        events.put(("error", job_id, str(e)))
+    finally:
+        first = None
+        if memory is not None:
+            gc.collect()
+            try:
+                memory.close()
+            except BufferError:
+                print(f"Worker {os.getpid()}: Audio of task {task_id} is still referenced, it is unmapped when the worker exits")
+
+
+def _worker_main(plugin: str, settings: dict, jobs, events):
+    _apply_settings(settings)
+    from inference.plugins import load_plugin
+    try:
+        module = load_plugin(plugin)
+    except Exception as e:
+        events.put(("failed", f"Worker failed to load plugin {plugin}: {e}"))
+        events.close()
+        events.join_thread()
+        sys.exit(LOAD_FAILED_EXIT_CODE)
+
+    # Plugins publish with asyncio.run_coroutine_threadsafe, so the worker runs a loop for them too
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="worker-events", daemon=True).start()
+    broadcaster = _QueueBroadcaster(events)
+    patch_lock = threading.Lock()
+    events.put(("ready", os.getpid()))
+    warmup = _WorkerWarmup(plugin, module, events)
+
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            job = jobs.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return      # The server was killed without stopping its workers
+            continue
+        if job is None:
+            return
+        warmup.finish(*job[4][:2])     # The job's model size and language
+        _run_job(module, job, events, broadcaster, loop, patch_lock)
+
+
+# --- Server process ---
+
+class _PendingJob(NamedTuple):
+    future: asyncio.Future
+    on_segment: object
+
+
+class _Worker:
+    def __init__(self, pool: "WorkerPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.ready = asyncio.Event()        # Set once the plugin is loaded, cleared while restarting
+        self.broken: str | None = None      # Why the plugin can't be loaded
+        self.pid: int | None = None
+        self.started_at = 0.0
+        self.completed = 0
+        self.crashes = 0
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._pending: dict[int, _PendingJob] = {}
+        self._accepting = False
+        self._stopping = threading.Event()
+        self._spawn()
+        self._reader = threading.Thread(target=self._read, name=f"worker-reader-{pool.plugin}-{index}", daemon=True)
+        self._reader.start()
+
+    def _spawn(self):
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.events = context.Queue()
+        self.process = context.Process(
+            target=_worker_main, args=(self.pool.plugin, self.pool.settings(), self.jobs, self.events),
+            name=f"{self.pool.plugin} worker {self.index}",
+        )
+        self.process.start()
+        self.pid = self.process.pid
+        self.started_at = time.monotonic()
+
+    def _set_ready(self, ready: bool):
+        self.pool.loop.call_soon_threadsafe(self.ready.set if ready else self.ready.clear)
+
+    def _read(self):
+        delay = RESTART_DELAY_SECONDS
+        while not self._stopping.is_set():
+            try:
+                message = self.events.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                # Messages sent before the worker exited are read first
+                if not self.process.is_alive() and not self._stopping.is_set():
+                    delay = self._restart(delay)
+                continue
+            except (EOFError, OSError):
+                continue
+            self._dispatch(message)
+
+    def _dispatch(self, message: tuple):
+        kind = message[0]
+        if kind == "ready":
+            with self._lock:
+                self._accepting = True
+            self._set_ready(True)
+        elif kind == "failed":
+            self.broken = message[1]
+        elif kind == "metrics":
+            metrics.merge(message[1])
+        elif kind == "publish":
+            asyncio.run_coroutine_threadsafe(event_log.publish(channel=message[1], message=message[2]), self.pool.loop)
+        elif kind == "segment":
+            job = self._pending.get(message[1])
+            if job is not None and job.on_segment is not None:
+                try:
+                    job.on_segment(message[2])
+                except Exception as e:
+                    print(f"Workers: Failed to handle a segment: {e}")
+        elif kind in ["result", "error"]:
+            with self._lock:
+                job = self._pending.pop(message[1], None)
+            self.completed += 1
+            if job is not None:
+                outcome = message[2] if kind == "result" else WorkerError(message[2])
+                self.pool.loop.call_soon_threadsafe(_resolve, job.future, outcome)
+
+    def _fail_pending(self, error: WorkerError):
+        with self._lock:
+            self._accepting = False
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for job in pending:
+            self.pool.loop.call_soon_threadsafe(_resolve, job.future, error)
+
+    def _restart(self, delay: float) -> float:
+        code = self.process.exitcode
+        self._set_ready(False)
+        self._fail_pending(WorkerError(self.broken or f"Worker process exited with code {code}"))
+        if code == LOAD_FAILED_EXIT_CODE:
+            print(f"Workers: {self.broken}, not restarting it")
+            self.broken = self.broken or f"Worker of {self.pool.plugin} failed to load the plugin"
+            self._stopping.set()
+            self._set_ready(True)       # Lets waiting jobs see that the worker is broken
+            return delay
+
+        self.crashes += 1
+        if time.monotonic() - self.started_at >= STABLE_SECONDS:
+            delay = RESTART_DELAY_SECONDS
+        print(f"Workers: {self.pool.plugin} worker {self.index} (pid {self.pid}) exited with code {code}, restarting in {delay} s")
+        if self._stopping.wait(delay):
+            return delay
+        for channel in [self.jobs, self.events]:
+            channel.close()
+            channel.cancel_join_thread()
+        self._spawn()
+        self.restarts += 1
+        return min(delay * 2, MAX_RESTART_DELAY_SECONDS)
+
+    async def submit(self, function: str, task_id: str, first, args: tuple, kwargs: dict, on_segment) -> asyncio.Future:
+        """
+            Sends a job to the worker once it is ready. Returns the future of the job's outcome, which is
+            only resolved when the worker sends its result or error or exits.
+        """
+        while True:
+            await self.ready.wait()
+            if self.broken:
+                raise WorkerError(self.broken)
+            with self._lock:
+                if self._accepting:
+                    job_id = next(_job_ids)
+                    future = self.pool.loop.create_future()
+                    self._pending[job_id] = _PendingJob(future, on_segment)
+                    kwargs = {**kwargs, "stream_segments": on_segment is not None}
+                    self.jobs.put((job_id, function, task_id, first, args, kwargs, self.pool.settings()))
+                    break
+            # Exited but not noticed yet, wait for the restart
+            await asyncio.sleep(POLL_SECONDS)
+        return future
+
+    def stop(self):
+        self._stopping.set()
+        try:
+            self.jobs.put(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT_SECONDS)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self._fail_pending(WorkerError("Workers are shutting down"))
+
+    def stats(self) -> dict:
+        return {
+            "pid": self.pid,
+            "alive": self.process.is_alive(),
+            "ready": self.ready.is_set() and not self.broken,
+            "running": len(self._pending),
+            "completed": self.completed,
+            "crashes": self.crashes,
+            "restarts": self.restarts,
+            "error": self.broken,
+        }
+
+
+def _resolve(future: asyncio.Future, outcome):
+    if future.done():
+        return
+    if isinstance(outcome, Exception):
+        future.set_exception(outcome)
+        future.exception()      # Retrieved, the caller may have been cancelled and won't read it
+    else:
+        future.set_result(outcome)
+
+
+class WorkerPool:
+    """
+        The worker processes of one plugin. A job goes to the first idle worker.
+    """
+
+    def __init__(self, plugin: str, processes: int, loop: asyncio.AbstractEventLoop):
+        self.plugin = plugin
+        self.loop = loop
+        self.processes = max(1, processes)
+        self._idle: asyncio.Queue[_Worker] = asyncio.Queue()
+        self.workers = [_Worker(self, index) for index in range(self.processes)]
+        for worker in self.workers:
+            self._idle.put_nowait(worker)
+
+    def settings(self) -> dict:
+        settings = _settings_snapshot()
+        if not settings["cpuCoreBudget"] and self.processes > 1:
+            # Split the cores between the workers as the core budget would between in-process jobs
+            cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+            settings["cpuCoreBudget"] = max(1, cpus // self.processes)
+        return settings
+
+    async def run(self, function: str, task_id: str, first, args: tuple, kwargs: dict, on_segment=None, on_finished=None):
+        """
+            Runs a job on the first idle worker. `on_finished` is called once no worker will use the job's
+            arguments any more, which is after a cancelled caller has returned if the job was already sent.
+        """
+        def finished(_=None):
+            if on_finished is not None:
+                on_finished()
+
+        try:
+            worker = await self._idle.get()
+        except BaseException:
+            finished()
+            raise
+        try:
+            future = await worker.submit(function, task_id, first, args, kwargs, on_segment)
+        except BaseException:
+            self._idle.put_nowait(worker)
+            finished()
+            raise
+
+        # A cancelled caller doesn't stop the worker's job, so the worker is only idle again once the job has finished
+        def done(_):
+            self._idle.put_nowait(worker)
+            finished()
+
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes,
+            "idle": self._idle.qsize(),
+            "workers": [worker.stats() for worker in self.workers],
+        }
+
+
+class WorkerPools:
+    def __init__(self):
+        self._pools: dict[str, WorkerPool] = {}
+
+    def enabled(self, plugin: str) -> bool:
+        return Settings.workerMode and Settings.workerProcesses.get(plugin, Settings.workerDefaultProcesses) > 0
+
+    def _pool(self, plugin: str) -> WorkerPool:
+        if plugin not in self._pools:
+            processes = Settings.workerProcesses.get(plugin, Settings.workerDefaultProcesses)
+            print(f"Workers: Starting {processes} worker process(es) for {plugin}")
+            self._pools[plugin] = WorkerPool(plugin, processes, asyncio.get_running_loop())
+        return self._pools[plugin]
+
+    async def run(self, plugin: str, function: str, task_id: str, first, *args, on_segment=None, **kwargs):
+        """
+            Calls `function` of the plugin in one of its workers, like the in-process call
+            `function(first, *args, task_id, event_log, loop, patch_lock, **kwargs)`.
+            `first` is a path, a list of paths or decoded audio, which is passed through shared memory.
+        """
+        memory = None
+        if not isinstance(first, (str, list)):
+            import numpy as np
+            memory = shared_memory.SharedMemory(create=True, size=max(first.nbytes, 1))
+            np.ndarray(first.shape, dtype=first.dtype, buffer=memory.buf)[:] = first
+            first = _SharedAudio(memory.name, first.shape, first.dtype.str)
+
+        def release():
+            # The worker may still be mapping the audio after a cancelled caller returned, so wait for the job
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+
+        try:
+            pool = self._pool(plugin)
+        except BaseException:
+            release()
+            raise
+        return await pool.run(function, task_id, first, args, kwargs, on_segment, on_finished=release)
+
+    def stop(self):
+        for pool in self._pools.values():
+            pool.stop()
+        self._pools.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": Settings.workerMode,
+            "pools": {plugin: pool.stats() for plugin, pool in self._pools.items()},
+        }
+
+
+worker_pools = WorkerPools()
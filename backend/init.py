@@ -1,15 +1,33 @@
 from config import Settings
 from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-# --- FastAPI Lifespan for Broadcaster ---
+# --- FastAPI Lifespan for Broadcaster, capability catalogue and scheduler ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Lifespan: Connecting broadcaster...")
     await Settings.broadcast.connect()
     print("Lifespan: Broadcaster connected.")
+    from inference.capabilities import capability_catalogue
+    if Settings.lazyStartup:
+        # Loading the plugins imports torch and whisper, the UI is served in the meantime (see /ready)
+        capability_catalogue.rebuild_in_background()
+    else:
+        await asyncio.to_thread(capability_catalogue.rebuild)
+    from home.assets import asset_table
+    await asyncio.to_thread(asset_table.load)
+    if Settings.frontendWatch:
+        asset_table.start_watching()
+    from inference.warmup import warmup_service
+    warmup_service.start_last_used()
     yield
+    asset_table.stop_watching()
+    from inference.scheduler import scheduler
+    await scheduler.stop()
+    from inference.workers import worker_pools
+    await asyncio.to_thread(worker_pools.stop)
     print("Lifespan: Disconnecting broadcaster...")
     await Settings.broadcast.disconnect()
     print("Lifespan: Broadcaster disconnected.")
@@ -3,6 +3,7 @@ import webview
 from webview.dom import DOMEventHandler
 import sys
 import threading
+import multiprocessing
 import uvicorn
 import os
 
@@ -85,6 +86,7 @@ def bind(window):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()   # Parallel transcription spawns worker processes from the frozen executable
     t = threading.Thread(target=start_server)
     t.daemon = True
     t.start()
@@ -0,0 +1,86 @@
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import whisper
+from whisper.normalizers import BasicTextNormalizer, EnglishTextNormalizer
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from inference.whisper_quantize import load_quantized, quantize      # noqa: E402
+from inference.model_cache import _model_nbytes                     # noqa: E402
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    reference_words = reference.split()
+    hypothesis_words = hypothesis.split()
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+
+    # Levenshtein distance over words
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, 1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis_words, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (reference_word != hypothesis_word),
+            ))
+        previous = current
+    return previous[-1] / len(reference_words)
+
+
+def transcribe_all(model, audios: list, language: str | None) -> tuple[list[str], float]:
+    texts = []
+    started = time.perf_counter()
+    for audio in audios:
+        texts.append(model.transcribe(audio, language=language, fp16=False, verbose=None)["text"])
+    return texts, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares fp32 and int8 quantised CPU inference")
+    parser.add_argument("files", type=str, nargs="+", help="audio or video files to transcribe")
+    parser.add_argument("--sizes", type=str, nargs="+", default=["base"], help="whisper model sizes to compare")
+    parser.add_argument("--language", type=str, default=None, help="language code, detected when omitted")
+    parser.add_argument("--references", type=str, nargs="*", default=None,
+                        help="reference transcripts (text files, one per input file); the fp32 output is used when omitted")
+    parser.add_argument("--requantize", action="store_true", help="quantise again instead of loading the cached int8 weights")
+
+    args = parser.parse_args()
+    if args.references and len(args.references) != len(args.files):
+        parser.error("pass one reference transcript per file")
+
+    normalize = EnglishTextNormalizer() if args.language == "en" else BasicTextNormalizer()
+    audios = [whisper.load_audio(file) for file in args.files]
+    audio_seconds = sum(len(audio) for audio in audios) / whisper.audio.SAMPLE_RATE
+    references = [Path(reference).read_text(encoding="utf-8") for reference in args.references] if args.references else None
+
+    print(f"{len(audios)} files, {audio_seconds:.1f} s of audio")
+    print(f"{'model':<20}{'load s':>8}{'MB':>8}{'run s':>8}{'RTF':>8}{'WER %':>8}")
+    for size in args.sizes:
+        started = time.perf_counter()
+        fp32 = whisper.load_model(size, device="cpu")
+        fp32_load = time.perf_counter() - started
+        fp32_texts, fp32_seconds = transcribe_all(fp32, audios, args.language)
+        fp32_bytes = _model_nbytes(fp32)
+
+        started = time.perf_counter()
+        int8 = quantize(fp32) if args.requantize else load_quantized(size)
+        int8_load = time.perf_counter() - started
+        int8_texts, int8_seconds = transcribe_all(int8, audios, args.language)
+        int8_bytes = _model_nbytes(int8)
+
+        reference_texts = references or fp32_texts
+        for name, texts, load, seconds, nbytes in (
+            (size, fp32_texts, fp32_load, fp32_seconds, fp32_bytes),
+            (f"{size}-int8", int8_texts, int8_load, int8_seconds, int8_bytes),
+        ):
+            errors = [word_error_rate(normalize(reference), normalize(text)) for reference, text in zip(reference_texts, texts)]
+            print(
+                f"{name:<20}{load:>8.2f}{nbytes / 1024 / 1024:>8.0f}{seconds:>8.2f}"
+                f"{seconds / audio_seconds:>8.3f}{100 * sum(errors) / len(errors):>8.2f}"
+            )
+        print(f"{'int8 speedup':<20}{fp32_seconds / int8_seconds:>40.2f}x")
+        del fp32, int8
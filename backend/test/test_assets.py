@@ -0,0 +1,100 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from home import assets, home
+from home.assets import IMMUTABLE_CACHE_CONTROL, AssetTable, _accepted_encodings, asset_response
+
+PAGE = "<html>" + "<p>Subtext</p>" * 200 + "</html>"
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "brotli", None)
+    files = {
+        "index.html": PAGE,
+        "settings.html": PAGE.replace("Subtext", "Settings"),
+        "index.txt": "1:payload",
+        "_next/static/chunks/app-3f2a.js": "console.log('app');" * 100,
+        "_next/static/chunks/app-3f2a.js.map": "{}",
+        "build-manifest.json": "{}",
+        "secret.env": "TOKEN=1",
+    }
+    for name, contents in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(contents)
+    table = AssetTable(str(tmp_path))
+    table.load()
+    monkeypatch.setattr(home, "asset_table", table)
+    return table
+
+
+@pytest.fixture
+def client(table):
+    app = FastAPI()
+    app.include_router(home.home_router)
+    return TestClient(app)
+
+
+def test_accepted_encodings_skip_q_zero():
+    assert _accepted_encodings("gzip, deflate, br;q=0") == ["gzip", "deflate"]
+    assert _accepted_encodings("br;q=0.5, GZIP") == ["br", "gzip"]
+    assert _accepted_encodings("") == [""]
+
+
+def request(accept_encoding: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+
+def test_best_accepted_encoding_is_served(table, client):
+    identity = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert identity.text == PAGE
+    assert "Content-Encoding" not in identity.headers
+    assert identity.headers["Vary"] == "Accept-Encoding"
+
+    gzip = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert gzip.headers["Content-Encoding"] == "gzip"
+    assert gzip.text == PAGE        # Decoded by the client
+
+    # brotli isn't necessarily installed, nor able to decode this
+    asset = table.get("index.html")
+    asset.encoded["br"] = b"brotli body"
+    brotli = asset_response(request("gzip, br"), asset)
+    assert brotli.headers["Content-Encoding"] == "br"
+    assert brotli.body == b"brotli body"
+    assert asset_response(request("gzip, br;q=0"), asset).headers["Content-Encoding"] == "gzip"
+    assert len({identity.headers["ETag"], gzip.headers["ETag"], brotli.headers["ETag"]}) == 3
+
+
+def test_etag_of_each_encoding_gets_not_modified(client):
+    for encoding in ["identity", "gzip"]:
+        etag = client.get("/settings", headers={"Accept-Encoding": encoding}).headers["ETag"]
+        response = client.get("/settings", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    gzip_etag = client.get("/settings", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/settings", headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+    assert response.status_code == 200
+
+
+def test_hashed_static_files_are_immutable(client):
+    static = client.get("/_next/static/chunks/app-3f2a.js")
+    assert static.status_code == 200
+    assert static.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert "javascript" in static.headers["Content-Type"]
+    assert client.get("/").headers["Cache-Control"] == "no-cache"
+    assert client.get("/index.txt").headers["Cache-Control"] == "no-cache"
+
+
+def test_files_outside_the_allow_list_are_not_served(table, client):
+    for path in ["/secret.env", "/build-manifest.json", "/_next/static/chunks/app-3f2a.js.map", "/missing.js", "/../config.py"]:
+        assert client.get(path).status_code == 404
+    assert table.get("secret.env") is None
+
+
+def test_reload_picks_up_a_new_build(tmp_path, table, client):
+    (tmp_path / "index.html").write_text("<html>new</html>")
+    table.load()
+    assert client.get("/").text == "<html>new</html>"
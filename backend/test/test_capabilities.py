@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from config import Settings
+from inference import plugins
+from inference.capabilities import CapabilityCatalogue, cached_json_response
+
+PLUGIN = b"""
+def supportedFormats():
+    return ["mp3"]
+
+def supportedLanguages():
+    return {"en": "English"}
+
+def getModels():
+    return [MODEL]
+"""
+
+
+@pytest.fixture
+def catalogue(tmp_path, monkeypatch):
+    monkeypatch.setattr(plugins, "inference_path", str(tmp_path))
+    monkeypatch.setattr(plugins, "_plugin_cache", {})
+    monkeypatch.setattr(Settings, "allowUnsignedCode", True)
+    monkeypatch.setattr(Settings, "capabilityRefreshSeconds", 0)
+    # capabilities imported inference_path by name, so it needs patching there as well
+    monkeypatch.setattr("inference.capabilities.inference_path", str(tmp_path))
+    write_plugin(tmp_path, "tiny")
+    return CapabilityCatalogue()
+
+
+@pytest.fixture
+def client(catalogue):
+    app = FastAPI()
+
+    @app.get("/capabilities")
+    def getCapabilities(request: Request):
+        return cached_json_response(request, catalogue.get().capabilities)
+
+    return TestClient(app)
+
+
+def write_plugin(tmp_path, model: str):
+    filename = tmp_path / "echo" / "api.py"
+    filename.parent.mkdir(exist_ok=True)
+    existed = filename.exists()
+    filename.write_bytes(f"MODEL = {model!r}\n".encode() + PLUGIN)
+    if existed:
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_catalogue_is_built_from_the_plugins(client):
+    response = client.get("/capabilities")
+    assert response.status_code == 200
+    assert response.json() == {
+        "models": ["echo"],
+        "plugins": {"echo": {"formats": ["mp3"], "languages": {"en": "English"}, "modelSizes": ["tiny"]}},
+        "errors": {},
+    }
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_matching_etag_gets_not_modified(client):
+    etag = client.get("/capabilities").headers["ETag"]
+    response = client.get("/capabilities", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.get("/capabilities", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert client.get("/capabilities", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_changed_plugin_changes_the_etag(tmp_path, client):
+    etag = client.get("/capabilities").headers["ETag"]
+    write_plugin(tmp_path, "base")
+    response = client.get("/capabilities", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["plugins"]["echo"]["modelSizes"] == ["base"]
+
+
+def test_unchanged_plugins_keep_the_catalogue(catalogue, monkeypatch):
+    built = catalogue.get()
+    monkeypatch.setattr(Settings, "capabilityRefreshSeconds", 60)
+    assert catalogue.get() is built
+    monkeypatch.setattr(Settings, "capabilityRefreshSeconds", 0)
+    assert catalogue.get() is built
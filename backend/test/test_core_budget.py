@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from config import Settings
+from inference import core_budget as core_budget_module
+from inference.core_budget import CoreBudget
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(core_budget_module, "_available_cpus", list(range(8)))
+    monkeypatch.setattr(Settings, "cpuCoreBudget", 6)
+    monkeypatch.setattr(Settings, "cpuAffinity", False)
+    return CoreBudget()
+
+
+class Job(threading.Thread):
+    """
+        Runs a job on its own thread, stepping through it as the test says
+    """
+
+    def __init__(self, budget: CoreBudget, task_id: str):
+        super().__init__(daemon=True)
+        self.budget = budget
+        self.task_id = task_id
+        self.step = threading.Semaphore(0)
+        self.done = threading.Semaphore(0)
+        self.threads: list[int] = []
+        self.start()
+
+    def run(self):
+        self.step.acquire()
+        with self.budget.job(self.task_id):
+            self.threads.append(self.budget.threads())     # Not registered before start
+            self.budget.start()
+            self.done.release()
+            self.step.acquire()
+            self.budget.apply()
+            self.threads.append(self.budget.threads())
+            self.done.release()
+            self.step.acquire()
+        self.done.release()
+
+    def advance(self):
+        self.step.release()
+        assert self.done.acquire(timeout=10)
+
+
+def shares(budget: CoreBudget) -> dict[str, int]:
+    return {job["task_id"]: job["threads"] for job in budget.stats()["jobs"]}
+
+
+def test_shares_add_up_to_the_budget_and_are_returned(budget):
+    first, second = Job(budget, "first"), Job(budget, "second")
+    first.advance()
+    assert shares(budget) == {"first": 6}
+
+    second.advance()
+    assert shares(budget) == {"first": 3, "second": 3}
+    assert sum(shares(budget).values()) == Settings.cpuCoreBudget
+    # Running jobs pick their new share up at their next apply
+    first.advance()
+    assert first.threads == [6, 3]
+
+    second.advance()
+    second.advance()
+    assert shares(budget) == {"first": 6}
+    first.advance()
+    assert shares(budget) == {}
+
+
+def test_uneven_shares_give_the_remainder_to_the_first_jobs(budget, monkeypatch):
+    monkeypatch.setattr(Settings, "cpuCoreBudget", 5)
+    jobs = [Job(budget, name) for name in ["a", "b", "c"]]
+    for job in jobs:
+        job.advance()
+    assert shares(budget) == {"a": 2, "b": 2, "c": 1}
+    for job in jobs:
+        job.advance()
+        job.advance()
+    assert shares(budget) == {}
+
+
+def test_more_jobs_than_cores_share_single_cores(budget, monkeypatch):
+    monkeypatch.setattr(Settings, "cpuCoreBudget", 2)
+    jobs = [Job(budget, name) for name in ["a", "b", "c"]]
+    for job in jobs:
+        job.advance()
+    assert shares(budget) == {"a": 1, "b": 1, "c": 1}
+    assert [allocation.cpus for allocation in budget._jobs.values()] == [[0], [1], [0]]
+    for job in jobs:
+        job.advance()
+        job.advance()
+
+
+def test_threads_outside_a_job_are_every_core(budget):
+    assert budget.threads() == 6
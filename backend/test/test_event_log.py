@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import asyncio
+
+from config import Settings
+from inference import event_log as event_log_module
+from inference.event_log import SWEEP_INTERVAL_SECONDS, TaskEventLog
+
+
+def run(coroutine):
+    async def main():
+        await Settings.broadcast.connect()
+        try:
+            return await asyncio.wait_for(coroutine, timeout=10)
+        finally:
+            await Settings.broadcast.disconnect()
+    return asyncio.run(main())
+
+
+async def take(log: TaskEventLog, task_id: str, count: int, last_event_id: int = 0) -> list:
+    events = []
+    async for event in log.subscribe(task_id, last_event_id):
+        events.append((event.id, event.message))
+        if len(events) == count:
+            break
+    return events
+
+
+def test_late_subscriber_is_replayed_the_whole_log():
+    async def main():
+        log = TaskEventLog()
+        for message in ["a", "b", "c"]:
+            await log.publish("task", message)
+        return await take(log, "task", 3), log.stats()
+
+    events, stats = run(main())
+    assert events == [(1, "a"), (2, "b"), (3, "c")]
+    assert stats["replayed"] == 3
+
+
+def test_reconnect_resumes_after_last_event_id():
+    async def main():
+        log = TaskEventLog()
+        for message in ["a", "b", "c", "d"]:
+            await log.publish("task", message)
+        return await take(log, "task", 2, last_event_id=2)
+
+    assert run(main()) == [(3, "c"), (4, "d")]
+
+
+def test_subscriber_follows_new_events():
+    async def main():
+        log = TaskEventLog()
+        await log.publish("task", "a")
+        reader = asyncio.create_task(take(log, "task", 3))
+        await asyncio.sleep(0.01)
+        await log.publish("task", "b")
+        await log.publish("other", "x")
+        await log.publish("task", "c")
+        return await reader
+
+    assert run(main()) == [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_log_keeps_the_newest_events(monkeypatch):
+    monkeypatch.setattr(Settings, "eventLogMaxEvents", 2)
+
+    async def main():
+        log = TaskEventLog()
+        for message in ["a", "b", "c"]:
+            await log.publish("task", message)
+        return [(event.id, event.message) for event in log.events("task")]
+
+    assert run(main()) == [(2, "b"), (3, "c")]
+
+
+def test_idle_logs_expire_unless_subscribed(monkeypatch):
+    monkeypatch.setattr(Settings, "eventLogTtlSeconds", 60)
+    now = [1000.0]
+    # The module's clock only, asyncio keeps the real one
+    monkeypatch.setattr(event_log_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def main():
+        log = TaskEventLog()
+        await log.publish("idle", "a")
+        await log.publish("watched", "a")
+        reader = asyncio.create_task(take(log, "watched", 2))
+        await asyncio.sleep(0.01)
+
+        now[0] += max(SWEEP_INTERVAL_SECONDS, 61)
+        await log.publish("new", "a")        # Publishing sweeps the expired logs
+        expired = (log.events("idle"), len(log.events("watched")))
+        await log.publish("watched", "b")
+        await reader
+        return expired
+
+    assert run(main()) == ([], 1)
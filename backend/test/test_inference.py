@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import Settings
+from inference import inference
+from inference.event_log import event_log
+from inference.inference import TranscriptionRequest, transcribeBatchWorker, transcription_router
+from inference.scheduler import JobScheduler
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setattr(Settings, "debuggingEnabled", True)
+    app = FastAPI()
+    app.include_router(transcription_router)
+    return TestClient(app)
+
+
+def publish_status(task_id: str, status: str):
+    message = {"type": "status", "status": status}
+    if status == "ERROR":
+        message["message"] = "Error processing a.mp4: broken"
+
+    async def main():
+        await Settings.broadcast.connect()
+        try:
+            await event_log.publish(channel=task_id, message=json.dumps(message))
+        finally:
+            await Settings.broadcast.disconnect()
+    asyncio.run(main())
+
+
+def test_profile_of_a_task_with_a_failed_file_can_start(client):
+    task_id = str(uuid.uuid4())
+    publish_status(task_id, "ERROR")
+    response = client.post("/profile", json={"task_id": task_id, "seconds": 1})
+    assert response.status_code == 200
+    client.delete(f"/profile/{response.json()['profile_id']}")
+
+
+def test_profile_of_a_finished_task_is_refused(client):
+    task_id = str(uuid.uuid4())
+    publish_status(task_id, "ERROR")
+    publish_status(task_id, "DONE")
+    response = client.post("/profile", json={"task_id": task_id, "seconds": 1})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("query", ["limit=-1", "limit=0", "limit=501", "offset=-1"])
+def test_transcript_paging_is_bounded(client, monkeypatch, query):
+    monkeypatch.setattr(Settings, "transcriptStoreEnabled", True)
+    assert client.get(f"/transcripts?{query}").status_code == 422
+    assert client.get(f"/transcripts/search?q=hello&{query}").status_code == 422
+
+
+def test_batch_subtitles_are_saved_after_the_scheduler_job(monkeypatch):
+    req = TranscriptionRequest(
+        filePaths=["a.mp4", "b.mp4"], model="whisper (CPU)", modelSize="tiny", language="en",
+        embedSubtitles=True, overWriteFiles=True, outputFormats=["srt"], saveLocation="default", batched=True,
+    )
+    saved = []
+
+    async def main():
+        scheduler = JobScheduler()
+        monkeypatch.setattr(inference, "scheduler", scheduler)
+
+        async def inferBatch(paths, task_id, req):
+            return [(True, {"segments": [], "text": path}) for path in paths]
+
+        async def cacheLookup(path, task_id, req, batched=False):
+            return None, None
+
+        async def cacheStore(key, result):
+            pass
+
+        async def saveSubtitles(path, result, task_id, req, streamed_formats=frozenset()):
+            # Muxing mustn't hold the device's inference slot
+            saved.append((path, scheduler.stats()[req.model]["running"]))
+
+        monkeypatch.setattr(inference, "load_plugin", lambda model: SimpleNamespace(generateSubtitleBatch=None))
+        monkeypatch.setattr(inference, "inferBatch", inferBatch)
+        monkeypatch.setattr(inference, "_cacheLookup", cacheLookup)
+        monkeypatch.setattr(inference, "_cacheStore", cacheStore)
+        monkeypatch.setattr(inference, "saveSubtitles", saveSubtitles)
+        try:
+            await asyncio.wait_for(transcribeBatchWorker(req.filePaths, "task", req), timeout=10)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+    assert saved == [("a.mp4", 0), ("b.mp4", 0)]
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from inference import inference
+from inference.inference import transcription_router
+from inference.media_probe import MediaProbe, ProbeError
+
+# Stands in for ffprobe: a file's contents are the JSON it reports, or "broken" to fail
+FAKE_FFPROBE = f"""#!{sys.executable}
+import os, sys
+with open(os.environ["FAKE_FFPROBE_LOG"], "a") as log:
+    log.write(sys.argv[-1] + "\\n")
+contents = open(sys.argv[-1]).read()
+if contents == "broken":
+    print("[mov,mp4] moov atom not found", file=sys.stderr)
+    print(sys.argv[-1] + ": Invalid data found when processing input", file=sys.stderr)
+    sys.exit(1)
+print(contents)
+"""
+
+VIDEO = {
+    "format": {"format_name": "mov,mp4", "duration": "12.5"},
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "r_frame_rate": "24000/1001"},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac"},
+    ],
+}
+SILENT_VIDEO = {"format": {"format_name": "mov,mp4"}, "streams": [VIDEO["streams"][0]]}
+
+
+@pytest.fixture
+def ffprobe(tmp_path, monkeypatch):
+    binary = tmp_path / "bin" / "ffprobe"
+    binary.parent.mkdir()
+    binary.write_text(FAKE_FFPROBE)
+    binary.chmod(0o755)
+    log = tmp_path / "ffprobe.log"
+    log.touch()
+    monkeypatch.setenv("PATH", f"{binary.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_FFPROBE_LOG", str(log))
+    return log
+
+
+def media(tmp_path, name: str, contents) -> str:
+    path = tmp_path / name
+    path.write_text(contents if isinstance(contents, str) else json.dumps(contents))
+    return str(path)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+def probes(log) -> int:
+    return len(log.read_text().splitlines())
+
+
+def test_metadata_is_parsed(tmp_path, ffprobe):
+    info = run(MediaProbe().probe(media(tmp_path, "a.mp4", VIDEO)))
+    assert info.duration == 12.5
+    assert round(info.fps, 3) == 23.976
+    assert info.to_dict()["audioCodec"] == "aac"
+    assert info.to_dict()["videoCodec"] == "h264"
+
+
+def test_file_is_probed_once_per_version(tmp_path, ffprobe):
+    probe = MediaProbe()
+    path = media(tmp_path, "a.mp4", VIDEO)
+    first = run(probe.probe(path))
+    assert run(probe.probe(path)) is first
+    assert probe.cached(path) is first
+    assert probes(ffprobe) == 1
+
+    # Same size, newer mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert probe.cached(path) is None
+    run(probe.probe(path))
+    assert probes(ffprobe) == 2
+
+    # Replaced with a different size
+    media(tmp_path, "a.mp4", dict(VIDEO, format={"format_name": "matroska"}))
+    assert run(probe.probe(path)).format_name == "matroska"
+    assert probes(ffprobe) == 3
+    assert (probe.hits, probe.misses) == (2, 3)
+
+
+def test_unusable_files_are_rejected(tmp_path, ffprobe):
+    probe = MediaProbe()
+    with pytest.raises(ProbeError, match="File can't be read"):
+        run(probe.probe(str(tmp_path / "missing.mp4")))
+    with pytest.raises(ProbeError, match="File has no audio stream"):
+        run(probe.probe(media(tmp_path, "silent.mp4", SILENT_VIDEO)))
+    with pytest.raises(ProbeError, match="Not a readable media file: .*Invalid data found when processing input$"):
+        run(probe.probe(media(tmp_path, "broken.mp4", "broken")))
+
+
+def test_probe_all_reports_each_file(tmp_path, ffprobe):
+    good = media(tmp_path, "a.mp4", VIDEO)
+    silent = media(tmp_path, "silent.mp4", SILENT_VIDEO)
+    results = run(MediaProbe().probe_all([good, silent]))
+    assert results[good].duration == 12.5
+    assert isinstance(results[silent], ProbeError)
+
+
+def test_missing_ffprobe_skips_the_checks(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    probe = MediaProbe()
+    path = media(tmp_path, "a.mp4", VIDEO)
+    assert run(probe.probe(path)) is None
+    assert probe.unavailable
+    assert probe.probe_sync(path) is None
+    assert probe.stats()["ffprobeAvailable"] is False
+    # Files that don't exist are still rejected
+    with pytest.raises(ProbeError):
+        run(probe.probe(str(tmp_path / "missing.mp4")))
+
+
+def test_transcribe_is_refused_when_every_file_is_rejected(tmp_path, ffprobe, monkeypatch):
+    monkeypatch.setattr(inference, "media_probe", MediaProbe())
+    app = FastAPI()
+    app.include_router(transcription_router)
+    response = TestClient(app).post("/transcribe", json={
+        "filePaths": [str(tmp_path / "missing.mp4"), media(tmp_path, "silent.mp4", SILENT_VIDEO)],
+        "model": "whisper (CPU)", "modelSize": "tiny", "language": "en", "embedSubtitles": False,
+        "overWriteFiles": True, "outputFormats": ["srt"], "saveLocation": "default",
+    })
+    assert response.status_code == 422
+    assert "missing.mp4: File can't be read" in response.json()["detail"]
+    assert "silent.mp4: File has no audio stream" in response.json()["detail"]
@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+
+from config import Settings
+from inference.model_cache import ModelCache, ModelKey
+
+MB = 1024 * 1024
+
+
+class Model:
+    def __init__(self, megabytes: int):
+        self.megabytes = megabytes
+
+    def state_dict(self):
+        # _model_nbytes only needs numel() and element_size()
+        return {"weight": Tensor(self.megabytes * MB)}
+
+
+class Tensor:
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(Settings, "modelCacheRamBudgetMB", 10)
+    monkeypatch.setattr(Settings, "modelCacheVramBudgetMB", 10)
+    return ModelCache()
+
+
+def key(size: str, device: str = "cpu") -> ModelKey:
+    return ModelKey(size, False, device, "fp32")
+
+
+def cached(cache: ModelCache) -> list[str]:
+    return [model["model"] for model in cache.stats()["models"]]
+
+
+def test_models_are_loaded_once(cache):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return Model(1)
+
+    with cache.lease(key("tiny"), loader) as first:
+        pass
+    with cache.lease(key("tiny"), loader) as second:
+        pass
+    assert first is second
+    assert len(loads) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_model_is_evicted(cache):
+    for size in ["tiny", "base"]:
+        with cache.lease(key(size), lambda: Model(4)):
+            pass
+    with cache.lease(key("tiny"), lambda: Model(4)):     # tiny is now the most recently used
+        pass
+    with cache.lease(key("small"), lambda: Model(4)):
+        pass
+    assert cached(cache) == ["tiny", "small"]
+    assert cache.evictions == 1
+
+
+def test_models_in_use_are_not_evicted(cache):
+    with cache.lease(key("tiny"), lambda: Model(6)):
+        with cache.lease(key("base"), lambda: Model(6)):
+            assert cached(cache) == ["tiny", "base"]
+        # base is idle and over budget once released, tiny is still in use
+        assert cached(cache) == ["tiny"]
+    assert cached(cache) == ["tiny"]
+
+
+def test_devices_have_separate_budgets(cache):
+    with cache.lease(key("tiny", "cpu"), lambda: Model(8)):
+        pass
+    with cache.lease(key("tiny", "cuda"), lambda: Model(8)):
+        pass
+    assert len(cached(cache)) == 2
+
+
+def test_failed_loads_leave_no_entry(cache):
+    def loader():
+        raise RuntimeError("out of memory")
+
+    with pytest.raises(RuntimeError):
+        with cache.lease(key("tiny"), loader):
+            pass
+    assert cache.stats()["models"] == []
+    with cache.lease(key("tiny"), lambda: Model(1)) as model:
+        assert model.megabytes == 1
+
+
+def test_one_job_uses_a_model_at_a_time(cache):
+    active = []
+    overlaps = []
+
+    def job():
+        with cache.lease(key("tiny"), lambda: Model(1)):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.02)
+            active.pop()
+
+    threads = [threading.Thread(target=job) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1, 1, 1, 1]
+
+
+def test_warm_models_are_discarded_until_used(cache):
+    with cache.lease(key("tiny"), lambda: Model(1), warmup=True):
+        pass
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert cache.stats()["models"][0]["warm"]
+    cache.discard_warm()
+    assert cached(cache) == []
+
+    with cache.lease(key("base"), lambda: Model(1), warmup=True):
+        pass
+    with cache.lease(key("base"), lambda: Model(1)):
+        pass
+    cache.discard_warm()
+    assert cached(cache) == ["base"]
+
+
+def test_zero_budget_disables_caching(cache, monkeypatch):
+    monkeypatch.setattr(Settings, "modelCacheRamBudgetMB", 0)
+    with cache.lease(key("tiny"), lambda: Model(1)):
+        pass
+    assert cached(cache) == []
+
+
+class Attachment:
+    def __init__(self, megabytes: int):
+        self.nbytes = megabytes * MB
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_attachments_are_created_once_and_closed_on_eviction(cache):
+    created = []
+
+    def factory():
+        created.append(Attachment(1))
+        return created[-1]
+
+    with cache.lease(key("tiny"), lambda: Model(2)) as model:
+        first = cache.attach(model, "pool", factory)
+    with cache.lease(key("tiny"), lambda: Model(2)) as model:
+        assert cache.attach(model, "pool", factory) is first
+    assert len(created) == 1
+    assert cache.stats()["models"][0]["sizeMB"] == 3
+    assert cache.stats()["models"][0]["attachments"] == ["pool"]
+
+    cache.clear()
+    assert first.closed
+
+
+def test_attachments_count_against_the_budget(cache):
+    with cache.lease(key("tiny"), lambda: Model(4)):
+        pass
+    with cache.lease(key("base"), lambda: Model(4)) as model:
+        # 4 + 4 MB fit in the budget, another 4 MB for the attachment evict the idle model
+        attachment = cache.attach(model, "pool", lambda: Attachment(4))
+        assert cached(cache) == ["base"]
+    assert not attachment.closed
+
+
+def test_attach_needs_a_cached_model(cache):
+    with pytest.raises(KeyError):
+        cache.attach(Model(1), "pool", lambda: Attachment(1))
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from config import Settings
+from inference import inference
+from inference import mux as mux_module
+from inference.mux import MuxCancelled, MuxError, MuxRunner
+
+# Stands in for ffmpeg: reports progress, writes the output file (the last argument) and then
+# sleeps or fails as the FAKE_FFMPEG_* environment variables say
+FAKE_FFMPEG = f"""#!{sys.executable}
+import os, sys, time
+out_path = sys.argv[-1]
+with open(os.environ["FAKE_FFMPEG_LOG"], "a") as log:
+    log.write(f"start {{time.monotonic()}}\\n")
+with open(out_path, "w") as out:
+    out.write("partial")
+for out_time_us in [1_000_000, 5_000_000]:
+    print(f"out_time_us={{out_time_us}}\\nspeed=2.5x\\nprogress=continue", flush=True)
+time.sleep(float(os.environ.get("FAKE_FFMPEG_SECONDS", "0")))
+if os.environ.get("FAKE_FFMPEG_FAIL"):
+    print("Stream map '0:s' matches no streams.", file=sys.stderr)
+    print("Error opening output files: Invalid argument", file=sys.stderr)
+    sys.exit(1)
+print("out_time_us=10000000\\nspeed=3x\\nprogress=end", flush=True)
+with open(os.environ["FAKE_FFMPEG_LOG"], "a") as log:
+    log.write(f"end {{time.monotonic()}}\\n")
+"""
+
+
+class Events:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, channel: str, message: str):
+        self.messages.append(json.loads(message))
+
+
+@pytest.fixture
+def events(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "bin" / "ffmpeg"
+    ffmpeg.parent.mkdir()
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{ffmpeg.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_FFMPEG_LOG", str(tmp_path / "ffmpeg.log"))
+    monkeypatch.setattr(Settings, "progressMinIntervalSeconds", 0)
+    monkeypatch.setattr(Settings, "muxConcurrency", 2)
+    events = Events()
+    monkeypatch.setattr(mux_module, "event_log", events)
+    return events
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=20))
+
+
+def ffmpeg_log(tmp_path) -> list[tuple[str, float]]:
+    lines = (tmp_path / "ffmpeg.log").read_text().split()
+    return [(kind, float(at)) for kind, at in zip(lines[::2], lines[1::2])]
+
+
+def test_progress_is_parsed_into_events(tmp_path, events):
+    out_path = tmp_path / "out.mkv"
+    runner = MuxRunner()
+    run(runner.run("task", "/media/video.mp4", [], str(out_path), duration=20))
+
+    assert out_path.read_text() == "partial"
+    assert [(e["outTimeSeconds"], e["percentage"], e["speed"]) for e in events.messages] == [
+        (1, 5, "2.5x"), (5, 25, "2.5x"), (10, 100, "3x")
+    ]
+    assert all(e["type"] == "mux_progress" and e["file"] == "video.mp4" for e in events.messages)
+    assert runner.stats()["completed"] == 1
+
+
+def test_progress_without_a_duration_has_no_percentage(tmp_path, events):
+    run(MuxRunner().run("task", "/media/video.mp4", [], str(tmp_path / "out.mkv")))
+    assert [e["percentage"] for e in events.messages] == [None, None, 100]
+
+
+def test_failure_reports_the_last_stderr_line_and_removes_the_output(tmp_path, events, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    out_path = tmp_path / "out.mkv"
+    runner = MuxRunner()
+    with pytest.raises(MuxError, match="^ffmpeg failed: Error opening output files: Invalid argument$"):
+        run(runner.run("task", "/media/video.mp4", [], str(out_path)))
+    assert not out_path.exists()
+    assert runner.stats()["failed"] == 1
+
+
+def test_missing_ffmpeg_is_reported(tmp_path, events, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    with pytest.raises(MuxError, match="ffmpeg is not installed"):
+        run(MuxRunner().run("task", "/media/video.mp4", [], str(tmp_path / "out.mkv")))
+
+
+def test_cancelling_a_task_kills_ffmpeg_and_removes_the_output(tmp_path, events, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "30")
+    runner = MuxRunner()
+    monkeypatch.setattr(inference, "mux_runner", runner)
+    out_path = tmp_path / "out.mkv"
+
+    async def main():
+        runner.start("task")
+        mux = asyncio.create_task(runner.run("task", "/media/video.mp4", [], str(out_path)))
+        while not out_path.exists():
+            await asyncio.sleep(0.05)
+        started = time.monotonic()
+        assert inference.cancelMux("task") == {"task_id": "task", "cancelled": 1}
+        with pytest.raises(MuxCancelled):
+            await mux
+        return time.monotonic() - started
+
+    assert run(main()) < 5
+    assert not out_path.exists()
+    assert [kind for kind, _ in ffmpeg_log(tmp_path)] == ["start"]      # Killed before it finished
+    assert runner.stats()["cancelled"] == 1
+
+
+def test_cancelled_task_doesnt_start_new_muxes(tmp_path, events):
+    runner = MuxRunner()
+    runner.start("task")
+    assert runner.cancel("task") == 0
+    with pytest.raises(MuxCancelled):
+        run(runner.run("task", "/media/video.mp4", [], str(tmp_path / "out.mkv")))
+    assert not (tmp_path / "ffmpeg.log").exists()
+
+    runner.finish("task")
+    assert runner.cancel("task") == 0
+    assert runner._cancelled == set()
+
+
+def test_concurrency_is_limited(tmp_path, events, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.5")
+    runner = MuxRunner()
+
+    async def main():
+        await asyncio.gather(*(
+            runner.run("task", f"/media/{index}.mp4", [], str(tmp_path / f"{index}.mkv")) for index in range(4)
+        ))
+
+    run(main())
+    running = peak = 0
+    for kind, _ in sorted(ffmpeg_log(tmp_path), key=lambda entry: entry[1]):
+        running += 1 if kind == "start" else -1
+        peak = max(peak, running)
+    assert peak == 2
+    assert runner.stats()["completed"] == 4
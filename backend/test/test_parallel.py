@@ -0,0 +1,64 @@
+import numpy as np
+
+from inference.parallel import SAMPLE_RATE, _stitch, plan_cuts
+
+
+def segment(start: float, end: float, text: str) -> dict:
+    return {"id": 0, "start": start, "end": end, "text": text}
+
+
+def test_repeated_lines_within_a_chunk_are_kept():
+    result = {"segments": [segment(0, 2, " Yeah."), segment(2.2, 3, " Yeah."), segment(3, 4, " ok")]}
+    stitched = _stitch([(result, (0.0, 0.0, 600.0))])
+    assert [s["text"] for s in stitched] == [" Yeah.", " Yeah.", " ok"]
+    assert [s["id"] for s in stitched] == [0, 1, 2]
+
+
+def test_segments_are_shifted_and_kept_by_midpoint():
+    # The second chunk starts 2 s before the cut at 600 s, in the middle of audio
+    first = {"segments": [segment(590, 595, " a"), segment(598, 603, " b")]}
+    second = {"segments": [segment(0, 5, " b"), segment(6, 9, " c")], }
+    stitched = _stitch([(first, (0.0, 0.0, 600.0)), (second, (598.0, 600.0, 1200.0))])
+    assert [(s["start"], s["end"], s["text"]) for s in stitched] == [
+        (590, 595, " a"),
+        (598, 603, " b"),       # Midpoint 600.5, the first chunk's copy is dropped as outside its part
+        (604, 607, " c"),
+    ]
+
+
+def test_line_repeated_across_a_boundary_is_removed():
+    first = {"segments": [segment(595, 599.5, " Thank you.")]}
+    second = {"segments": [segment(2.2, 4, " Thank you."), segment(5, 8, " Next.")]}
+    stitched = _stitch([(first, (0.0, 0.0, 600.0)), (second, (598.0, 600.0, 1200.0))])
+    assert [s["text"] for s in stitched] == [" Thank you.", " Next."]
+
+
+def test_same_line_far_from_the_boundary_is_kept():
+    first = {"segments": [segment(595, 599.5, " Yes.")]}
+    second = {"segments": [segment(2, 2.5, " um"), segment(10, 10.5, " Yes."), segment(10.6, 11, " Yes.")]}
+    stitched = _stitch([(first, (0.0, 0.0, 600.0)), (second, (600.0, 600.0, 1200.0))])
+    assert [s["text"] for s in stitched] == [" Yes.", " um", " Yes.", " Yes."]
+
+
+def test_words_are_shifted():
+    result = {"segments": [dict(segment(1, 2, " hi"), words=[{"word": " hi", "start": 1.0, "end": 1.5}])]}
+    stitched = _stitch([(result, (100.0, 100.0, 200.0))])
+    assert stitched[0]["words"] == [{"word": " hi", "start": 101.0, "end": 101.5}]
+
+
+def test_cuts_fall_in_silence():
+    tone = (0.1 * np.sin(np.arange(SAMPLE_RATE * 50) * 0.1)).astype(np.float32)
+    silence = np.zeros(SAMPLE_RATE * 2, dtype=np.float32)
+    audio = np.concatenate([tone, silence, tone, silence, tone])
+    cuts = plan_cuts(audio, chunk_seconds=50)
+    assert cuts[0] == (0, True) and cuts[-1] == (len(audio), True)
+    for sample, silent in cuts[1:-1]:
+        assert silent
+        assert np.all(audio[sample - SAMPLE_RATE // 2:sample + SAMPLE_RATE // 2] == 0)
+
+
+def test_cuts_without_silence_are_marked():
+    audio = (0.1 * np.sin(np.arange(SAMPLE_RATE * 200) * 0.1)).astype(np.float32)
+    cuts = plan_cuts(audio, chunk_seconds=50)
+    assert len(cuts) > 2
+    assert not any(silent for _, silent in cuts[1:-1])
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from inference.pipeline import Pipeline, Stage
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+def test_items_pass_through_every_stage():
+    done = []
+
+    async def double(item):
+        return item * 2
+
+    async def collect(item):
+        done.append(item)
+
+    async def main():
+        pipeline = Pipeline([Stage("double", double, 2), Stage("collect", collect)], on_error=None)
+        await pipeline.run(range(5))
+        return pipeline.stats()
+
+    stats = run(main())
+    assert sorted(done) == [0, 2, 4, 6, 8]
+    assert stats["stages"]["double"]["processed"] == 5
+    assert stats["stages"]["collect"]["processed"] == 5
+
+
+def test_slow_stage_applies_backpressure():
+    started = []
+    in_flight = []
+
+    async def fast(item):
+        started.append(item)
+        in_flight.append(len(started) - len(finished))
+        return item
+
+    finished = []
+
+    async def slow(item):
+        await asyncio.sleep(0.05)
+        finished.append(item)
+
+    async def main():
+        pipeline = Pipeline([Stage("fast", fast, queue_size=1), Stage("slow", slow, queue_size=1)], on_error=None)
+        await pipeline.run(range(6))
+        return pipeline
+
+    pipeline = run(main())
+    assert finished == list(range(6))
+    # One item in the slow handler, one in its queue and one waiting to be put there
+    assert max(in_flight) <= 3
+    assert pipeline.stages[0].blocked_seconds > 0.1
+
+
+def test_failed_items_are_reported_and_dropped():
+    errors = []
+    done = []
+
+    async def check(item):
+        if item == 2:
+            raise ValueError("bad item")
+        return item
+
+    async def collect(item):
+        done.append(item)
+
+    async def on_error(item, e):
+        errors.append((item, str(e)))
+
+    async def main():
+        pipeline = Pipeline([Stage("check", check), Stage("collect", collect)], on_error)
+        await pipeline.run(range(4))
+        return pipeline
+
+    pipeline = run(main())
+    assert done == [0, 1, 3]
+    assert errors == [(2, "bad item")]
+    assert pipeline.stages[0].failed == 1
+
+
+def test_cancelled_handler_does_not_hang_the_pipeline():
+    errors = []
+    done = []
+
+    async def infer(item):
+        if item == 1:
+            future = asyncio.get_running_loop().create_future()
+            future.cancel()         # e.g. the item's scheduler job was cancelled
+            await future
+        return item
+
+    async def collect(item):
+        done.append(item)
+
+    async def on_error(item, e):
+        errors.append(item)
+
+    async def main():
+        await Pipeline([Stage("infer", infer), Stage("collect", collect)], on_error).run(range(3))
+
+    run(main())
+    assert done == [0, 2]
+    assert errors == [1]
+
+
+def test_cancelling_the_run_stops_every_worker():
+    async def stuck(item):
+        await asyncio.sleep(3600)
+
+    async def main():
+        pipeline = Pipeline([Stage("stuck", stuck, workers=3)], on_error=None)
+        task = asyncio.create_task(pipeline.run(range(10)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        return [t for t in asyncio.all_tasks() if t.get_coro().__name__ in ["_worker", "_feed"] and not t.done()]
+
+    assert run(main()) == []
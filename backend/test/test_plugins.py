@@ -0,0 +1,89 @@
+import base64
+import os
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from config import Settings
+from inference import plugins
+from inference.plugins import FileSignatureError, load_plugin, plugin_digest
+
+
+@pytest.fixture
+def key(tmp_path, monkeypatch):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    monkeypatch.setattr(plugins, "inference_path", str(tmp_path))
+    monkeypatch.setattr(plugins, "_plugin_cache", {})
+    monkeypatch.setattr(Settings, "allowUnsignedCode", False)
+    monkeypatch.setattr(Settings, "publicKey", private_key.public_key())
+    return private_key
+
+
+def write_plugin(tmp_path, key, source: bytes, sign: bool = True) -> str:
+    filename = tmp_path / "echo" / "api.py"
+    filename.parent.mkdir(exist_ok=True)
+    filename.write_bytes(source)
+    if sign:
+        signature = key.sign(
+            source,
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256()
+        )
+        (tmp_path / "echo" / "api.py.sig").write_bytes(base64.b64encode(signature))
+    return str(filename)
+
+
+def touch(filename: str):
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_plugin_is_loaded_once(tmp_path, key):
+    write_plugin(tmp_path, key, b"NAME = 'one'\n")
+    module = load_plugin("echo")
+    assert module.NAME == "one"
+    assert load_plugin("echo") is module
+
+
+def test_touched_plugin_with_same_source_keeps_its_module(tmp_path, key):
+    filename = write_plugin(tmp_path, key, b"NAME = 'one'\n")
+    module = load_plugin("echo")
+    touch(filename)
+    assert load_plugin("echo") is module
+
+
+def test_changed_api_is_reloaded(tmp_path, key):
+    filename = write_plugin(tmp_path, key, b"NAME = 'one'\n")
+    module = load_plugin("echo")
+    digest = plugin_digest("echo")
+    write_plugin(tmp_path, key, b"NAME = 'two'\n")
+    touch(filename)
+
+    reloaded = load_plugin("echo")
+    assert reloaded is not module
+    assert reloaded.NAME == "two"
+    assert plugin_digest("echo") != digest
+
+
+def test_changed_api_without_new_signature_is_rejected(tmp_path, key):
+    filename = write_plugin(tmp_path, key, b"NAME = 'one'\n")
+    load_plugin("echo")
+    write_plugin(tmp_path, key, b"NAME = 'evil'\n", sign=False)
+    touch(filename)
+    with pytest.raises(FileSignatureError):
+        load_plugin("echo")
+
+
+def test_changed_signature_is_verified_again(tmp_path, key):
+    write_plugin(tmp_path, key, b"NAME = 'one'\n")
+    load_plugin("echo")
+    sig = tmp_path / "echo" / "api.py.sig"
+    sig.write_bytes(base64.b64encode(b"\0" * 256))
+    touch(str(sig))
+    with pytest.raises(FileSignatureError):
+        load_plugin("echo")
+
+    sig.unlink()
+    with pytest.raises(FileSignatureError, match="missing"):
+        load_plugin("echo")
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from config import Settings
+from inference import progress as progress_module
+from inference.progress import ProgressReporter
+
+
+class Broadcaster:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, channel: str, message: str):
+        self.messages.append(json.loads(message))
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # The module's clock only, the event loop keeps the real one
+    monkeypatch.setattr(progress_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def published(broadcaster: Broadcaster, loop) -> list[dict]:
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(timeout=5)
+    return broadcaster.messages
+
+
+def test_updates_are_coalesced(loop, clock, monkeypatch):
+    monkeypatch.setattr(Settings, "progressMinIntervalSeconds", 0.5)
+    monkeypatch.setattr(Settings, "progressMinStepPercent", 5)
+    broadcaster = Broadcaster()
+    reporter = ProgressReporter("task", broadcaster, loop, unit_seconds=1)
+
+    reporter.update(0, 1000)            # The first update is always published
+    for current in range(10, 50, 10):   # Under 5 % and no time passed
+        reporter.update(current, 1000)
+    reporter.update(60, 1000)           # 6 % since the last publish
+    clock[0] += 1
+    reporter.update(70, 1000)           # Interval elapsed
+    reporter.update(75, 1000)           # Held back...
+    reporter.close()                    # ...until closed
+
+    messages = published(broadcaster, loop)
+    assert [message["current"] for message in messages] == [0, 60, 70, 75]
+    assert reporter.coalesced == 5
+    assert reporter.published == 4
+
+
+def test_completion_is_always_published(loop, clock, monkeypatch):
+    monkeypatch.setattr(Settings, "progressMinIntervalSeconds", 60)
+    monkeypatch.setattr(Settings, "progressMinStepPercent", 100)
+    broadcaster = Broadcaster()
+    reporter = ProgressReporter("task", broadcaster, loop, unit_seconds=1)
+    reporter.update(0, 100)
+    reporter.update(99, 100)
+    reporter.update(100, 100)
+    reporter.close()
+    messages = published(broadcaster, loop)
+    assert [message["percentage"] for message in messages] == [0, 100]
+
+
+def test_overshoot_is_clamped(loop, clock):
+    broadcaster = Broadcaster()
+    reporter = ProgressReporter("task", broadcaster, loop, unit_seconds=0.02)
+    clock[0] += 10
+    reporter.update(3001, 3000)
+    message = published(broadcaster, loop)[-1]
+    assert message["percentage"] == 100
+    assert message["etaSeconds"] == 0
+    assert message["throughput"] == pytest.approx(6.002)
+
+
+def test_without_a_channel_nothing_is_published(clock):
+    reporter = ProgressReporter(None, None, None, unit_seconds=1)
+    reporter.update(50, 100)
+    reporter.close()
+    assert reporter.published == 0
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from config import Settings
+from inference.scheduler import JobScheduler
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+@pytest.fixture(autouse=True)
+def concurrency(monkeypatch):
+    monkeypatch.setattr(Settings, "schedulerConcurrency", {"gpu": 1, "cpu": 2})
+    monkeypatch.setattr(Settings, "schedulerDefaultConcurrency", 1)
+
+
+def recorder(order: list, name: str, seconds: float = 0.01):
+    async def job():
+        order.append(name)
+        await asyncio.sleep(seconds)
+        return name
+    return job
+
+
+def test_higher_priority_runs_first_then_in_submission_order():
+    async def main():
+        scheduler = JobScheduler()
+        order = []
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        first = scheduler.submit("gpu", "t", blocker)
+        await asyncio.sleep(0)      # The only worker picks the blocker up
+        jobs = [
+            scheduler.submit("gpu", "t", recorder(order, "low 1"), priority=0),
+            scheduler.submit("gpu", "t", recorder(order, "high"), priority=5),
+            scheduler.submit("gpu", "t", recorder(order, "low 2"), priority=0),
+            scheduler.submit("gpu", "t", recorder(order, "medium"), priority=1),
+        ]
+        assert scheduler.queue_depth("gpu") == 4
+        gate.set()
+        await asyncio.gather(first.future, *(job.future for job in jobs))
+        await scheduler.stop()
+        return order
+
+    assert run(main()) == ["high", "medium", "low 1", "low 2"]
+
+
+def test_devices_run_independently_with_their_own_concurrency():
+    async def main():
+        scheduler = JobScheduler()
+        order = []
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        # A full GPU queue doesn't hold up CPU jobs
+        blocked = scheduler.submit("gpu", "t", blocker)
+        cpu_jobs = [scheduler.submit("cpu", "t", recorder(order, f"cpu {i}", 0.05)) for i in range(4)]
+        await asyncio.gather(*(job.future for job in cpu_jobs))
+        stats = scheduler.stats()
+        gate.set()
+        await blocked.future
+        await scheduler.stop()
+        return order, stats
+
+    order, stats = run(main())
+    assert order == ["cpu 0", "cpu 1", "cpu 2", "cpu 3"]
+    assert stats["cpu"]["concurrency"] == 2
+    assert stats["cpu"]["completed"] == 4
+    assert stats["gpu"]["running"] == 1
+
+
+def test_failures_and_cancellations_are_reported_per_job():
+    async def main():
+        scheduler = JobScheduler()
+        order = []
+
+        async def fail():
+            raise ValueError("bad file")
+
+        failing = scheduler.submit("gpu", "t", fail)
+        cancelled = scheduler.submit("gpu", "t", recorder(order, "cancelled"))
+        cancelled.future.cancel()
+        after = scheduler.submit("gpu", "t", recorder(order, "after"))
+        with pytest.raises(ValueError):
+            await failing.future
+        assert await after.future == "after"
+        stats = scheduler.stats()["gpu"]
+        await scheduler.stop()
+        return order, stats
+
+    order, stats = run(main())
+    assert order == ["after"]
+    assert stats["failed"] == 1
+    assert stats["completed"] == 1
+
+
+def test_stop_cancels_queued_jobs():
+    async def main():
+        scheduler = JobScheduler()
+        running = scheduler.submit("gpu", "t", recorder([], "running", 3600))
+        queued = scheduler.submit("gpu", "t", recorder([], "queued"))
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        return running.future.cancelled(), queued.future.cancelled()
+
+    assert run(main()) == (True, True)
@@ -0,0 +1,88 @@
+import base64
+import os
+import time
+
+import pytest
+
+from config import Settings
+from inference.transcript_cache import SAMPLE_BYTES, SAMPLE_COUNT, TranscriptCache, cache_key, fingerprint
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setattr(Settings, "transcriptCacheMaxMB", 1)
+    return TranscriptCache()
+
+
+def result(kilobytes: int) -> dict:
+    # Random text, so the entry's compressed size stays close to its length
+    text = base64.b64encode(os.urandom(kilobytes * 768)).decode()
+    return {"text": text, "segments": [{"id": 0, "start": 0.0, "end": 1.0, "text": " hi"}], "language": "en"}
+
+
+def test_fingerprint_follows_contents_not_path(tmp_path):
+    data = os.urandom(SAMPLE_COUNT * SAMPLE_BYTES * 2)
+    original = tmp_path / "a.mp4"
+    original.write_bytes(data)
+    renamed = tmp_path / "b.mp4"
+    renamed.write_bytes(data)
+    changed = tmp_path / "c.mp4"
+    changed.write_bytes(b"x" + data[1:])
+    assert fingerprint(str(original)) == fingerprint(str(renamed))
+    assert fingerprint(str(original)) != fingerprint(str(changed))
+
+
+def test_key_covers_everything_that_changes_the_result():
+    base = cache_key("media", "whisper (CPU)", "digest", "small", "en", {"vad": False, "parallel": False})
+    assert base == cache_key("media", "whisper (CPU)", "digest", "small", "en", {"parallel": False, "vad": False})
+    for changed in [
+        cache_key("other", "whisper (CPU)", "digest", "small", "en", {"vad": False, "parallel": False}),
+        cache_key("media", "whisper (GPU)", "digest", "small", "en", {"vad": False, "parallel": False}),
+        cache_key("media", "whisper (CPU)", "new digest", "small", "en", {"vad": False, "parallel": False}),
+        cache_key("media", "whisper (CPU)", "digest", "medium", "en", {"vad": False, "parallel": False}),
+        cache_key("media", "whisper (CPU)", "digest", "small", "auto", {"vad": False, "parallel": False}),
+        cache_key("media", "whisper (CPU)", "digest", "small", "en", {"vad": True, "parallel": False}),
+        cache_key("media", "whisper (CPU)", "digest", "small", "en", {"batched": True}),
+    ]:
+        assert changed != base
+
+
+def test_results_round_trip(cache):
+    stored = {"text": " hi", "segments": [{"id": 0, "start": 0.0, "end": 1.5, "text": " hi"}], "language": "en"}
+    assert cache.get("key") is None
+    cache.put("key", stored)
+    assert cache.get("key") == stored
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    # Two entries of about 450 KB fit in the 1 MB budget, a third doesn't
+    cache.put("a", result(600))
+    cache.put("b", result(600))
+    # Make the order of use unambiguous whatever the file system's timestamp resolution
+    now = time.time()
+    os.utime(cache._entry_path("a"), (now - 20, now - 20))
+    os.utime(cache._entry_path("b"), (now - 10, now - 10))
+    assert cache.get("a") is not None      # a is now the most recently used
+
+    cache.put("c", result(600))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_unreadable_entries_are_discarded(cache):
+    cache.put("key", {"text": ""})
+    cache._entry_path("key").write_bytes(b"not gzip")
+    assert cache.get("key") is None
+    assert not cache._entry_path("key").exists()
+
+
+def test_index_is_rebuilt_from_disk(cache):
+    cache.put("key", {"text": " hi"})
+    reopened = TranscriptCache()
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get("key") == {"text": " hi"}
@@ -0,0 +1,69 @@
+import pytest
+
+from inference.transcript_store import TranscriptStore, _fts_query
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    return TranscriptStore()
+
+
+def result(*texts: str, language: str = "en") -> dict:
+    return {
+        "language": language,
+        "segments": [{"start": index * 2.0, "end": index * 2.0 + 1.5, "text": f" {text}"} for index, text in enumerate(texts)],
+    }
+
+
+def texts(hits: list[dict]) -> list[str]:
+    return [hit["text"] for hit in hits]
+
+
+def test_search_matches_every_word(store):
+    store.add("/media/a.mp4", result("The quick brown fox", "jumps over the lazy dog"), "whisper (CPU)", "small")
+    store.add("/media/b.mp4", result("A quick lunch", "brown bread"), "whisper (CPU)", "small")
+    assert texts(store.search("quick brown")) == ["The quick brown fox"]
+    assert sorted(texts(store.search("quick"))) == ["A quick lunch", "The quick brown fox"]
+    assert store.search("elephant") == []
+
+
+def test_hits_have_times_in_milliseconds_and_a_snippet(store):
+    file_id = store.add("/media/a.mp4", result("hello there", "general kenobi"), "whisper (GPU)", "medium")
+    [hit] = store.search("kenobi")
+    assert (hit["fileId"], hit["startMs"], hit["endMs"]) == (file_id, 2000, 3500)
+    assert hit["snippet"] == "general [kenobi]"
+    assert (hit["file"], hit["model"], hit["modelSize"]) == ("a.mp4", "whisper (GPU)", "medium")
+
+
+def test_prefix_search_and_diacritics(store):
+    store.add("/media/a.mp4", result("Transcription café"), "whisper (CPU)", "small")
+    assert texts(store.search("transcri*")) == ["Transcription café"]
+    assert texts(store.search("cafe")) == ["Transcription café"]
+    assert store.search("transcri") == []
+
+
+def test_query_operators_are_matched_literally(store):
+    store.add("/media/a.mp4", result("this AND that", "NEAR the end"), "whisper (CPU)", "small")
+    assert _fts_query('a "b" OR c*') == '"a" """b""" "OR" "c"*'
+    assert texts(store.search("this AND")) == ["this AND that"]
+    assert store.search('"') == []
+    assert store.search("   ") == []
+
+
+def test_filters(store):
+    store.add("/media/a.mp4", result("bonjour", language="fr"), "whisper (CPU)", "small")
+    store.add("/media/b.mp4", result("bonjour", language="en"), "whisper (GPU)", "large")
+    assert [hit["file"] for hit in store.search("bonjour", language="fr")] == ["a.mp4"]
+    assert [hit["file"] for hit in store.search("bonjour", plugin="whisper (GPU)")] == ["b.mp4"]
+    assert [hit["file"] for hit in store.search("bonjour", model_size="small")] == ["a.mp4"]
+
+
+def test_retranscribing_a_file_replaces_it(store):
+    store.add("/media/a.mp4", result("old words"), "whisper (CPU)", "small")
+    second = store.add("/media/a.mp4", result("new words", ""), "whisper (CPU)", "large")
+    assert store.search("old") == []
+    assert texts(store.search("new")) == ["new words"]
+    assert [segment["text"] for segment in store.segments(second)] == ["new words"]     # Empty segments aren't stored
+    [listed] = store.files()
+    assert (listed["fileId"], listed["modelSize"], listed["segments"]) == (second, "large", 1)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from inference.vad import SAMPLE_RATE, TimelineMap, remove_silence, speech_regions
+
+
+def tone(seconds: float, dbfs: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    # A sine's RMS is its amplitude / sqrt(2)
+    amplitude = 10 ** (dbfs / 20) * np.sqrt(2)
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def test_continuous_speech_keeps_quiet_speaker():
+    # Two speakers without any pause, the second 12 dB quieter but well above the threshold
+    audio = np.concatenate([tone(10, -23), tone(10, -35)])
+    assert speech_regions(audio) == [(0, len(audio))]
+
+
+def test_noise_floor_raises_threshold_by_limited_amount():
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(20 * SAMPLE_RATE) * 10 ** (-50 / 20)).astype(np.float32)
+    audio = noise.copy()
+    audio[5 * SAMPLE_RATE:15 * SAMPLE_RATE] += tone(10, -35)
+    regions = speech_regions(audio)
+    assert len(regions) == 1
+    start, end = regions[0]
+    assert abs(start - 5 * SAMPLE_RATE) <= 0.3 * SAMPLE_RATE
+    assert abs(end - 15 * SAMPLE_RATE) <= 0.3 * SAMPLE_RATE
+
+
+def test_silence_only_has_no_regions():
+    assert speech_regions(silence(5)) == []
+    assert remove_silence(silence(5)).timeline.empty
+
+
+def test_short_pauses_are_bridged_and_regions_padded():
+    audio = np.concatenate([silence(2), tone(1, -20), silence(0.3), tone(1, -20), silence(3), tone(1, -20), silence(2)])
+    regions = speech_regions(audio)
+    assert len(regions) == 2
+    # 200 ms of padding either side, to within a 30 ms frame
+    assert abs(regions[0][0] - int(1.8 * SAMPLE_RATE)) <= 0.03 * SAMPLE_RATE
+    assert abs(regions[1][0] - int(7.1 * SAMPLE_RATE)) <= 0.03 * SAMPLE_RATE
+
+
+def test_remove_silence_remaps_to_original_timeline():
+    audio = np.concatenate([silence(5), tone(2, -20), silence(10), tone(2, -20), silence(5)])
+    result = remove_silence(audio)
+    assert result.total_seconds == 24
+    assert result.speech_seconds < 6
+    assert result.skipped_seconds > 18
+
+    regions = speech_regions(audio)
+    second_start = regions[1][0] / SAMPLE_RATE
+    # The second region starts after the first and the gap placed between them
+    compact_second = (regions[0][1] - regions[0][0]) / SAMPLE_RATE + 0.2
+    segment = {"start": compact_second + 0.5, "end": compact_second + 1.0, "text": " b",
+               "words": [{"word": " b", "start": compact_second + 0.5, "end": compact_second + 1.0}]}
+    remapped = result.timeline.remap_segment(segment)
+    assert remapped["start"] == round(second_start + 0.5, 3)
+    assert remapped["words"][0]["end"] == round(second_start + 1.0, 3)
+    assert remapped["text"] == " b"
+
+
+def test_timeline_clamps_times_in_join_gaps():
+    timeline = TimelineMap()
+    timeline.add(0.0, 10.0, 2.0)
+    timeline.add(2.2, 30.0, 1.0)
+    assert timeline.to_original(1.0) == 11.0
+    assert timeline.to_original(2.1) == 12.0
+    assert timeline.to_original(2.7) == 30.5
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import time
+
+import pytest
+
+from config import Settings
+from inference.model_cache import model_cache
+from inference.warmup import WarmupService
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # Warms up the stub plugin, which "runs" a window for stubRealtimeFactor * 30 seconds
+    monkeypatch.chdir(BACKEND)
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setattr(Settings, "warmupEnabled", True)
+    monkeypatch.setattr(Settings, "stubPluginEnabled", True)
+    monkeypatch.setattr(Settings, "allowUnsignedCode", True)
+    monkeypatch.setattr(Settings, "stubLoadSeconds", 0)
+    monkeypatch.setattr(Settings, "stubRealtimeFactor", 10)
+    model_cache.clear()
+    yield WarmupService()
+    model_cache.clear()
+
+
+def until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def cached_models() -> list[tuple[str, bool]]:
+    return [(model["model"], model["warm"]) for model in model_cache.stats()["models"] if model["precision"] == "stub"]
+
+
+def start(service: WarmupService, model_size: str):
+    assert service.start("stub", model_size, "en")["state"] == "running"
+    until(lambda: cached_models() == [(model_size, True)])
+
+
+def test_submitted_job_cancels_the_warmup_and_keeps_its_model(service):
+    start(service, "tiny")
+    service.job_submitted("stub", "tiny", "en")
+    until(lambda: service.cancelled == 1)
+    assert service.stats()["current"]["state"] == "cancelled"
+    assert cached_models() == [("tiny", True)]
+    assert service.last_used() == {"model": "stub", "modelSize": "tiny", "language": "en"}
+
+
+def test_job_for_another_size_evicts_the_warmed_model(service):
+    start(service, "tiny")
+    service.job_submitted("stub", "base", "en")
+    until(lambda: service.cancelled == 1)
+    assert cached_models() == []
+    assert service.last_used()["modelSize"] == "base"
+
+
+def test_warmup_of_the_same_model_isnt_started_twice(service):
+    start(service, "tiny")
+    first = service.stats()["current"]["startedAt"]
+    assert service.start("stub", "tiny", "en")["startedAt"] == first
+    service.cancel()
+    until(lambda: service.cancelled == 1)
+
+
+def test_startup_warmup_is_off_unless_enabled(service, monkeypatch):
+    service.job_submitted("stub", "tiny", "en")
+    monkeypatch.setattr(Settings, "warmupEnabled", False)
+    service.start_last_used()
+    assert service.stats()["current"] is None
+
+    monkeypatch.setattr(Settings, "warmupEnabled", True)
+    service.start_last_used()
+    assert service.stats()["current"]["reason"] == "startup"
+    service.cancel()
+    until(lambda: service.cancelled == 1)
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from whisper.audio import SAMPLE_RATE
+from whisper.decoding import DecodingResult
+from whisper.tokenizer import get_tokenizer
+
+from inference.whisper_batch import COMPRESSION_RATIO_THRESHOLD, transcribe_batch
+
+TOKENIZER = get_tokenizer(False, task="transcribe")
+TIME_PRECISION = 0.02
+
+
+class Model:
+    """
+        Decodes every window to one segment from 0 to 2 s. Windows of noise repeat themselves at
+        temperature 0, which needs a fallback, and read "noise" at higher temperatures.
+    """
+
+    def __init__(self):
+        self.dims = SimpleNamespace(n_mels=80, n_audio_ctx=1500)
+        self.device = torch.device("cpu")
+        self.is_multilingual = False
+        self.num_languages = 99
+        self.temperatures = []
+
+    def decode(self, mel: torch.Tensor, options) -> list[DecodingResult]:
+        self.temperatures.append(options.temperature)
+        results = []
+        for window in mel:
+            noise = window.std() > 0.1
+            text = " noise" if noise else " quiet"
+            repetitive = noise and options.temperature == 0
+            tokens = [TOKENIZER.timestamp_begin, *TOKENIZER.encode(text), TOKENIZER.timestamp_begin + round(2 / TIME_PRECISION)]
+            results.append(DecodingResult(
+                audio_features=None,
+                language="en",
+                tokens=tokens,
+                text=text,
+                avg_logprob=-0.2,
+                no_speech_prob=0.01,
+                temperature=options.temperature,
+                compression_ratio=COMPRESSION_RATIO_THRESHOLD + 1 if repetitive else 1.0,
+            ))
+        return results
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(SAMPLE_RATE * seconds), dtype=np.float32)
+
+
+def noise(seconds: float) -> np.ndarray:
+    return np.random.default_rng(0).uniform(-0.5, 0.5, int(SAMPLE_RATE * seconds)).astype(np.float32)
+
+
+def test_segments_are_mapped_back_to_their_files_and_windows():
+    outcomes = transcribe_batch(Model(), [silence(70), silence(10)], "en", batch_size=2, fp16=False)
+    (long_ok, long_result), (short_ok, short_result) = outcomes
+    assert long_ok and short_ok
+    assert [(s["id"], s["start"], s["end"]) for s in long_result["segments"]] == [(0, 0, 2), (1, 30, 32), (2, 60, 62)]
+    assert [(s["id"], s["start"], s["end"]) for s in short_result["segments"]] == [(0, 0, 2)]
+    assert long_result["text"] == " quiet" * 3
+    assert long_result["language"] == "en"
+
+
+def test_segment_end_is_clipped_to_the_audio():
+    model = Model()
+    ((_, result),) = transcribe_batch(model, [silence(31)], "en", batch_size=4, fp16=False)
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(0, 2), (30, 31)]
+
+
+def test_only_windows_that_need_it_fall_back_to_a_higher_temperature():
+    model = Model()
+    (_, quiet), (_, loud) = transcribe_batch(model, [silence(5), noise(5)], "en", batch_size=8, fp16=False)
+    assert [s["temperature"] for s in quiet["segments"]] == [0.0]
+    assert [s["temperature"] for s in loud["segments"]] == [0.2]
+    assert loud["text"] == " noise"
+    # Both windows at temperature 0, only the noisy one again at 0.2
+    assert model.temperatures == [0.0, 0.2]
+
+
+def test_file_that_fails_to_decode_only_fails_itself():
+    outcomes = transcribe_batch(Model(), [silence(5), 123], "en", batch_size=8, fp16=False)
+    assert outcomes[0][0] is True
+    assert outcomes[1][0] is False
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import signal
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from config import Settings
+from inference.workers import WorkerError, WorkerPools
+
+BACKEND = Path(__file__).resolve().parent.parent
+SHM = Path("/dev/shm")
+
+pytestmark = pytest.mark.skipif(not SHM.is_dir(), reason="Shared memory blocks are looked up in /dev/shm")
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    # Workers load the plugins from ./inference
+    monkeypatch.chdir(BACKEND)
+    monkeypatch.setattr(Settings, "workerMode", True)
+    monkeypatch.setattr(Settings, "workerProcesses", {})
+    monkeypatch.setattr(Settings, "workerDefaultProcesses", 1)
+    monkeypatch.setattr(Settings, "stubPluginEnabled", True)
+    monkeypatch.setattr(Settings, "allowUnsignedCode", True)
+    monkeypatch.setattr(Settings, "warmupEnabled", False)
+    monkeypatch.setattr(Settings, "stubLoadSeconds", 0)
+    monkeypatch.setattr(Settings, "stubRealtimeFactor", 0.05)     # 1.5 s per 30 s window
+    pools = WorkerPools()
+    yield pools
+    pools.stop()
+
+
+def audio(seconds: int) -> np.ndarray:
+    return np.zeros(16000 * seconds, dtype=np.float32)
+
+
+def shared_blocks() -> set[str]:
+    return {name for name in os.listdir(SHM) if name.startswith("psm_")}
+
+
+async def until(condition, timeout: float = 30):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.05)
+
+
+def worker(pools: WorkerPools) -> dict:
+    return pools.stats()["pools"]["stub"]["workers"][0]
+
+
+def test_job_runs_in_a_worker_and_its_audio_is_released(pools):
+    async def main():
+        before = shared_blocks()
+        segments = []
+        success, result = await pools.run("stub", "generateSubtitle", "task", audio(10), "tiny", "en", on_segment=segments.append)
+        assert success
+        assert [segment["end"] for segment in result["segments"]] == [5, 10]
+        assert segments == result["segments"]
+        assert shared_blocks() == before
+        assert worker(pools)["completed"] == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_keeps_the_audio_until_the_job_finishes(pools):
+    async def main():
+        before = shared_blocks()
+        segments = []
+        job = asyncio.create_task(pools.run("stub", "generateSubtitle", "task", audio(30), "tiny", "en", on_segment=segments.append))
+        await until(lambda: "stub" in pools.stats()["pools"] and worker(pools)["running"] == 1)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        assert len(shared_blocks() - before) == 1
+
+        # The worker finishes the job with the audio it was sent
+        await until(lambda: worker(pools)["completed"] == 1)
+        await until(lambda: shared_blocks() == before, timeout=5)
+        assert len(segments) == 6
+        assert pools.stats()["pools"]["stub"]["idle"] == 1
+
+    asyncio.run(main())
+
+
+def test_job_of_a_worker_that_dies_fails_and_the_worker_restarts(pools):
+    async def main():
+        before = shared_blocks()
+        job = asyncio.create_task(pools.run("stub", "generateSubtitle", "task", audio(60), "tiny", "en"))
+        await until(lambda: "stub" in pools.stats()["pools"] and worker(pools)["running"] == 1)
+        pid = worker(pools)["pid"]
+        os.kill(pid, signal.SIGKILL)
+        with pytest.raises(WorkerError, match="exited"):
+            await job
+        assert shared_blocks() == before
+
+        await until(lambda: worker(pools)["restarts"] == 1 and worker(pools)["ready"])
+        assert worker(pools)["pid"] != pid
+        assert worker(pools)["crashes"] == 1
+        success, _ = await pools.run("stub", "generateSubtitle", "task", audio(5), "tiny", "en")
+        assert success
+
+    asyncio.run(main())
+
+
+def test_worker_that_cant_load_its_plugin_fails_jobs(pools):
+    async def main():
+        before = shared_blocks()
+        with pytest.raises(WorkerError, match="failed to load plugin missing"):
+            await asyncio.wait_for(pools.run("missing", "generateSubtitle", "task", audio(5), "tiny", "en"), timeout=30)
+        assert shared_blocks() == before
+        worker = pools.stats()["pools"]["missing"]["workers"][0]
+        assert worker["error"] and worker["restarts"] == 0
+
+    asyncio.run(main())
@@ -55,6 +55,9 @@ interface languageType {
   lang: string;
 }
 
+// Stable fallback so effects depending on the derived lists don't re-run every render
+const emptyList: never[] = [];
+
 const formSchema = z.object({
   model: z.string(),
   modelSize: z.string(),
@@ -206,6 +209,20 @@ export default function SettingsMenu() {
             });
 
             console.log("Job submitted with task ID:", taskId);
+            if (data[0].rejected && data[0].rejected.length > 0) {
+              toast({
+                variant: "destructive",
+                title: "Some files were skipped",
+                description: data[0].rejected
+                  .map(
+                    (file: { file: string; error: string }) =>
+                      `${file.file.split(/[\\/]/).pop()}: ${file.error}`,
+                  )
+                  .join("\n"),
+                duration: 5000,
+              });
+            }
+
             const eventSource = new EventSource(
               `http://127.0.0.1:6789/progress/${taskId}`,
             );
@@ -378,20 +395,36 @@ export default function SettingsMenu() {
     mutation.mutate(formData);
   };
 
-  const { data: models = [], isLoading: isModelsLoading } = useQuery({
-    queryKey: ["models"],
+  // Models, sizes and languages all come from a single cached capabilities request
+  const { data: capabilities, isLoading: isCapabilitiesLoading } = useQuery({
+    queryKey: ["capabilities"],
     queryFn: () =>
-      fetch("http://127.0.0.1:6789/available_models").then((res) => res.json()),
+      fetch("http://127.0.0.1:6789/capabilities").then((res) => res.json()),
   });
 
-  const { data: modelSizes = [], isLoading: isModelSizesLoading } = useQuery({
-    queryKey: ["modelSizes", selectedModel],
-    queryFn: () =>
-      fetch(
-        `http://127.0.0.1:6789/supported_model_sizes?model=${selectedModel}`,
-      ).then((res) => res.json()),
-    enabled: !!selectedModel,
-  });
+  const models: string[] = capabilities?.models ?? emptyList;
+  const modelSizes: string[] =
+    capabilities?.plugins?.[selectedModel]?.modelSizes ?? emptyList;
+  const modelLanguages: languageType[] =
+    capabilities?.plugins?.[selectedModel]?.languages ?? emptyList;
+  const isModelsLoading = isCapabilitiesLoading;
+  const isModelSizesLoading = isCapabilitiesLoading;
+  const isLanguagesLoading = isCapabilitiesLoading;
+
+  // Best effort: the backend loads the chosen model in the background so the next job starts sooner
+  const warmUp = (modelSize: string) => {
+    fetch("http://127.0.0.1:6789/warmup", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        model: form.getValues("model"),
+        modelSize: modelSize,
+        language: form.getValues("language"),
+      }),
+    }).catch((error) => console.error("Error warming up model:", error));
+  };
 
   useEffect(() => {
     if (modelSizes.length > 0) {
@@ -399,17 +432,6 @@ export default function SettingsMenu() {
     }
   }, [modelSizes, form]);
 
-  const { data: modelLanguages = [], isLoading: isLanguagesLoading } = useQuery(
-    {
-      queryKey: ["modelLanguages", selectedModel],
-      queryFn: () =>
-        fetch(
-          `http://127.0.0.1:6789/supported_languages?model=${selectedModel}`,
-        ).then((res) => res.json()),
-      enabled: !!selectedModel,
-    },
-  );
-
   return (
     <div className="flex h-[76vh] flex-col rounded-lg bg-[#D9D9D9] dark:bg-[#1b1c1d]">
       <div className="flex h-12 items-center justify-between rounded-t-lg bg-[#8CB369] pr-2 text-xl font-bold text-black">
@@ -483,7 +505,10 @@ export default function SettingsMenu() {
                       Model Size:
                     </FormLabel>
                     <Select
-                      onValueChange={field.onChange}
+                      onValueChange={(value) => {
+                        field.onChange(value);
+                        warmUp(value);
+                      }}
                       value={field.value}
                       disabled={isModelSizesLoading}
                     >